@@ -14,11 +14,12 @@ from mojo_application.service_provider_impl import ServiceProviderImpl
 import mojo_system
 
 class ApplicationImpl(application_mojom.Application):
-  def __init__(self, delegate, app_request_handle):
+  def __init__(self, delegate, app_request_handle, service_host=None):
     self.shell = None
     self.url = None
     self.args = None
     self._delegate = delegate
+    self._service_host = service_host
     self._providers = []
     application_mojom.Application.manager.Bind(self, app_request_handle)
 
@@ -30,7 +31,7 @@ class ApplicationImpl(application_mojom.Application):
 
   def AcceptConnection(self, requestor_url, services, exposed_services,
                        resolved_url):
-    service_provider = ServiceProviderImpl(services)
+    service_provider = ServiceProviderImpl(services, self._service_host)
     if self._delegate.OnAcceptConnection(requestor_url, resolved_url,
                                          service_provider, exposed_services):
       # We keep a reference to ServiceProviderImpl to ensure neither it nor
@@ -5,13 +5,28 @@
 """Helper for running Mojo applications in Python."""
 
 from mojo_application.application_impl import ApplicationImpl
+from mojo_application import service_host
 
 import mojo_system
 
-def RunMojoApplication(application_delegate, app_request_handle):
+def RunMojoApplication(application_delegate, app_request_handle,
+                       nb_workers=0, policy=service_host.LEAST_LOADED,
+                       processes=True):
+  """
+  Runs the application. If nb_workers is not 0, the services of the
+  application are bound on nb_workers worker processes, or threads if
+  processes is False, picked according to policy (see service_host).
+  """
   loop = mojo_system.RunLoop()
 
-  application = ApplicationImpl(application_delegate, app_request_handle)
+  host = None
+  if nb_workers:
+    host = service_host.ServiceHost(nb_workers, policy, processes)
+  application = ApplicationImpl(application_delegate, app_request_handle, host)
   application.manager.AddOnErrorCallback(loop.Quit)
 
-  loop.Run()
+  try:
+    loop.Run()
+  finally:
+    if host:
+      host.Stop()
@@ -0,0 +1,419 @@
+# Copyright 2015 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""
+Host binding the services of an application on a pool of workers, which are
+either processes or threads each running its own run loop.
+"""
+
+import cPickle
+import logging
+import multiprocessing
+import sys
+import threading
+
+from mojo_bindings import messaging
+from mojo_bindings.executor import RunLoopPoster
+
+import mojo_system
+
+
+# Policies used to pick the worker a service pipe is bound on.
+# The worker with the fewest open connections.
+LEAST_LOADED = 'least_loaded'
+# A worker chosen from the name of the service, so that all the connections to
+# a service are bound on the same worker.
+HASH = 'hash'
+
+
+class ServiceHost(object):
+  """
+  A ServiceHost binds service pipes on a pool of workers. The workers are
+  started lazily and restarted if they die.
+
+  Every worker can bind every service: the service class is handed to the
+  worker along with the pipe, so the services added to a ServiceProviderImpl
+  using the host are available on all workers.
+
+  If processes is True, the workers are processes, so that the services use
+  several cores. A message pipe cannot be handed to another process, so the
+  pipes stay on the run loop of the thread calling Bind, which forwards the
+  messages to the worker owning the service instance and writes back its
+  responses. This has the following restrictions:
+  - Bind and Stop must be called on the thread of that run loop.
+  - The service classes are pickled, so they must be defined at the top level
+    of a module.
+  - The messages cannot carry handles: a connection receiving or sending a
+    handle is closed.
+  - The methods run synchronously in the worker, so the promises they return
+    must not wait for the run loop.
+
+  Otherwise, the workers are threads each running its own run loop, on which
+  the pipes are bound. They support all services, but share the GIL.
+  """
+
+  def __init__(self, nb_workers, policy=LEAST_LOADED, processes=True):
+    assert nb_workers > 0
+    assert policy in (LEAST_LOADED, HASH)
+    self._policy = policy
+    self._worker_class = _ProcessWorker if processes else _ThreadWorker
+    self._workers = [None] * nb_workers
+    self._lock = threading.Lock()
+
+  def Bind(self, service_name, service_class, pipe):
+    """
+    Binds a new instance of service_class to pipe on one of the workers.
+    Raises the exception preventing the worker from starting, if any.
+    """
+    with self._lock:
+      index = self._PickWorker(service_name)
+      worker = self._workers[index]
+      if worker is None or not worker.IsAlive():
+        if worker is not None:
+          logging.warning('Worker %d of the service host died. Restarting it.',
+                          index)
+        worker = self._workers[index] = self._worker_class(index)
+      worker.Bind(service_class, pipe)
+
+  def Stop(self):
+    """Stops the workers and waits for them to exit."""
+    with self._lock:
+      workers = [w for w in self._workers if w is not None]
+      self._workers = [None] * len(self._workers)
+    for worker in workers:
+      worker.Stop()
+
+  def GetLoads(self):
+    """Returns the number of open connections of each worker."""
+    return [w.load if w is not None else 0 for w in self._workers]
+
+  def _PickWorker(self, service_name):
+    if self._policy == HASH:
+      return hash(service_name) % len(self._workers)
+    loads = self.GetLoads()
+    return loads.index(min(loads))
+
+
+class _Worker(object):
+  """Base class of the workers, counting their open connections."""
+
+  def __init__(self):
+    self.load = 0
+    self._load_lock = threading.Lock()
+
+  def IsAlive(self):
+    raise NotImplementedError()
+
+  def Bind(self, service_class, pipe):
+    raise NotImplementedError()
+
+  def Stop(self):
+    raise NotImplementedError()
+
+  def _UpdateLoad(self, delta):
+    with self._load_lock:
+      self.load += delta
+
+
+class _ThreadWorker(_Worker):
+  """A thread running a run loop, on which service pipes are bound."""
+
+  def __init__(self, index):
+    _Worker.__init__(self)
+    self._poster = None
+    self._loop = None
+    # The bound service instances.
+    self._services = set()
+    self._startup_error = None
+    self._started = threading.Event()
+    self._thread = threading.Thread(target=self._Run,
+                                    name='ServiceHostWorker%d' % index)
+    self._thread.daemon = True
+    self._thread.start()
+    self._started.wait()
+    if self._startup_error:
+      (error_type, error, traceback) = self._startup_error
+      raise error_type, error, traceback
+
+  def IsAlive(self):
+    return self._thread.is_alive()
+
+  def Bind(self, service_class, pipe):
+    # The load is updated when the connection is assigned, so that the
+    # following connections are balanced even before it is bound.
+    self._UpdateLoad(1)
+    self._poster.Post(self._Bind, (service_class, pipe))
+
+  def Stop(self):
+    if self.IsAlive():
+      self._poster.Post(self._Quit, ())
+      self._thread.join()
+
+  def _Bind(self, service_class, pipe):
+    try:
+      service = service_class()
+      service_class.manager.Bind(service, pipe)
+    # pylint: disable=W0702
+    except:
+      logging.exception('Unable to bind service %s.', service_class.__name__)
+      self._UpdateLoad(-1)
+      return
+    self._services.add(service)
+    service.manager.AddOnErrorCallback(lambda: self._Unbind(service),
+                                       call_on_close=True)
+
+  def _Unbind(self, service):
+    self._services.discard(service)
+    self._UpdateLoad(-1)
+
+  def _Quit(self):
+    # Close the connections, instead of leaving them without run loop.
+    for service in list(self._services):
+      service.manager.Close()
+    self._loop.Quit()
+
+  def _Run(self):
+    try:
+      self._loop = mojo_system.RunLoop()
+      self._poster = RunLoopPoster.Current()
+    # pylint: disable=W0702
+    except:
+      # Raised by __init__, instead of leaving a worker without run loop.
+      self._startup_error = sys.exc_info()
+      return
+    finally:
+      self._started.set()
+    self._loop.Run()
+
+
+class _ProcessWorker(_Worker):
+  """
+  A process running service instances. The pipes of its connections are owned
+  by the run loop which created the worker, and their messages are forwarded
+  to and from the process over a multiprocessing pipe.
+  """
+
+  def __init__(self, index):
+    _Worker.__init__(self)
+    self._poster = RunLoopPoster.Current()
+    # The routers of the open connections, by connection id.
+    self._routers = {}
+    self._next_connection_id = 0
+    (self._connection, worker_connection) = multiprocessing.Pipe()
+    self._process = multiprocessing.Process(
+        target=_RunWorkerProcess, args=(worker_connection,),
+        name='ServiceHostWorker%d' % index)
+    self._process.daemon = True
+    self._process.start()
+    worker_connection.close()
+    self._exited = False
+    reader = threading.Thread(target=self._Read,
+                              name='ServiceHostWorker%dReader' % index)
+    reader.daemon = True
+    reader.start()
+
+  def IsAlive(self):
+    return not self._exited and self._process.is_alive()
+
+  def Bind(self, service_class, pipe):
+    # Pickle the class here, so that a class the worker cannot receive fails
+    # the call to Bind.
+    pickled_class = cPickle.dumps(service_class, cPickle.HIGHEST_PROTOCOL)
+    connection_id = self._next_connection_id
+    self._next_connection_id += 1
+    router = messaging.Router(pipe)
+    router.SetIncomingMessageReceiver(
+        _ForwardingReceiver(self._Forward, connection_id))
+    router.SetErrorHandler(
+        _ConnectionErrorHandler(self._CloseConnection, connection_id))
+    self._routers[connection_id] = router
+    self._UpdateLoad(1)
+    self._Send(('bind', connection_id, pickled_class))
+    router.Start()
+
+  def Stop(self):
+    if not self._exited:
+      self._Send(('stop',))
+      self._process.join()
+    self._OnExit()
+
+  def _Send(self, event):
+    try:
+      self._connection.send(event)
+    except (EOFError, IOError):
+      # The process exited. The reader handles it.
+      pass
+
+  def _Forward(self, connection_id, message):
+    if message.handles:
+      logging.error('Handles cannot be sent to the worker processes of the '
+                    'service host. Closing the connection.')
+      self._CloseConnection(connection_id)
+      return False
+    self._Send(('message', connection_id, str(message.data)))
+    return True
+
+  def _CloseConnection(self, connection_id, notify_worker=True):
+    router = self._routers.pop(connection_id, None)
+    if router is None:
+      return
+    self._UpdateLoad(-1)
+    router.Close()
+    if notify_worker:
+      self._Send(('close', connection_id))
+
+  def _Read(self):
+    """Reads the events sent by the process, on a dedicated thread."""
+    while True:
+      try:
+        event = self._connection.recv()
+      except (EOFError, IOError):
+        self._poster.Post(self._OnExit, ())
+        return
+      self._poster.Post(self._OnEvent, event)
+
+  def _OnEvent(self, kind, connection_id, data=None):
+    if kind == 'response':
+      router = self._routers.get(connection_id)
+      if router is not None:
+        router.Accept(messaging.Message(bytearray(data), []))
+    else:
+      assert kind == 'close'
+      self._CloseConnection(connection_id, notify_worker=False)
+
+  def _OnExit(self):
+    if self._exited:
+      return
+    self._exited = True
+    # The service instances died with the process.
+    for connection_id in self._routers.keys():
+      self._CloseConnection(connection_id, notify_worker=False)
+    self._connection.close()
+
+
+class _ForwardingReceiver(messaging.MessageReceiverWithResponder):
+  """
+  Forwards the messages of a connection to its worker process. The responses
+  carry the request ids of the requests, so they are written back directly.
+  """
+
+  def __init__(self, forward, connection_id):
+    messaging.MessageReceiverWithResponder.__init__(self)
+    self._forward = forward
+    self._connection_id = connection_id
+
+  def Accept(self, message):
+    return self._forward(self._connection_id, message)
+
+  def AcceptWithResponder(self, message, responder):
+    return self._forward(self._connection_id, message)
+
+
+class _ConnectionErrorHandler(messaging.ConnectionErrorHandler):
+  def __init__(self, close, connection_id):
+    messaging.ConnectionErrorHandler.__init__(self)
+    self._close = close
+    self._connection_id = connection_id
+
+  def OnError(self, result):
+    self._close(self._connection_id)
+
+
+def _RunWorkerProcess(connection):
+  """Runs the service instances of a worker process until it is stopped."""
+  services = {}
+  while True:
+    try:
+      event = connection.recv()
+    except (EOFError, IOError):
+      return
+    kind = event[0]
+    if kind == 'stop':
+      return
+    connection_id = event[1]
+    if kind == 'bind':
+      try:
+        service_class = cPickle.loads(event[2])
+        service = service_class()
+        service.manager = _WorkerInstanceManager(
+            service_class.manager, connection, connection_id, services)
+        # The worker is the executor of its services: their methods run
+        # inline.
+        # pylint: disable=W0212
+        stub = service_class.manager._Stub(service)
+        stub._executor = None
+      # pylint: disable=W0702
+      except:
+        logging.exception('Unable to bind service.')
+        connection.send(('close', connection_id))
+        continue
+      services[connection_id] = stub
+    elif kind == 'message':
+      stub = services.get(connection_id)
+      if stub is None:
+        continue
+      message = messaging.Message(bytearray(event[2]), [])
+      if message.header.expects_response:
+        stub.AcceptWithResponder(
+            message, _WorkerResponder(connection, connection_id, stub))
+      else:
+        stub.Accept(message)
+    else:
+      assert kind == 'close'
+      stub = services.pop(connection_id, None)
+      if stub is not None:
+        stub.impl.manager.OnClosedByHost()
+
+
+class _WorkerResponder(messaging.MessageReceiver):
+  """Sends the responses of a service instance back to the host."""
+
+  def __init__(self, connection, connection_id, stub):
+    messaging.MessageReceiver.__init__(self)
+    self._connection = connection
+    self._connection_id = connection_id
+    self._stub = stub
+
+  def Accept(self, message):
+    if message.handles:
+      logging.error('Handles cannot be sent from the worker processes of the '
+                    'service host. Closing the connection.')
+      self._stub.impl.manager.Close()
+      return False
+    self._connection.send(
+        ('response', self._connection_id, str(message.data)))
+    return True
+
+
+class _WorkerInstanceManager(object):
+  """The manager of a service instance running in a worker process."""
+
+  def __init__(self, interface_manager, connection, connection_id, services):
+    self.interface_manager = interface_manager
+    self._connection = connection
+    self._connection_id = connection_id
+    self._services = services
+    self._callbacks = []
+
+  def Close(self):
+    if self._services.pop(self._connection_id, None) is not None:
+      self._connection.send(('close', self._connection_id))
+      self._RunCallbacks(True)
+
+  def PassMessagePipe(self):
+    raise messaging.MessagingException(
+        'The pipes of the services of worker processes stay in the host.')
+
+  def AddOnErrorCallback(self, callback, call_on_close=False):
+    self._callbacks.append((callback, call_on_close))
+
+  def OnClosedByHost(self):
+    self._RunCallbacks(False)
+
+  def _RunCallbacks(self, closed):
+    callbacks = self._callbacks
+    self._callbacks = []
+    for (callback, call_on_close) in callbacks:
+      if call_on_close or not closed:
+        callback()
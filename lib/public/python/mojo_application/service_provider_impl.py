@@ -9,8 +9,13 @@ import logging
 import service_provider_mojom
 
 class ServiceProviderImpl(service_provider_mojom.ServiceProvider):
-  def __init__(self, provider):
+  def __init__(self, provider, service_host=None):
+    """
+    If service_host is not None, the services are bound on the workers of this
+    service_host.ServiceHost instead of the current run loop.
+    """
     self._provider = provider
+    self._service_host = service_host
     self._name_to_service_connector = {}
 
   def AddService(self, service_class, service_name=None):
@@ -24,6 +29,9 @@ class ServiceProviderImpl(service_provider_mojom.ServiceProvider):
   def ConnectToService(self, interface_name, pipe):
     if interface_name in self._name_to_service_connector:
       service = self._name_to_service_connector[interface_name]
-      service.manager.Bind(service(), pipe)
+      if self._service_host:
+        self._service_host.Bind(interface_name, service, pipe)
+      else:
+        service.manager.Bind(service(), pipe)
     else:
       logging.error("Unable to find service " + interface_name)
@@ -0,0 +1,265 @@
+# Copyright 2015 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""
+Capture of the messages crossing message pipes, and replay of the captured
+requests against an implementation of an interface.
+
+A capture is enabled for all the connectors created afterwards with:
+
+  messaging.SetMessageCapture(capture.MessageCapture(open(path, 'wb')))
+
+or for a single connector with Connector.SetMessageCapture.
+"""
+
+import collections
+import itertools
+import struct
+import threading
+
+import mojo_bindings.messaging as messaging
+import mojo_bindings.serialization as serialization
+
+# pylint: disable=E0611,F0401
+import mojo_system as system
+
+
+# The direction of a captured message.
+INCOMING = 0
+OUTGOING = 1
+
+_MAGIC = 'MOJOCAP\x01'
+
+# Header of each record of a capture: direction, pipe id, number of handles,
+# size of the data and timestamp in microseconds, followed by the data.
+_RECORD_STRUCT = struct.Struct('<BIIIq')
+
+
+# A message read from a capture.
+CapturedMessage = collections.namedtuple(
+    'CapturedMessage',
+    ['direction', 'pipe', 'nb_handles', 'data', 'timestamp'])
+
+
+class MessageCapture(object):
+  """
+  Appends the messages crossing the pipes of connectors to a binary stream.
+  The handles of the messages are not captured, only their number.
+  Can be used from several threads.
+  """
+
+  def __init__(self, stream):
+    self._stream = stream
+    self._lock = threading.Lock()
+    self._pipe_ids = itertools.count()
+    self._stream.write(_MAGIC)
+
+  def NewPipe(self):
+    """Returns the id identifying the messages of a new pipe in the capture."""
+    with self._lock:
+      return next(self._pipe_ids)
+
+  def RecordIncoming(self, pipe, message):
+    self._Record(INCOMING, pipe, message)
+
+  def RecordOutgoing(self, pipe, message):
+    self._Record(OUTGOING, pipe, message)
+
+  def Close(self):
+    with self._lock:
+      self._stream.close()
+
+  def _Record(self, direction, pipe, message):
+    timestamp = system.GetTimeTicksNow()
+    data = message.data or ''
+    handles = message.handles or ()
+    with self._lock:
+      self._stream.write(_RECORD_STRUCT.pack(
+          direction, pipe, len(handles), len(data), timestamp))
+      self._stream.write(data)
+
+
+def ReadCapture(stream):
+  """
+  Yields the CapturedMessage of a capture, in the order they were captured.
+  """
+  if stream.read(len(_MAGIC)) != _MAGIC:
+    raise ValueError('Not a message capture.')
+  while True:
+    record = stream.read(_RECORD_STRUCT.size)
+    if not record:
+      return
+    if len(record) < _RECORD_STRUCT.size:
+      raise ValueError('Truncated message capture.')
+    (direction, pipe, nb_handles, size, timestamp) = (
+        _RECORD_STRUCT.unpack(record))
+    data = stream.read(size)
+    if len(data) < size:
+      raise ValueError('Truncated message capture.')
+    yield CapturedMessage(direction, pipe, nb_handles, data, timestamp)
+
+
+class ReplayResult(object):
+  """
+  The result of a replay. Durations are in seconds. latencies contains the
+  time between sending each request expecting a response and receiving its
+  response.
+  """
+
+  def __init__(self):
+    self.nb_messages = 0
+    self.duration = 0
+    self.latencies = []
+    self.error = None
+
+  @property
+  def throughput(self):
+    """The number of messages handled per second."""
+    if not self.duration:
+      return 0
+    return self.nb_messages / self.duration
+
+  def Percentile(self, percent):
+    """Returns the given percentile of the latencies, or None if empty."""
+    if not self.latencies:
+      return None
+    latencies = sorted(self.latencies)
+    index = int(round(percent / 100.0 * (len(latencies) - 1)))
+    return latencies[index]
+
+  def __str__(self):
+    lines = ['%d messages in %.3fs: %.1f messages/s' % (
+        self.nb_messages, self.duration, self.throughput)]
+    if self.latencies:
+      lines.append('latency: p50 %.3fms, p90 %.3fms, p99 %.3fms, max %.3fms' %
+                   tuple(self.Percentile(p) * 1000 for p in (50, 90, 99, 100)))
+    if self.error is not None:
+      lines.append('error: %r' % self.error)
+    return '\n'.join(lines)
+
+
+def Replay(captured_messages, interface_manager, impl, pipe=None,
+           recorded_speed=False):
+  """
+  Sends the requests of captured_messages to impl, bound with
+  interface_manager, and waits for the responses. This must be called on a
+  thread without a running run loop.
+
+  Args:
+    captured_messages: an iterable of CapturedMessage, e.g. from ReadCapture.
+      Only the incoming requests which are valid for the interface are
+      replayed, optionally only those of the given pipe.
+    interface_manager: the manager of the interface implemented by impl.
+    impl: the implementation receiving the requests.
+    pipe: if not None, only the messages of this pipe are replayed.
+    recorded_speed: if True, the requests are sent with the intervals they
+      were captured with. Otherwise, they are sent as fast as possible.
+
+  Returns:
+    A ReplayResult.
+  """
+  requests = []
+  for captured_message in captured_messages:
+    if (captured_message.direction != INCOMING or
+        (pipe is not None and captured_message.pipe != pipe)):
+      continue
+    if not _IsRequest(interface_manager, captured_message):
+      continue
+    requests.append(captured_message)
+
+  result = ReplayResult()
+  loop = system.RunLoop()
+  pipes = system.MessagePipe()
+  interface_manager.Bind(impl, pipes.handle0)
+  router = messaging.Router(pipes.handle1)
+  # pylint: disable=W0212
+  proxy = interface_manager._InternalProxy(router, None, 0)
+  router.SetErrorHandler(proxy._error_handler)
+  router.Start()
+  # The handles sent in place of the captured ones.
+  peer_handles = []
+  # The start time of the replay, the number of responses not received yet,
+  # and whether all the requests have been dispatched.
+  state = {'start': 0, 'pending': 0, 'handled': False}
+
+  def Send(captured_message):
+    handles = []
+    for _ in xrange(captured_message.nb_handles):
+      handle_pipe = system.MessagePipe()
+      handles.append(handle_pipe.handle0)
+      peer_handles.append(handle_pipe.handle1)
+    message = messaging.Message(bytearray(captured_message.data), handles)
+    result.nb_messages += 1
+    if not message.header.expects_response:
+      router.Accept(message)
+      return
+    sent = system.GetTimeTicksNow()
+    state['pending'] += 1
+    def OnResponse(_):
+      result.latencies.append((system.GetTimeTicksNow() - sent) / 1e6)
+      state['pending'] -= 1
+      if state['handled'] and not state['pending']:
+        OnDone()
+      return True
+    router.AcceptWithResponder(
+        message, messaging.ForwardingMessageReceiver(OnResponse))
+
+  def OnDone():
+    result.duration = (system.GetTimeTicksNow() - state['start']) / 1e6
+    loop.Quit()
+
+  def OnHandled(_):
+    state['handled'] = True
+    if not state['pending']:
+      OnDone()
+
+  def OnError(error):
+    result.error = error
+    OnDone()
+
+  def SendAll(messages):
+    for captured_message in messages:
+      Send(captured_message)
+
+  def Finish():
+    # Messages are dispatched in order, so the response to a version query
+    # sent after the requests means that all of them have been dispatched. The
+    # responses of the methods run by an executor may still be pending.
+    proxy.manager.QueryVersion().Then(OnHandled, OnError)
+
+  def Start():
+    state['start'] = system.GetTimeTicksNow()
+    if not recorded_speed or not requests:
+      SendAll(requests)
+      Finish()
+      return
+    origin = requests[0].timestamp
+    # Requests captured at the same time are sent by the same task.
+    for (timestamp, group) in itertools.groupby(requests,
+                                                lambda m: m.timestamp):
+      loop.PostDelayedTask(
+          lambda group=list(group): SendAll(group), timestamp - origin)
+    loop.PostDelayedTask(Finish, requests[-1].timestamp - origin)
+
+  loop.PostDelayedTask(Start)
+  try:
+    loop.Run()
+  finally:
+    proxy.manager.Close()
+    for handle in peer_handles:
+      handle.Close()
+  return result
+
+
+def _IsRequest(interface_manager, captured_message):
+  message = messaging.Message(bytearray(captured_message.data), [])
+  try:
+    header = message.header
+    if header.is_response:
+      return False
+    interface_manager.ValidateMessage(messaging.Message(
+        message.data, [system.Handle()] * captured_message.nb_handles))
+  except serialization.DeserializationException:
+    return False
+  return True
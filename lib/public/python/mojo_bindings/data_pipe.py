@@ -0,0 +1,390 @@
+# Copyright 2015 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""
+Streams over data pipes, using two-phase reads and writes so that the data is
+copied directly between the pipe and the buffers of the caller.
+
+DataPipeReader and DataPipeWriter are file objects blocking the calling
+thread. AsyncDataPipeReader and AsyncDataPipeWriter run on the run loop of the
+current thread, and return promises.
+"""
+
+import errno
+import io
+import mmap
+import os
+
+import mojo_bindings.promise as promise
+
+# pylint: disable=E0611,F0401
+import mojo_system as system
+
+
+# Returned instead of a two-phase buffer when the other end of the pipe is
+# closed, and for a consumer, all the data has been read.
+_PEER_CLOSED = object()
+
+
+class DataPipeReader(io.RawIOBase):
+  """
+  File object reading from a data pipe consumer handle, which it owns. Reads
+  block until data is available, and return '' once the producer is closed and
+  all the data has been read.
+  """
+
+  def __init__(self, handle):
+    io.RawIOBase.__init__(self)
+    self._handle = handle
+
+  def readable(self):
+    return True
+
+  def read(self, size=-1):
+    if size is None or size < 0:
+      return self.readall()
+    if size == 0:
+      return ''
+    two_phase_buffer = self._Begin()
+    if two_phase_buffer is _PEER_CLOSED:
+      return ''
+    return _CopyOut(two_phase_buffer, size)
+
+  def readinto(self, b):
+    target = b if isinstance(b, memoryview) else memoryview(b)
+    if not len(target):
+      return 0
+    two_phase_buffer = self._Begin()
+    if two_phase_buffer is _PEER_CLOSED:
+      return 0
+    view = two_phase_buffer.buffer
+    copied = 0
+    try:
+      size = min(len(view), len(target))
+      target[:size] = view[:size]
+      copied = size
+    finally:
+      # The two-phase read is always ended, so that the pipe can be read
+      # again if the copy fails.
+      two_phase_buffer.End(copied)
+    return copied
+
+  def readall(self):
+    return ''.join(view.tobytes() for view in self.IterBuffers())
+
+  def IterBuffers(self):
+    """
+    Yields the data of the pipe as memoryviews of the buffer of the pipe,
+    without copying it. Each view is only valid until the next one is
+    requested.
+    """
+    while True:
+      two_phase_buffer = self._Begin()
+      if two_phase_buffer is _PEER_CLOSED:
+        return
+      view = two_phase_buffer.buffer
+      try:
+        yield view
+      finally:
+        two_phase_buffer.End(len(view))
+
+  def close(self):
+    if not self.closed:
+      self._handle.Close()
+    io.RawIOBase.close(self)
+
+  def _Begin(self):
+    if self.closed:
+      raise ValueError('I/O operation on closed file.')
+    return _BlockingTwoPhase(self._handle, True)
+
+
+class DataPipeWriter(io.RawIOBase):
+  """
+  File object writing to a data pipe producer handle, which it owns. Writes
+  block until all the data has been written. data can be any object exposing
+  the buffer interface, such as a memory mapped file.
+  """
+
+  def __init__(self, handle):
+    io.RawIOBase.__init__(self)
+    self._handle = handle
+
+  def writable(self):
+    return True
+
+  def write(self, data):
+    if self.closed:
+      raise ValueError('I/O operation on closed file.')
+    return _BlockingWrite(self._handle, _AsBytes(data))
+
+  def close(self):
+    if not self.closed:
+      self._handle.Close()
+    io.RawIOBase.close(self)
+
+
+def SendFile(f, handle, offset=0, count=None):
+  """
+  Writes count bytes of the file f, starting at offset and by default up to
+  its end, to the data pipe producer handle. The file is memory mapped and
+  copied directly to the pipe. Blocks until all the data has been written, and
+  returns the number of bytes written.
+  """
+  mapping = _MapFile(f)
+  try:
+    return _BlockingWrite(handle, _FileSlice(mapping, offset, count))
+  finally:
+    if mapping is not None:
+      mapping.close()
+
+
+class AsyncDataPipeReader(object):
+  """
+  Reads a data pipe consumer handle, which it owns, on the run loop of the
+  current thread. The operations return promises, and must not overlap.
+  """
+
+  def __init__(self, handle):
+    self._handle = handle
+
+  def Read(self, max_bytes=None):
+    """
+    Returns a promise of the next available data, at most max_bytes, or of ''
+    once the producer is closed and all the data has been read.
+    """
+    def GeneratorFunction(resolve, reject):
+      def OnBuffer(two_phase_buffer):
+        if two_phase_buffer is _PEER_CLOSED:
+          resolve('')
+        else:
+          resolve(_CopyOut(two_phase_buffer, max_bytes))
+        return False
+      _AsyncTwoPhase(self._handle, True, OnBuffer, reject)
+    return promise.Promise(GeneratorFunction)
+
+  def ForEachBuffer(self, callback):
+    """
+    Calls callback with the data of the pipe as memoryviews of the buffer of
+    the pipe, without copying it. Each view is only valid during the call.
+    Returns a promise of the number of bytes read, resolved once the producer
+    is closed and all the data has been read.
+    """
+    def GeneratorFunction(resolve, reject):
+      state = {'nb_bytes': 0}
+      def OnBuffer(two_phase_buffer):
+        if two_phase_buffer is _PEER_CLOSED:
+          resolve(state['nb_bytes'])
+          return False
+        view = two_phase_buffer.buffer
+        try:
+          callback(view)
+        finally:
+          two_phase_buffer.End(len(view))
+        state['nb_bytes'] += len(view)
+        return True
+      _AsyncTwoPhase(self._handle, True, OnBuffer, reject)
+    return promise.Promise(GeneratorFunction)
+
+  def ReadAll(self):
+    """
+    Returns a promise of all the data of the pipe, resolved once the producer
+    is closed.
+    """
+    chunks = []
+    return self.ForEachBuffer(lambda view: chunks.append(view.tobytes())).Then(
+        lambda _: ''.join(chunks))
+
+  def Close(self):
+    self._handle.Close()
+
+
+class AsyncDataPipeWriter(object):
+  """
+  Writes to a data pipe producer handle, which it owns, on the run loop of the
+  current thread. The operations return promises, and must not overlap.
+  """
+
+  def __init__(self, handle):
+    self._handle = handle
+
+  def Write(self, data):
+    """
+    Writes data, any object exposing the buffer interface. Returns a promise
+    of the number of bytes written, resolved once all of them are written.
+    """
+    return _AsyncWrite(self._handle, _AsBytes(data))
+
+  def SendFile(self, f, offset=0, count=None):
+    """
+    Writes the file f as SendFile does. Returns a promise of the number of
+    bytes written, resolved once all of them are written.
+    """
+    mapping = _MapFile(f)
+    def Unmap(result):
+      if mapping is not None:
+        mapping.close()
+      return result
+    def UnmapAndReject(reason):
+      Unmap(None)
+      raise reason
+    return _AsyncWrite(
+        self._handle, _FileSlice(mapping, offset, count)).Then(
+            Unmap, UnmapAndReject)
+
+  def Close(self):
+    self._handle.Close()
+
+
+def _BeginTwoPhase(handle, read):
+  """
+  Begins a two-phase read or write on handle. Returns the
+  DataPipeTwoPhaseBuffer, None if the handle must be waited on, or
+  _PEER_CLOSED.
+  """
+  if read:
+    (result, two_phase_buffer) = handle.BeginReadData()
+  else:
+    (result, two_phase_buffer) = handle.BeginWriteData()
+  if result == system.RESULT_OK:
+    return two_phase_buffer
+  if result == system.RESULT_SHOULD_WAIT:
+    return None
+  if result == system.RESULT_FAILED_PRECONDITION:
+    return _PEER_CLOSED
+  raise system.MojoException(result)
+
+
+def _GetSignals(read):
+  if read:
+    return system.HANDLE_SIGNAL_READABLE
+  return system.HANDLE_SIGNAL_WRITABLE
+
+
+def _BlockingTwoPhase(handle, read):
+  """
+  Returns the next DataPipeTwoPhaseBuffer of handle, or _PEER_CLOSED, blocking
+  until one is available.
+  """
+  while True:
+    two_phase_buffer = _BeginTwoPhase(handle, read)
+    if two_phase_buffer is not None:
+      return two_phase_buffer
+    # The result of the wait is the one of the next attempt.
+    handle.Wait(_GetSignals(read), system.DEADLINE_INDEFINITE)
+
+
+def _AsyncTwoPhase(handle, read, on_buffer, on_error):
+  """
+  Calls on_buffer with the DataPipeTwoPhaseBuffers of handle, and finally with
+  _PEER_CLOSED, as long as it returns True. Waits on the run loop when no
+  buffer is available. Exceptions are passed to on_error.
+  """
+  def Run(_=None):
+    try:
+      while True:
+        two_phase_buffer = _BeginTwoPhase(handle, read)
+        if two_phase_buffer is None:
+          handle.AsyncWait(_GetSignals(read), system.DEADLINE_INDEFINITE, Run)
+          return
+        if not on_buffer(two_phase_buffer):
+          return
+    except Exception as e:
+      on_error(e)
+  Run()
+
+
+def _BlockingWrite(handle, data):
+  offset = 0
+  while offset < len(data):
+    two_phase_buffer = _BlockingTwoPhase(handle, False)
+    if two_phase_buffer is _PEER_CLOSED:
+      raise _ConsumerClosedError()
+    offset += _CopyIn(two_phase_buffer, data, offset)
+  return offset
+
+
+def _AsyncWrite(handle, data):
+  def GeneratorFunction(resolve, reject):
+    state = {'offset': 0}
+    def OnBuffer(two_phase_buffer):
+      if two_phase_buffer is _PEER_CLOSED:
+        raise _ConsumerClosedError()
+      state['offset'] += _CopyIn(two_phase_buffer, data, state['offset'])
+      if state['offset'] < len(data):
+        return True
+      resolve(state['offset'])
+      return False
+    if not len(data):
+      resolve(0)
+      return
+    _AsyncTwoPhase(handle, False, OnBuffer, reject)
+  return promise.Promise(GeneratorFunction)
+
+
+def _CopyOut(two_phase_buffer, max_bytes):
+  """Ends a two-phase read, returning at most max_bytes of its data."""
+  view = two_phase_buffer.buffer
+  data = ''
+  try:
+    size = len(view)
+    if max_bytes is not None:
+      size = min(size, max_bytes)
+    data = view[:size].tobytes()
+  finally:
+    two_phase_buffer.End(len(data))
+  return data
+
+
+def _CopyIn(two_phase_buffer, data, offset):
+  """
+  Ends a two-phase write, filling it with data from offset. Returns the
+  number of bytes written.
+  """
+  view = two_phase_buffer.buffer
+  copied = 0
+  try:
+    size = min(len(view), len(data) - offset)
+    view[:size] = _Slice(data, offset, size)
+    copied = size
+  finally:
+    # Nothing is written if the copy fails.
+    two_phase_buffer.End(copied)
+  return copied
+
+
+def _AsBytes(data):
+  """
+  Returns an object exposing the bytes of data, whose length is their number.
+  """
+  if isinstance(data, memoryview):
+    if data.ndim == 1 and data.itemsize == 1:
+      return data
+    return data.tobytes()
+  return buffer(data)
+
+
+def _Slice(data, offset, size):
+  if isinstance(data, memoryview):
+    return data[offset:offset + size]
+  return buffer(data, offset, size)
+
+
+def _MapFile(f):
+  """Returns a read-only memory mapping of the file f, or None if empty."""
+  if not os.fstat(f.fileno()).st_size:
+    return None
+  return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _FileSlice(mapping, offset, count):
+  if mapping is None:
+    return ''
+  if count is None:
+    count = len(mapping) - offset
+  return buffer(mapping, offset, count)
+
+
+def _ConsumerClosedError():
+  return IOError(errno.EPIPE, 'The data pipe consumer is closed.')
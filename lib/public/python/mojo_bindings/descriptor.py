@@ -9,9 +9,11 @@ The descriptors used to define generated elements of the mojo python bindings.
 import array
 import itertools
 import struct
+import sys
 
 import mojo_bindings.reflection as reflection
 import mojo_bindings.serialization as serialization
+import mojo_bindings.shared_buffers as shared_buffers
 
 # pylint: disable=E0611,F0401
 import mojo_system
@@ -101,6 +103,17 @@ class SerializableType(Type):
     """
     raise NotImplementedError()
 
+  def Validate(self, value, context):
+    """
+    Checks that a value of this type is well-formed, without deserializing it.
+    Raises a DeserializationException describing the first violation found.
+
+    Args:
+      value: the base value for this type, as for Deserialize.
+      context: the DeserializationContext the value is read from.
+    """
+    pass
+
 
 class BooleanType(SerializableType):
   """Type object for booleans"""
@@ -191,13 +204,7 @@ class UnionType(SerializableType):
             'Trying to serialize null for non nullable type.')
       return ((0, 0, 0), [])
 
-    ((size, tag, entry, new_data), new_handles) = (
-        value.SerializeInline(handle_offset))
-    if len(new_data) > 0:
-      data.extend(new_data)
-      entry = data_offset - 8
-
-    return ((size, tag, entry), new_handles)
+    return value.SerializeInto(data_offset, data, handle_offset)
 
   def Deserialize(self, value, context):
     result = self.union_type.Deserialize(context)
@@ -206,6 +213,11 @@ class UnionType(SerializableType):
           'Trying to deserialize null for non nullable type.')
     return result
 
+  def Validate(self, value, context):
+    if not self.union_type.Validate(context) and not self.nullable:
+      raise serialization.DeserializationException(
+          'Trying to deserialize null for non nullable type.')
+
 
 class PointerType(SerializableType):
   """Base Type object for pointers."""
@@ -228,19 +240,37 @@ class PointerType(SerializableType):
         raise serialization.DeserializationException(
             'Trying to deserialize null for non nullable type.')
       return None
+    (size, nb_elements, sub_context) = self._ClaimPointer(value, context)
+    return self.DeserializePointer(size, nb_elements, sub_context)
+
+  def Validate(self, value, context):
+    if value == 0:
+      if not self.nullable:
+        raise serialization.DeserializationException(
+            'Trying to deserialize null for non nullable type.')
+      return
+    (size, nb_elements, sub_context) = self._ClaimPointer(value, context)
+    self.ValidatePointer(size, nb_elements, sub_context)
+
+  def _ClaimPointer(self, value, context):
+    """
+    Checks the header of the data pointed by the not null pointer value and
+    claims its memory. Returns its (size, nb_elements, context) tuple.
+    """
     if value % 8 != 0:
       raise serialization.DeserializationException(
           'Pointer alignment is incorrect.')
     sub_context = context.GetSubContext(value)
-    if len(sub_context.data) < serialization.HEADER_STRUCT.size:
+    available = len(sub_context.data) - sub_context.offset
+    if available < serialization.HEADER_STRUCT.size:
       raise serialization.DeserializationException(
           'Available data too short to contain header.')
     (size, nb_elements) = serialization.HEADER_STRUCT.unpack_from(
-        sub_context.data)
-    if len(sub_context.data) < size or size < serialization.HEADER_STRUCT.size:
+        sub_context.data, sub_context.offset)
+    if available < size or size < serialization.HEADER_STRUCT.size:
       raise serialization.DeserializationException('Header size is incorrect.')
     sub_context.ClaimMemory(0, size)
-    return self.DeserializePointer(size, nb_elements, sub_context)
+    return (size, nb_elements, sub_context)
 
   def SerializePointer(self, value, data_offset, data, handle_offset):
     """Serialize the not null value."""
@@ -249,6 +279,10 @@ class PointerType(SerializableType):
   def DeserializePointer(self, size, nb_elements, context):
     raise NotImplementedError()
 
+  def ValidatePointer(self, size, nb_elements, context):
+    """Validate the not null value."""
+    raise NotImplementedError()
+
 
 class StringType(PointerType):
   """
@@ -260,7 +294,8 @@ class StringType(PointerType):
 
   def __init__(self, nullable=False):
     PointerType.__init__(self, nullable)
-    self._array_type = NativeArrayType('B', nullable)
+    self._array_type = NativeArrayType('B', nullable, use_numpy=False,
+                                       shareable=False)
 
   def Convert(self, value):
     if value is None or isinstance(value, unicode):
@@ -276,9 +311,13 @@ class StringType(PointerType):
         string_array, data_offset, data, handle_offset)
 
   def DeserializePointer(self, size, nb_elements, context):
-    string_array = self._array_type.DeserializeArray(size, nb_elements, context)
+    string_array = self._array_type.DeserializePointer(
+        size, nb_elements, context)
     return unicode(string_array.tostring(), 'utf8')
 
+  def ValidatePointer(self, size, nb_elements, context):
+    self._array_type.ValidatePointer(size, nb_elements, context)
+
 
 class BaseHandleType(SerializableType):
   """Type object for handles."""
@@ -304,6 +343,14 @@ class BaseHandleType(SerializableType):
       return self.FromHandle(mojo_system.Handle())
     return self.FromHandle(context.ClaimHandle(value))
 
+  def Validate(self, value, context):
+    if value == -1:
+      if not self.nullable:
+        raise serialization.DeserializationException(
+            'Trying to deserialize null for non nullable type.')
+      return
+    context.ClaimHandle(value)
+
   def FromHandle(self, handle):
     raise NotImplementedError()
 
@@ -382,6 +429,9 @@ class InterfaceType(BaseHandleType):
       proxy.manager.version = value[1]
     return proxy
 
+  def Validate(self, value, context):
+    super(InterfaceType, self).Validate(value[0], context)
+
   def FromHandle(self, handle):
     if handle.IsValid():
       return self.interface.manager.Proxy(handle)
@@ -414,16 +464,30 @@ class BaseArrayType(PointerType):
     raise NotImplementedError()
 
   def DeserializePointer(self, size, nb_elements, context):
+    self._CheckArraySize(size, nb_elements)
+    return self.DeserializeArray(size, nb_elements, context)
+
+  def ValidatePointer(self, size, nb_elements, context):
+    self._CheckArraySize(size, nb_elements)
+    self.ValidateArray(size, nb_elements, context)
+
+  def _CheckArraySize(self, size, nb_elements):
     if self.length != 0 and nb_elements != self.length:
       raise serialization.DeserializationException('Incorrect array size')
     if (size <
         serialization.HEADER_STRUCT.size + self.SizeForLength(nb_elements)):
       raise serialization.DeserializationException('Incorrect array size')
-    return self.DeserializeArray(size, nb_elements, context)
 
   def DeserializeArray(self, size, nb_elements, context):
     raise NotImplementedError()
 
+  def ValidateArray(self, size, nb_elements, context):
+    """
+    Validate the elements of the not null array. Arrays of native types have
+    nothing to check beyond their size.
+    """
+    pass
+
   def SizeForLength(self, nb_elements):
     raise NotImplementedError()
 
@@ -432,7 +496,8 @@ class BooleanArrayType(BaseArrayType):
 
   def __init__(self, nullable=False, length=0):
     BaseArrayType.__init__(self, nullable, length)
-    self._array_type = NativeArrayType('B', nullable)
+    self._array_type = NativeArrayType('B', nullable, use_numpy=False,
+                                       shareable=False)
 
   def Convert(self, value):
     if value is None:
@@ -445,7 +510,8 @@ class BooleanArrayType(BaseArrayType):
     return _SerializeNativeArray(converted, data_offset, data, len(value))
 
   def DeserializeArray(self, size, nb_elements, context):
-    converted = self._array_type.DeserializeArray(size, nb_elements, context)
+    converted = self._array_type.DeserializeArray(
+        size, self.SizeForLength(nb_elements), context)
     elements = list(itertools.islice(
         itertools.chain.from_iterable(
             [_ConvertByteToBooleans(x, 8) for x in converted]),
@@ -498,60 +564,155 @@ class GenericArrayType(BaseArrayType):
     return (data_offset, returned_handles)
 
   def DeserializeArray(self, size, nb_elements, context):
+    return [self.sub_type.Deserialize(value, sub_context) for
+            (value, sub_context) in self._IterElements(nb_elements, context)]
+
+  def ValidateArray(self, size, nb_elements, context):
+    for (value, sub_context) in self._IterElements(nb_elements, context):
+      self.sub_type.Validate(value, sub_context)
+
+  def _IterElements(self, nb_elements, context):
+    """
+    Yields the (value, context) pair to deserialize each element of the array
+    from. The same context is moved to each element, so it is only valid until
+    the next element is yielded.
+    """
     # TODO(azani): Refactor so the format string isn't so big.
     values = struct.unpack_from(
         nb_elements * self.sub_type.GetTypeCode(),
-        buffer(context.data, serialization.HEADER_STRUCT.size))
+        context.data,
+        context.offset + serialization.HEADER_STRUCT.size)
     values_per_element = len(self.sub_type.GetTypeCode())
     assert nb_elements * values_per_element == len(values)
 
-    result = []
+    element_size = self.sub_type.GetByteSize()
     sub_context = context.GetSubContext(serialization.HEADER_STRUCT.size)
-    for index in xrange(nb_elements):
-      if values_per_element == 1:
-        value = values[index]
-      else:
-        value = tuple(values[index * values_per_element :
-                             (index + 1) * values_per_element])
-      result.append(self.sub_type.Deserialize(
-          value,
-          sub_context))
-      sub_context = sub_context.GetSubContext(self.sub_type.GetByteSize())
-    return result
+    if values_per_element == 1:
+      for value in values:
+        yield (value, sub_context)
+        sub_context.Advance(element_size)
+      return
+    for index in xrange(0, len(values), values_per_element):
+      yield (values[index:index + values_per_element], sub_context)
+      sub_context.Advance(element_size)
 
   def SizeForLength(self, nb_elements):
     return nb_elements * self.sub_type.GetByteSize();
 
 
 class NativeArrayType(BaseArrayType):
-  """Type object for arrays of native types."""
+  """
+  Type object for arrays of native types.
 
-  def __init__(self, typecode, nullable=False, length=0):
+  Values are array.array instances. Any object exposing its elements through
+  the buffer protocol with the right element type, such as a numpy.ndarray or a
+  memoryview, is also accepted and serialized without being copied to a list.
+
+  Values are deserialized as numpy arrays instead if use_numpy is True, or if it
+  is None and this has been enabled for the typecode with UseNumpyArrays.
+
+  If shareable is True, large arrays may be sent in shared buffers, see
+  shared_buffers. They are then deserialized as shared_buffers.MappedArray, or
+  as numpy views of it.
+  """
+
+  def __init__(self, typecode, nullable=False, length=0, use_numpy=None,
+               shareable=True):
     BaseArrayType.__init__(self, nullable, length)
     self.array_typecode = typecode
     self.element_size = struct.calcsize('<%s' % self.array_typecode)
+    self.use_numpy = use_numpy
+    self.shareable = shareable
 
   def Convert(self, value):
     if value is None:
       return value
-    if (isinstance(value, array.array) and
-        value.array_typecode == self.array_typecode):
+    if (isinstance(value, (array.array, shared_buffers.MappedArray)) and
+        value.typecode == self.array_typecode):
+      return value
+    if isinstance(value, memoryview):
+      # Python 2 memoryviews cannot copy non contiguous data.
+      if (value.ndim != 1 or
+          value.format.lstrip('@=<') != self.array_typecode or
+          value.strides != (value.itemsize,)):
+        raise TypeError('%r is not a contiguous 1-dimensional array of %r' %
+                        (value, self.array_typecode))
       return value
+    # numpy can only be used by the caller if it has been imported.
+    numpy = sys.modules.get('numpy')
+    if numpy is not None and isinstance(value, numpy.ndarray):
+      if (value.ndim != 1 or
+          value.dtype != numpy.dtype('<%s' % self.array_typecode)):
+        raise TypeError('%r is not a 1-dimensional array of %r' %
+                        (value, self.array_typecode))
+      return numpy.ascontiguousarray(value)
     return array.array(self.array_typecode, value)
 
   def SerializeArray(self, value, data_offset, data, handle_offset):
+    if self.shareable:
+      threshold = shared_buffers.GetThreshold()
+      size = self.SizeForLength(len(value))
+      # Arrays whose data fits in the encoding of a shared array are always
+      # inline, so that both encodings cannot be confused.
+      if (threshold is not None and
+          size > max(threshold, shared_buffers.SHARED_ARRAY_STRUCT.size)):
+        return _SerializeSharedArray(value, data_offset, data, len(value), size,
+                                     handle_offset)
     return _SerializeNativeArray(value, data_offset, data, len(value))
 
+  def DeserializePointer(self, size, nb_elements, context):
+    if not self._IsShared(size, nb_elements, context):
+      return BaseArrayType.DeserializePointer(self, size, nb_elements, context)
+    handle = context.ClaimHandle(self._GetSharedHandleIndex(context))
+    result = shared_buffers.MapArray(handle, self.array_typecode, nb_elements)
+    if self._UseNumpy():
+      return _GetNumpy().asarray(result)
+    return result
+
+  def ValidatePointer(self, size, nb_elements, context):
+    if not self._IsShared(size, nb_elements, context):
+      BaseArrayType.ValidatePointer(self, size, nb_elements, context)
+      return
+    context.ClaimHandle(self._GetSharedHandleIndex(context))
+
   def DeserializeArray(self, size, nb_elements, context):
+    offset = context.offset + serialization.HEADER_STRUCT.size
+    if self._UseNumpy():
+      # A read-only view of the message data.
+      return _GetNumpy().frombuffer(buffer(context.data),
+                                    '<%s' % self.array_typecode,
+                                    nb_elements, offset)
     result = array.array(self.array_typecode)
-    result.fromstring(buffer(context.data,
-                             serialization.HEADER_STRUCT.size,
-                             size - serialization.HEADER_STRUCT.size))
+    result.fromstring(buffer(context.data, offset,
+                             self.SizeForLength(nb_elements)))
     return result
 
   def SizeForLength(self, nb_elements):
     return nb_elements * self.element_size
 
+  def _UseNumpy(self):
+    if self.use_numpy is None:
+      return self.array_typecode in _numpy_typecodes
+    return self.use_numpy
+
+  def _IsShared(self, size, nb_elements, context):
+    """Returns whether the array is sent in a shared buffer."""
+    if (not self.shareable or
+        size != (serialization.HEADER_STRUCT.size +
+                 shared_buffers.SHARED_ARRAY_STRUCT.size) or
+        self.SizeForLength(nb_elements) <=
+        shared_buffers.SHARED_ARRAY_STRUCT.size or
+        not context.AcceptsSharedBuffers()):
+      return False
+    if self.length != 0 and nb_elements != self.length:
+      raise serialization.DeserializationException('Incorrect array size')
+    return True
+
+  def _GetSharedHandleIndex(self, context):
+    (index, _) = shared_buffers.SHARED_ARRAY_STRUCT.unpack_from(
+        context.data, context.offset + serialization.HEADER_STRUCT.size)
+    return index
+
 
 class StructType(PointerType):
   """Type object for structs."""
@@ -579,33 +740,31 @@ class StructType(PointerType):
     return None
 
   def SerializePointer(self, value, data_offset, data, handle_offset):
-    (new_data, new_handles) = value.Serialize(handle_offset)
-    data.extend(new_data)
+    (_, new_handles) = value.Serialize(handle_offset, data)
     return (data_offset, new_handles)
 
   def DeserializePointer(self, size, nb_elements, context):
     return self.struct_type.Deserialize(context)
 
+  def ValidatePointer(self, size, nb_elements, context):
+    self.struct_type.Validate(context)
 
-class MapType(SerializableType):
-  """Type objects for maps."""
+
+class MapType(PointerType):
+  """Type objects for maps.
+
+  A map is encoded as a struct holding a pointer to an array of keys and a
+  pointer to an array of values. The arrays are written directly from the
+  dictionary and read directly into a dictionary, without going through an
+  intermediate struct object.
+  """
 
   def __init__(self, key_type, value_type, nullable=False):
+    PointerType.__init__(self, nullable)
     self._key_type = key_type
     self._value_type = value_type
-    dictionary = {
-      '__metaclass__': reflection.MojoStructType,
-      '__module__': __name__,
-      'DESCRIPTOR': {
-        'fields': [
-          SingleFieldGroup('keys', MapType._GetArrayType(key_type), 0, 0),
-          SingleFieldGroup('values', MapType._GetArrayType(value_type), 1, 0),
-        ],
-      }
-    }
-    self.struct = reflection.MojoStructType('MapStruct', (object,), dictionary)
-    self.struct_type = StructType(lambda: self.struct, nullable)
-    SerializableType.__init__(self, self.struct_type.typecode)
+    self._keys_array_type = MapType._GetArrayType(key_type)
+    self._values_array_type = MapType._GetArrayType(value_type)
 
   def Convert(self, value):
     if value is None:
@@ -615,31 +774,124 @@ class MapType(SerializableType):
                    x, y in value.iteritems()])
     raise TypeError('%r is not a dictionary.')
 
-  def Serialize(self, value, data_offset, data, handle_offset):
-    s = None
-    if value is not None:
-      keys, values = [], []
-      for key, value in value.iteritems():
-        keys.append(key)
-        values.append(value)
-      s = self.struct(keys=keys, values=values)
-    return self.struct_type.Serialize(s, data_offset, data, handle_offset)
+  def SerializePointer(self, value, data_offset, data, handle_offset):
+    position = len(data)
+    data.extend(bytearray(_MAP_STRUCT_SIZE))
+    serialization.HEADER_STRUCT.pack_into(data, position, _MAP_STRUCT_SIZE, 0)
+    # Keys and values of a dict are listed in the same order, as long as the
+    # dict is not modified in between.
+    (keys_pointer, handles) = self._keys_array_type.Serialize(
+        MapType._ToArray(self._keys_array_type, value.keys()),
+        len(data) - (position + _MAP_KEYS_OFFSET),
+        data,
+        handle_offset)
+    (values_pointer, values_handles) = self._values_array_type.Serialize(
+        MapType._ToArray(self._values_array_type, value.values()),
+        len(data) - (position + _MAP_VALUES_OFFSET),
+        data,
+        handle_offset + len(handles))
+    _MAP_POINTERS_STRUCT.pack_into(
+        data, position + _MAP_KEYS_OFFSET, keys_pointer, values_pointer)
+    handles.extend(values_handles)
+    return (data_offset, handles)
+
+  def DeserializePointer(self, size, version, context):
+    (keys_pointer, values_pointer) = MapType._ReadPointers(
+        size, version, context)
+    keys = self._keys_array_type.Deserialize(
+        keys_pointer, context.GetSubContext(_MAP_KEYS_OFFSET))
+    values = self._values_array_type.Deserialize(
+        values_pointer, context.GetSubContext(_MAP_VALUES_OFFSET))
+    if len(keys) != len(values):
+      raise serialization.DeserializationException(
+          'keys and values do not have the same length.')
+    return dict(itertools.izip(keys, values))
+
+  def ValidatePointer(self, size, version, context):
+    (keys_pointer, values_pointer) = MapType._ReadPointers(
+        size, version, context)
+    self._keys_array_type.Validate(
+        keys_pointer, context.GetSubContext(_MAP_KEYS_OFFSET))
+    self._values_array_type.Validate(
+        values_pointer, context.GetSubContext(_MAP_VALUES_OFFSET))
+    # Both arrays are not nullable, and their headers have been checked.
+    (_, nb_keys) = serialization.HEADER_STRUCT.unpack_from(
+        context.data, context.offset + _MAP_KEYS_OFFSET + keys_pointer)
+    (_, nb_values) = serialization.HEADER_STRUCT.unpack_from(
+        context.data, context.offset + _MAP_VALUES_OFFSET + values_pointer)
+    if nb_keys != nb_values:
+      raise serialization.DeserializationException(
+          'keys and values do not have the same length.')
 
-  def Deserialize(self, value, context):
-    s = self.struct_type.Deserialize(value, context)
-    if s:
-      if len(s.keys) != len(s.values):
-        raise serialization.DeserializationException(
-            'keys and values do not have the same length.')
-      return dict(zip(s.keys, s.values))
-    return None
+  @staticmethod
+  def _ReadPointers(size, version, context):
+    if ((version == 0 and size != _MAP_STRUCT_SIZE) or
+        size < _MAP_STRUCT_SIZE):
+      raise serialization.DeserializationException('Struct size in incorrect.')
+    return _MAP_POINTERS_STRUCT.unpack_from(
+        context.data, context.offset + _MAP_KEYS_OFFSET)
 
   @staticmethod
   def _GetArrayType(t):
     if t == TYPE_BOOL:
       return BooleanArrayType()
-    else:
-      return GenericArrayType(t)
+    if (isinstance(t, NumericType) and
+        t.GetTypeCode() in _NATIVE_ARRAY_TYPECODES):
+      # The encoding of native arrays is identical to the one of generic arrays
+      # of the same type, but they are packed in bulk.
+      return NativeArrayType(t.GetTypeCode(), use_numpy=False,
+                             shareable=False)
+    return GenericArrayType(t)
+
+  @staticmethod
+  def _ToArray(array_type, elements):
+    if isinstance(array_type, NativeArrayType):
+      return array.array(array_type.array_typecode, elements)
+    return elements
+
+
+# The struct used to encode maps: a header followed by the pointers to the keys
+# and values arrays.
+_MAP_POINTERS_STRUCT = struct.Struct('<QQ')
+_MAP_KEYS_OFFSET = serialization.HEADER_STRUCT.size
+_MAP_VALUES_OFFSET = _MAP_KEYS_OFFSET + serialization.POINTER_STRUCT.size
+_MAP_STRUCT_SIZE = _MAP_KEYS_OFFSET + _MAP_POINTERS_STRUCT.size
+
+# The typecodes of the array module whose items have the same size as with the
+# struct module.
+_NATIVE_ARRAY_TYPECODES = frozenset(
+    code for code in 'bBhHiIfd'
+    if array.array(code).itemsize == struct.calcsize('<%s' % code))
+
+# The typecodes of the native arrays deserialized as numpy arrays by default.
+_numpy_typecodes = frozenset()
+
+
+def UseNumpyArrays(enabled=True, typecodes=None):
+  """
+  Sets whether the native arrays (arrays of integers, except 64 bits ones, and
+  of floating point numbers) are deserialized as numpy arrays, optionally only
+  the arrays of the given array typecodes, e.g. 'fd' for the arrays of float
+  and double. The numpy arrays are read-only views of the message data.
+
+  Raises ImportError if enabled is True and numpy is not available.
+  """
+  # pylint: disable=W0603
+  global _numpy_typecodes
+  if typecodes is None:
+    typecodes = _NATIVE_ARRAY_TYPECODES
+  typecodes = frozenset(typecodes) & _NATIVE_ARRAY_TYPECODES
+  if enabled:
+    _GetNumpy()
+    _numpy_typecodes = _numpy_typecodes | typecodes
+  else:
+    _numpy_typecodes = _numpy_typecodes - typecodes
+
+
+def _GetNumpy():
+  # numpy is optional and slow to import, so it is only imported when used.
+  import numpy
+  return numpy
 
 
 TYPE_BOOL = BooleanType('B')
@@ -713,6 +965,9 @@ class FieldGroup(object):
   def Deserialize(self, value, context):
     raise NotImplementedError()
 
+  def Validate(self, value, context):
+    raise NotImplementedError()
+
   def Filter(self, version):
     raise NotImplementedError()
 
@@ -748,6 +1003,9 @@ class SingleFieldGroup(FieldGroup, FieldDescriptor):
     entity = self.field_type.Deserialize(value, context)
     return { self.name: entity }
 
+  def Validate(self, value, context):
+    self.field_type.Validate(value, context)
+
   def Filter(self, version):
     return self
 
@@ -785,6 +1043,9 @@ class BooleanGroup(FieldGroup):
                                      fillvalue=False)
     return dict(values)
 
+  def Validate(self, value, context):
+    pass
+
   def Filter(self, version):
     return BooleanGroup(
         filter(lambda d: d.version <= version, self.descriptors))
@@ -793,13 +1054,32 @@ class BooleanGroup(FieldGroup):
 def _SerializeNativeArray(value, data_offset, data, length):
   data_size = len(data)
   data.extend(bytearray(serialization.HEADER_STRUCT.size))
-  data.extend(buffer(value))
+  data += _AsBuffer(value)
   data_length = len(data) - data_size
   data.extend(bytearray(serialization.NeededPaddingForAlignment(data_length)))
   serialization.HEADER_STRUCT.pack_into(data, data_size, data_length, length)
   return (data_offset, [])
 
 
+def _SerializeSharedArray(value, data_offset, data, length, size,
+                          handle_offset):
+  handle = shared_buffers.CreateSharedBuffer(_AsBuffer(value), size)
+  data += serialization.HEADER_STRUCT.pack(
+      serialization.HEADER_STRUCT.size +
+      shared_buffers.SHARED_ARRAY_STRUCT.size, length)
+  data += shared_buffers.SHARED_ARRAY_STRUCT.pack(handle_offset, 0)
+  return (data_offset, [handle])
+
+
+def _AsBuffer(value):
+  """Returns the data of a native array, as an object exposing it."""
+  if isinstance(value, memoryview):
+    return value
+  if isinstance(value, shared_buffers.MappedArray):
+    return value.buffer
+  return buffer(value)
+
+
 def _ConvertBooleansToByte(booleans):
   """Pack a list of booleans into an integer."""
   return reduce(lambda x, y: x * 2 + y, reversed(booleans), 0)
@@ -0,0 +1,167 @@
+# Copyright 2015 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""
+Dispatcher waiting for many handles at once, for services with many open
+pipes. The connectors of the current thread use it once set with:
+
+  messaging.SetDispatcher(dispatcher.WaitManyDispatcher())
+"""
+
+import collections
+import threading
+
+from mojo_bindings.executor import RunLoopPoster
+
+# pylint: disable=E0611,F0401
+import mojo_system as system
+
+
+class WaitManyDispatcher(object):
+  """
+  A WaitManyDispatcher waits for handles on a dedicated thread with a single
+  mojo_system.WaitMany, and runs the callbacks of all the handles which became
+  ready on the run loop of the thread which created it, in one task. Its
+  AsyncWait method can be used in place of Handle.AsyncWait.
+
+  The handles are served in the order they started waiting, so a pipe which
+  has just been served waits behind the other ready pipes.
+
+  batch_size is the maximum number of callbacks run by a task, so that the
+  other tasks of the run loop are not delayed by many ready pipes.
+  messages_per_wake is the maximum number of messages a connector reads each
+  time its pipe is ready, before waiting again behind the other pipes.
+  """
+
+  def __init__(self, batch_size=64, messages_per_wake=16):
+    assert batch_size > 0 and messages_per_wake > 0
+    self.batch_size = batch_size
+    self.messages_per_wake = messages_per_wake
+    self._poster = RunLoopPoster.Current()
+    # The waits added since the dispatcher thread last woke up.
+    self._added = collections.deque()
+    # Whether callbacks are running, in which case waking the dispatcher
+    # thread is deferred to the end of the task.
+    self._dispatching = False
+    self._wake_pending = False
+    self._closed = False
+    self._wake_pipe = system.MessagePipe()
+    self._thread = threading.Thread(target=self._Run,
+                                    name='WaitManyDispatcher')
+    self._thread.daemon = True
+    self._thread.start()
+
+  def AsyncWait(self, handle, signals, deadline, callback):
+    """
+    Calls callback(result) on the run loop once handle satisfies signals, or
+    can never satisfy them. Returns a function cancelling the wait. Only
+    indefinite deadlines are supported.
+    """
+    assert deadline == system.DEADLINE_INDEFINITE
+    wait = _Wait(handle, signals, callback)
+    self._added.append(wait)
+    self._RequestWake()
+    def Cancel():
+      if wait.active:
+        wait.active = False
+        self._RequestWake()
+    return Cancel
+
+  def Close(self):
+    """
+    Stops the dispatcher thread. The pending callbacks are never called.
+    Must be called on the thread of the run loop.
+    """
+    if self._closed:
+      return
+    self._closed = True
+    self._Wake()
+    self._thread.join()
+    self._wake_pipe.handle0.Close()
+    self._wake_pipe.handle1.Close()
+
+  def _RequestWake(self):
+    if self._dispatching:
+      self._wake_pending = True
+    else:
+      self._Wake()
+
+  def _Wake(self):
+    self._wake_pipe.handle1.WriteMessage()
+
+  def _Dispatch(self, ready):
+    """Runs the callbacks of ready, a list of (wait, result), on the loop."""
+    batch = ready[:self.batch_size]
+    remaining = ready[self.batch_size:]
+    if remaining:
+      system.RunLoop.Current().PostDelayedTask(
+          lambda: self._Dispatch(remaining))
+    self._dispatching = True
+    try:
+      for (wait, result) in batch:
+        if wait.active:
+          wait.active = False
+          wait.callback(result)
+    finally:
+      self._dispatching = False
+      if self._wake_pending:
+        self._wake_pending = False
+        self._Wake()
+
+  def _Run(self):
+    """The loop of the dispatcher thread."""
+    waits = []
+    wake_handle = self._wake_pipe.handle0
+    while not self._closed:
+      while self._added:
+        waits.append(self._added.popleft())
+      waits = [w for w in waits if w.active]
+      (result, index, states) = system.WaitMany(
+          [(wake_handle, system.HANDLE_SIGNAL_READABLE)] +
+          [(w.handle, w.signals) for w in waits],
+          system.DEADLINE_INDEFINITE)
+      ready = _GetReady(waits, result, index, states)
+      if ready:
+        ready_set = set(id(w) for (w, _) in ready)
+        waits = [w for w in waits if id(w) not in ready_set]
+        self._poster.Post(self._Dispatch, (ready,))
+      while wake_handle.ReadMessage()[0] == system.RESULT_OK:
+        pass
+
+
+class _Wait(object):
+  __slots__ = ('handle', 'signals', 'callback', 'active')
+
+  def __init__(self, handle, signals, callback):
+    self.handle = handle
+    self.signals = signals
+    self.callback = callback
+    self.active = True
+
+
+def _GetReady(waits, result, index, states):
+  """
+  Returns the (wait, result) of the waits which are over after a WaitMany on
+  the wake up handle followed by the handles of waits.
+  """
+  if states is None:
+    if index is None:
+      # The whole call failed.
+      return [(w, result) for w in waits]
+    if index == 0:
+      return []
+    # A handle was invalid, most likely closed after its wait was cancelled.
+    return [(waits[index - 1], result)]
+  ready = []
+  for (wait, (satisfied, satisfiable)) in zip(waits, states[1:]):
+    if satisfied & wait.signals:
+      ready.append((wait, system.RESULT_OK))
+    elif not satisfiable & wait.signals:
+      ready.append((wait, system.RESULT_FAILED_PRECONDITION))
+  if (index and result not in (system.RESULT_OK,
+                               system.RESULT_FAILED_PRECONDITION)):
+    # E.g. the handle was closed during the wait.
+    ready = [r for r in ready if r[0] is not waits[index - 1]]
+    ready.append((waits[index - 1], result))
+  return ready
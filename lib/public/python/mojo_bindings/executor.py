@@ -0,0 +1,209 @@
+# Copyright 2015 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""
+Executors used to run the methods of interface implementations off the run
+loop.
+"""
+
+import collections
+import cPickle
+import multiprocessing
+import multiprocessing.pool
+import threading
+import weakref
+
+# pylint: disable=E0611,F0401
+import mojo_system as system
+
+
+class Executor(object):
+  """
+  An executor runs the methods of the implementation of an interface. The
+  results are always delivered on the thread of the run loop which submitted
+  the call.
+
+  queue_depth is the number of calls that have been submitted and whose result
+  has not been delivered yet, and max_queue_depth the highest value it reached.
+  """
+
+  def __init__(self):
+    self.queue_depth = 0
+    self.max_queue_depth = 0
+
+  def Execute(self, function, args, callback, kwargs=None):
+    """
+    Runs function(*args, **kwargs), then calls callback(succeeded, result) on
+    the thread of the current run loop. result is the value returned by
+    function if succeeded is True, and the exception it raised otherwise.
+    """
+    self.queue_depth += 1
+    self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+    def Callback(succeeded, result):
+      self.queue_depth -= 1
+      callback(succeeded, result)
+    self._Run(function, args, kwargs, Callback)
+
+  def CheckImplementation(self, impl):
+    """
+    Raises an exception if the executor cannot run the methods of impl. It is
+    called when impl is bound, so that the binding fails instead of each call.
+    """
+    pass
+
+  def Close(self):
+    """Releases the resources of the executor."""
+    pass
+
+  def _Run(self, function, args, kwargs, callback):
+    raise NotImplementedError()
+
+
+class InlineExecutor(Executor):
+  """An executor running the calls synchronously, on the run loop."""
+
+  def _Run(self, function, args, kwargs, callback):
+    callback(*_Call(function, args, kwargs))
+
+
+class ThreadPoolExecutor(Executor):
+  """
+  An executor running the calls on a pool of threads. This is useful for
+  methods doing blocking I/O or calling C extensions that release the GIL.
+  """
+
+  def __init__(self, nb_threads):
+    Executor.__init__(self)
+    self._thread_pool = multiprocessing.pool.ThreadPool(nb_threads)
+
+  def Close(self):
+    self._thread_pool.close()
+
+  def _Run(self, function, args, kwargs, callback):
+    poster = RunLoopPoster.Current()
+    self._thread_pool.apply_async(
+        _Call, (function, args, kwargs),
+        callback=lambda result: poster.Post(callback, result))
+
+
+class ProcessPoolExecutor(ThreadPoolExecutor):
+  """
+  An executor running the calls on a pool of processes, for CPU-heavy methods.
+  The arguments and results of the methods must be picklable. A bound method
+  is pickled as its name and its instance, so the implementation must be
+  picklable too, e.g. by defining a __getstate__ method leaving out its
+  manager. Binding an implementation which cannot be pickled fails.
+
+  The implementation is pickled for each call, so the state it holds is
+  copied to the process running the call, and the changes the call makes to
+  it are lost.
+  """
+
+  def __init__(self, nb_processes):
+    # Each call blocks a thread while it runs in a process.
+    ThreadPoolExecutor.__init__(self, nb_processes)
+    self._process_pool = multiprocessing.Pool(nb_processes)
+
+  def CheckImplementation(self, impl):
+    try:
+      cPickle.dumps(impl, cPickle.HIGHEST_PROTOCOL)
+    except Exception as e:
+      raise cPickle.PicklingError(
+          'The implementations run by a ProcessPoolExecutor must be '
+          'picklable: %s' % e)
+
+  def Close(self):
+    ThreadPoolExecutor.Close(self)
+    self._process_pool.close()
+
+  def _Run(self, function, args, kwargs, callback):
+    def Callback(succeeded, result):
+      # If the call could be sent to a process, result is the result of _Call
+      # in that process.
+      if succeeded:
+        callback(*result)
+      else:
+        callback(succeeded, result)
+    if getattr(function, 'im_self', None) is not None:
+      function = _BoundMethod(function.im_self, function.__name__)
+    ThreadPoolExecutor._Run(self, self._process_pool.apply,
+                            (_Call, (function, args, kwargs)), None, Callback)
+
+
+class RunLoopPoster(object):
+  """
+  Posts callbacks from any thread to the run loop of the thread which created
+  the poster. RunLoop.PostDelayedTask can only be called from the thread of the
+  run loop, so the run loop is woken up by writing to a message pipe it waits
+  on.
+  """
+
+  _CURRENT = threading.local()
+
+  def __init__(self):
+    self._loop = weakref.ref(system.RunLoop.Current())
+    self._pipe = system.MessagePipe()
+    self._tasks = collections.deque()
+    self._Wait()
+
+  @classmethod
+  def Current(cls):
+    """Returns the poster of the current run loop, creating it if needed."""
+    loop = system.RunLoop.Current()
+    poster = getattr(cls._CURRENT, 'poster', None)
+    # A thread can run several run loops in turn, and the pipe of a poster is
+    # only waited on by the run loop which created it.
+    if poster is None or poster._loop() is not loop:
+      poster = cls._CURRENT.poster = cls()
+    return poster
+
+  def Post(self, callback, args):
+    """Calls callback(*args) on the run loop. Can be called from any thread."""
+    self._tasks.append((callback, args))
+    self._pipe.handle1.WriteMessage()
+
+  def _Wait(self):
+    self._pipe.handle0.AsyncWait(system.HANDLE_SIGNAL_READABLE,
+                                 system.DEADLINE_INDEFINITE,
+                                 self._OnReadable)
+
+  def _OnReadable(self, result):
+    if result != system.RESULT_OK:
+      return
+    while self._pipe.handle0.ReadMessage()[0] == system.RESULT_OK:
+      pass
+    try:
+      while self._tasks:
+        (callback, args) = self._tasks.popleft()
+        callback(*args)
+    finally:
+      self._Wait()
+
+
+class _BoundMethod(object):
+  """
+  A picklable bound method, as bound methods themselves cannot be pickled.
+  """
+
+  def __init__(self, instance, name):
+    self.instance = instance
+    self.name = name
+
+  def __call__(self, *args, **kwargs):
+    return getattr(self.instance, self.name)(*args, **kwargs)
+
+
+def _Call(function, args, kwargs=None):
+  """
+  Returns (True, function(*args, **kwargs)), or (False, exception) if function
+  raised an exception.
+  """
+  try:
+    if kwargs:
+      return (True, function(*args, **kwargs))
+    return (True, function(*args))
+  except Exception as e:
+    # The traceback is not attached to the exception, as it must stay
+    # picklable to be returned from a process.
+    return (False, e)
@@ -9,15 +9,18 @@ It is splitted from mojo_bindings.reflection because it uses some generated code
 that would create a cyclic dependency.
 """
 
+import inspect
 import logging
 import sys
 
 # pylint: disable=F0401
 import interface_control_messages_mojom
 import mojo_bindings.messaging as messaging
+import mojo_bindings.metrics as metrics
 import mojo_bindings.promise as promise
 import mojo_bindings.reflection as reflection
 import mojo_bindings.serialization as serialization
+import mojo_bindings.shared_buffers as shared_buffers
 import mojo_system
 
 
@@ -102,9 +105,38 @@ class InterfaceManager(object):
     self.version = version
     self.methods = methods
     self.service_name = service_name
+    self._methods_by_ordinal = dict((m.ordinal, m) for m in methods)
     self.interface_class = None
     self._proxy_class = None
     self._stub_class = None
+    self._executor = None
+    self._ordered_responses = True
+    self._shared_buffer_threshold = None
+
+  def SetExecutor(self, executor, ordered_responses=True):
+    """
+    Sets the executor.Executor running the methods of the implementations
+    bound from now on. By default, methods run inline on the run loop. Binding
+    an implementation the executor cannot run raises an exception, e.g. an
+    implementation which cannot be pickled for an
+    executor.ProcessPoolExecutor.
+
+    If ordered_responses is True, the responses sent over a pipe follow the
+    order of the requests, even if the methods complete in a different order.
+    """
+    self._executor = executor
+    self._ordered_responses = ordered_responses
+
+  def SetSharedBufferThreshold(self, threshold):
+    """
+    Sets the size in bytes above which the arrays of native types sent by the
+    proxies and implementations created from now on are sent in shared
+    buffers, see shared_buffers. They also accept such arrays in the messages
+    they receive. Both sides of the pipes must enable it, so it is only
+    possible when the other side also uses the python bindings. None disables
+    it, which is the default.
+    """
+    self._shared_buffer_threshold = threshold
 
   def Proxy(self, handle, version=0):
     router = messaging.Router(handle)
@@ -120,18 +152,66 @@ class InterfaceManager(object):
     error_handler = _ProxyErrorHandler()
     router.SetErrorHandler(error_handler)
 
+    # Give an instance manager to the implementation to allow it to close
+    # the connection.
+    impl.manager = InstanceManager(self, router, error_handler)
+
+    if self._executor is not None:
+      try:
+        self._executor.CheckImplementation(impl)
+      except:
+        router.Close()
+        raise
+
     # Retain the router, until an error happen.
     retainer = _Retainer(router)
     def Cleanup(_):
       retainer.release()
     error_handler.AddCallback(Cleanup)
 
-    # Give an instance manager to the implementation to allow it to close
-    # the connection.
-    impl.manager = InstanceManager(self, router, error_handler)
-
     router.Start()
 
+  def ValidateMessage(self, message):
+    """
+    Checks that message is a well-formed request or response for this
+    interface, without deserializing its payload. Raises a
+    serialization.DeserializationException describing the first violation
+    found.
+    """
+    header = message.header
+    if header.message_type == interface_control_messages_mojom.RUN_MESSAGE_ID:
+      parameters_struct = interface_control_messages_mojom.RunMessageParams
+      response_struct = (
+          interface_control_messages_mojom.RunResponseMessageParams)
+    elif (header.message_type ==
+          interface_control_messages_mojom.RUN_OR_CLOSE_PIPE_MESSAGE_ID):
+      parameters_struct = (
+          interface_control_messages_mojom.RunOrClosePipeMessageParams)
+      response_struct = None
+    elif header.message_type in self._methods_by_ordinal:
+      method = self._methods_by_ordinal[header.message_type]
+      parameters_struct = method.parameters_struct
+      response_struct = method.response_struct
+    else:
+      raise serialization.DeserializationException(
+          'Unknown message type: %d' % header.message_type)
+
+    if header.is_response:
+      if not response_struct:
+        raise serialization.DeserializationException(
+            'Unexpected response for message type: %d' % header.message_type)
+      payload_struct = response_struct
+    else:
+      if header.expects_response != bool(response_struct):
+        raise serialization.DeserializationException(
+            'Incorrect flags for message type: %d' % header.message_type)
+      payload_struct = parameters_struct
+
+    payload = message.payload
+    payload_struct.Validate(serialization.RootDeserializationContext(
+        payload.data, payload.handles,
+        self._shared_buffer_threshold is not None))
+
   def NewRequest(self):
     pipe = mojo_system.MessagePipe()
     return (self.Proxy(pipe.handle0), reflection.InterfaceRequest(pipe.handle1))
@@ -152,7 +232,8 @@ class InterfaceManager(object):
           (self.interface_class, reflection.InterfaceProxy),
           dictionary)
 
-    proxy = self._proxy_class(router, error_handler)
+    proxy = self._proxy_class(router, error_handler,
+                              self._shared_buffer_threshold)
     # Give an instance manager to the proxy to allow to close the connection.
     proxy.manager = ProxyInstanceManager(
         self, proxy, router, error_handler, version)
@@ -160,17 +241,18 @@ class InterfaceManager(object):
 
   def _Stub(self, impl):
     if not self._stub_class:
-      accept_method = _StubAccept(self.methods)
+      accept_method = _StubAccept()
       dictionary = {
         '__module__': __name__,
-        '__init__': _StubInit,
+        '__init__': _StubInit(self.name, self.methods),
         'Accept': accept_method,
         'AcceptWithResponder': accept_method,
       }
       self._stub_class = type('%sStub' % self.name,
                               (messaging.MessageReceiverWithResponder,),
                               dictionary)
-    return self._stub_class(impl)
+    return self._stub_class(impl, self._executor, self._ordered_responses,
+                            self._shared_buffer_threshold)
 
 
 class InstanceManager(object):
@@ -192,8 +274,12 @@ class InstanceManager(object):
     self._error_handler.OnClose()
     return self._router.PassMessagePipe()
 
-  def AddOnErrorCallback(self, callback):
-    self._error_handler.AddCallback(lambda _: callback(), False)
+  def AddOnErrorCallback(self, callback, call_on_close=False):
+    """
+    Calls callback() when the connection fails, and also when it is closed
+    through this manager if call_on_close is True.
+    """
+    self._error_handler.AddCallback(lambda _: callback(), call_on_close)
 
 
 class ProxyInstanceManager(InstanceManager):
@@ -319,9 +405,10 @@ class _Retainer(object):
     _Retainer._RETAINED.remove(self)
 
 
-def _ProxyInit(self, router, error_handler):
+def _ProxyInit(self, router, error_handler, shared_buffer_threshold):
   self._router = router
   self._error_handler = error_handler
+  self._shared_buffer_threshold = shared_buffer_threshold
 
 
 # pylint: disable=W0212
@@ -331,15 +418,31 @@ def _ProxyMethodCall(method):
     flags = messaging.MESSAGE_EXPECTS_RESPONSE_FLAG
   def _Call(self, *args, **kwargs):
     def GenerationMethod(resolve, reject):
-      message = _GetMessage(method, flags, None, *args, **kwargs)
+      method_metrics = None
+      recorder = metrics.Current()
+      if recorder:
+        method_metrics = recorder.ForMethod(
+            self.manager.interface_manager.name, method.name, metrics.PROXY)
+        start = metrics.Now()
+      message = _GetMessage(method, flags, None,
+                            self._shared_buffer_threshold, *args, **kwargs)
+      if method_metrics:
+        sent = metrics.Now()
+        method_metrics.RecordRequestSent(message, sent - start)
       if method.response_struct:
         def Accept(message):
           try:
+            if method_metrics:
+              received = metrics.Now()
             assert message.header.message_type == method.ordinal
             payload = message.payload
             response = method.response_struct.Deserialize(
-                serialization.RootDeserializationContext(payload.data,
-                                                         payload.handles))
+                serialization.RootDeserializationContext(
+                    payload.data, payload.handles,
+                    self._shared_buffer_threshold is not None))
+            if method_metrics:
+              method_metrics.RecordResponseReceived(
+                  message, metrics.Now() - received, received - sent)
             as_dict = response.AsDict()
             if len(as_dict) == 1:
               value = as_dict.values()[0]
@@ -369,29 +472,51 @@ def _ProxyMethodCall(method):
   return _Call
 
 
-def _GetMessageWithStruct(struct, ordinal, flags, request_id):
+def _GetMessageWithStruct(struct, ordinal, flags, request_id,
+                          shared_buffer_threshold=None):
   header = messaging.MessageHeader(
       ordinal, flags, 0 if request_id is None else request_id)
-  data = header.Serialize()
-  (payload, handles) = struct.Serialize()
-  data.extend(payload)
+  # The payload is serialized directly after the header, in the same buffer.
+  if shared_buffer_threshold is None:
+    (data, handles) = struct.Serialize(0, header.Serialize())
+  else:
+    with shared_buffers.Threshold(shared_buffer_threshold):
+      (data, handles) = struct.Serialize(0, header.Serialize())
   return messaging.Message(data, handles, header)
 
 
-def _GetMessage(method, flags, request_id, *args, **kwargs):
+def _GetMessage(method, flags, request_id, shared_buffer_threshold, *args,
+                **kwargs):
   if flags == messaging.MESSAGE_IS_RESPONSE_FLAG:
     struct = method.response_struct(*args, **kwargs)
   else:
     struct = method.parameters_struct(*args, **kwargs)
-  return _GetMessageWithStruct(struct, method.ordinal, flags, request_id)
+  return _GetMessageWithStruct(struct, method.ordinal, flags, request_id,
+                               shared_buffer_threshold)
 
 
-def _StubInit(self, impl):
-  self.impl = impl
-
-
-def _StubAccept(methods):
+def _StubInit(name, methods):
   methods_by_ordinal = dict((m.ordinal, m) for m in methods)
+  def Init(self, impl, executor, ordered_responses, shared_buffer_threshold):
+    self.impl = impl
+    self._interface_name = name
+    self._methods_by_ordinal = methods_by_ordinal
+    # The dispatch table of the stub: the implementation of each method and
+    # whether it is called positionally, looked up on its first call so that
+    # unimplemented methods only fail when called.
+    self._impl_methods = {}
+    self._executor = executor
+    self._ordered_responses = ordered_responses
+    self._shared_buffer_threshold = shared_buffer_threshold
+    # The results of the calls run by the executor which are waiting for the
+    # results of the previous calls, indexed by call number.
+    self._pending_results = {}
+    self._next_call = 0
+    self._next_result = 0
+  return Init
+
+
+def _StubAccept():
   def Accept(self, message, responder=None):
     try:
       header = message.header
@@ -401,44 +526,145 @@ def _StubAccept(methods):
       if (header.message_type ==
           interface_control_messages_mojom.RUN_OR_CLOSE_PIPE_MESSAGE_ID):
         return _RunMessageOrClosePipe(self.impl.manager, message)
-      assert header.message_type in methods_by_ordinal
-      method = methods_by_ordinal[header.message_type]
+      assert header.message_type in self._methods_by_ordinal
+      method = self._methods_by_ordinal[header.message_type]
+      dispatch = self._impl_methods.get(method.ordinal)
+      if dispatch is None:
+        impl_method = getattr(self.impl, method.name)
+        dispatch = (impl_method, _AcceptsPositionally(
+            impl_method, method.parameters_struct._field_names))
+        self._impl_methods[method.ordinal] = dispatch
+      (impl_method, positional) = dispatch
+      method_metrics = None
+      recorder = metrics.Current()
+      if recorder:
+        method_metrics = recorder.ForMethod(self._interface_name, method.name,
+                                            metrics.STUB)
+        start = metrics.Now()
       payload = message.payload
-      parameters = method.parameters_struct.Deserialize(
-          serialization.RootDeserializationContext(
-              payload.data, payload.handles)).AsDict()
-      response = getattr(self.impl, method.name)(**parameters)
-      if header.expects_response:
-        @promise.async
-        def SendResponse(response):
-          if isinstance(response, dict):
-            response_message = _GetMessage(method,
-                                           messaging.MESSAGE_IS_RESPONSE_FLAG,
-                                           header.request_id,
-                                           **response)
-          else:
-            response_message = _GetMessage(method,
-                                           messaging.MESSAGE_IS_RESPONSE_FLAG,
-                                           header.request_id,
-                                           response)
-          return responder.Accept(response_message)
-        p = SendResponse(response)
-        if self.impl.manager:
-          # Close the connection in case of error.
-          p.Catch(lambda _: self.impl.manager.Close())
+      context = serialization.RootDeserializationContext(
+          payload.data, payload.handles,
+          self._shared_buffer_threshold is not None)
+      if positional:
+        args = method.parameters_struct.DeserializeToTuple(context)
+        kwargs = None
+      else:
+        args = ()
+        kwargs = method.parameters_struct.Deserialize(context).AsDict()
+      if method_metrics:
+        method_metrics.RecordRequestReceived(message, metrics.Now() - start)
+      call = (method, header, responder, method_metrics)
+      if self._executor is None:
+        if method_metrics:
+          start = metrics.Now()
+        if positional:
+          response = impl_method(*args)
+        else:
+          response = impl_method(**kwargs)
+        if method_metrics:
+          method_metrics.RecordHandler(metrics.Now() - start)
+        _StubRespond(self, call, response)
+        return True
+      _StubExecute(self, impl_method, args, kwargs, call)
       return True
     # pylint: disable=W0702
     except:
-      # Close the connection in case of error.
-      logging.warning(
-          'Error occured in accept method. Connection will be closed.')
-      logging.debug("Exception", exc_info=True)
-      if self.impl.manager:
-        self.impl.manager.Close()
+      _StubClose(self)
       return False
   return Accept
 
 
+# pylint: disable=W0212
+def _StubExecute(stub, impl_method, args, kwargs, call):
+  """Runs impl_method with the executor of stub, and responds to call."""
+  call_number = stub._next_call
+  stub._next_call += 1
+  (_, _, _, method_metrics) = call
+  if method_metrics:
+    start = metrics.Now()
+  def OnResult(succeeded, result):
+    if method_metrics:
+      method_metrics.RecordHandler(metrics.Now() - start)
+    if not stub._ordered_responses:
+      _StubOnResult(stub, call, succeeded, result)
+      return
+    stub._pending_results[call_number] = (call, succeeded, result)
+    while stub._next_result in stub._pending_results:
+      pending_result = stub._pending_results.pop(stub._next_result)
+      stub._next_result += 1
+      _StubOnResult(stub, *pending_result)
+  stub._executor.Execute(impl_method, args, OnResult, kwargs)
+
+
+def _AcceptsPositionally(function, names):
+  """
+  Returns whether the parameters named names can be passed positionally to
+  function, i.e. whether its arguments are exactly those names, in that order.
+  The other implementations are called with keyword arguments.
+  """
+  try:
+    (args, varargs, keywords, _) = inspect.getargspec(function)
+  except TypeError:
+    # Not a python function, e.g. a callable object.
+    return False
+  if inspect.ismethod(function) and function.im_self is not None:
+    args = args[1:]
+  return not varargs and not keywords and tuple(args) == names
+
+
+def _StubOnResult(stub, call, succeeded, result):
+  try:
+    if not succeeded:
+      raise result
+    _StubRespond(stub, call, result)
+  # pylint: disable=W0702
+  except:
+    _StubClose(stub)
+
+
+def _StubRespond(stub, call, response):
+  """Sends the response returned by the implementation, if one is expected."""
+  (method, header, responder, method_metrics) = call
+  if not header.expects_response:
+    return
+  def SendResponse(response):
+    if method_metrics:
+      start = metrics.Now()
+    if isinstance(response, dict):
+      response_message = _GetMessage(method,
+                                     messaging.MESSAGE_IS_RESPONSE_FLAG,
+                                     header.request_id,
+                                     stub._shared_buffer_threshold,
+                                     **response)
+    else:
+      response_message = _GetMessage(method,
+                                     messaging.MESSAGE_IS_RESPONSE_FLAG,
+                                     header.request_id,
+                                     stub._shared_buffer_threshold,
+                                     response)
+    if method_metrics:
+      method_metrics.RecordResponseSent(response_message,
+                                        metrics.Now() - start)
+    return responder.Accept(response_message)
+  if not isinstance(response, promise.Promise):
+    # The response is available, send it synchronously.
+    SendResponse(response)
+    return
+  p = promise.async(SendResponse)(response)
+  if stub.impl.manager:
+    # Close the connection in case of error.
+    p.Catch(lambda _: stub.impl.manager.Close())
+
+
+def _StubClose(stub):
+  # Close the connection in case of error.
+  logging.warning(
+      'Error occured in accept method. Connection will be closed.')
+  logging.debug("Exception", exc_info=True)
+  if stub.impl.manager:
+    stub.impl.manager.Close()
+
+
 def _RunMessage(manager, message, responder):
   response = interface_control_messages_mojom.RunResponseMessageParams()
   response.reserved0 = 16
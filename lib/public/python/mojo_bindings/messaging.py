@@ -7,6 +7,7 @@
 
 import struct
 import sys
+import threading
 import weakref
 
 import mojo_bindings.serialization as serialization
@@ -20,6 +21,14 @@ NO_FLAG = 0
 MESSAGE_EXPECTS_RESPONSE_FLAG = 1 << 0
 MESSAGE_IS_RESPONSE_FLAG = 1 << 1
 
+# The capture.MessageCapture recording the messages of the connectors created
+# from now on, if any.
+_message_capture = None
+
+# The dispatcher.WaitManyDispatcher of the connectors created from now on on
+# the current thread, if any.
+_dispatchers = threading.local()
+
 
 class MessagingException(Exception):
   def __init__(self, *args, **kwargs):
@@ -28,7 +37,14 @@ class MessagingException(Exception):
 
 
 class MessageHeader(object):
-  """The header of a mojo message."""
+  """
+  The header of a mojo message.
+
+  A header deserialized from a message is a view on the data of the message:
+  the request id is only read from the data when it is accessed.
+  """
+
+  __slots__ = ('_message_type', '_flags', '_request_id', '_data')
 
   _SIMPLE_MESSAGE_VERSION = 0
   _SIMPLE_MESSAGE_STRUCT = struct.Struct("<IIII")
@@ -48,11 +64,10 @@ class MessageHeader(object):
 
   @classmethod
   def Deserialize(cls, data):
-    buf = buffer(data)
     if len(data) < cls._SIMPLE_MESSAGE_STRUCT.size:
       raise serialization.DeserializationException('Header is too short.')
     (size, version, message_type, flags) = (
-        cls._SIMPLE_MESSAGE_STRUCT.unpack_from(buf))
+        cls._SIMPLE_MESSAGE_STRUCT.unpack_from(data))
     if (version < cls._SIMPLE_MESSAGE_VERSION):
       raise serialization.DeserializationException('Incorrect version.')
     request_id = 0
@@ -62,8 +77,8 @@ class MessageHeader(object):
       if (size < cls._MESSAGE_WITH_REQUEST_ID_SIZE or
           len(data) < cls._MESSAGE_WITH_REQUEST_ID_SIZE):
         raise serialization.DeserializationException('Header is too short.')
-      (request_id, ) = cls._REQUEST_ID_STRUCT.unpack_from(
-          buf, cls._REQUEST_ID_OFFSET)
+      # Read from data when accessed.
+      request_id = None
     return MessageHeader(message_type, flags, request_id, data)
 
   @property
@@ -74,6 +89,9 @@ class MessageHeader(object):
   @property
   def request_id(self):
     assert self.has_request_id
+    if self._request_id is None:
+      (self._request_id, ) = self._REQUEST_ID_STRUCT.unpack_from(
+          self._data, self._REQUEST_ID_OFFSET)
     return self._request_id
 
   # pylint: disable=E0202
@@ -122,7 +140,12 @@ class MessageHeader(object):
 
 
 class Message(object):
-  """A message for a message pipe. This contains data and handles."""
+  """
+  A message for a message pipe. This contains data and handles.
+
+  The header and the payload of a received message are views on its data, and
+  are only built when accessed.
+  """
 
   def __init__(self, data=None, handles=None, header=None):
     self.data = data
@@ -139,7 +162,9 @@ class Message(object):
   @property
   def payload(self):
     if self._payload is None:
-      self._payload = Message(self.data[self.header.size:], self.handles)
+      # The payload shares the data of the message instead of copying it.
+      self._payload = Message(buffer(self.data, self.header.size),
+                              self.handles)
     return self._payload
 
   def SetRequestId(self, request_id):
@@ -214,6 +239,11 @@ class Connector(MessageReceiver):
     self._cancellable = None
     self._incoming_message_receiver = None
     self._error_handler = None
+    self._capture = None
+    self._capture_pipe = None
+    self._dispatcher = getattr(_dispatchers, 'dispatcher', None)
+    if _message_capture:
+      self.SetMessageCapture(_message_capture)
 
   def __del__(self):
     if self._cancellable:
@@ -233,11 +263,29 @@ class Connector(MessageReceiver):
     """
     self._error_handler = error_handler
 
+  def SetMessageCapture(self, capture):
+    """
+    Set the capture.MessageCapture recording the messages sent and received
+    through the owned message pipe, or None to stop recording them.
+    """
+    self._capture = capture
+    self._capture_pipe = capture.NewPipe() if capture else None
+
+  def SetDispatcher(self, dispatcher):
+    """
+    Set the dispatcher.WaitManyDispatcher waiting for the incoming messages,
+    or None to wait with the run loop. Must be called before Start.
+    """
+    assert not self._cancellable
+    self._dispatcher = dispatcher
+
   def Start(self):
     assert not self._cancellable
     self._RegisterAsyncWaiterForRead()
 
   def Accept(self, message):
+    if self._capture:
+      self._capture.RecordOutgoing(self._capture_pipe, message)
     result = self._handle.WriteMessage(message.data, message.handles)
     return result == system.RESULT_OK
 
@@ -270,6 +318,13 @@ class Connector(MessageReceiver):
 
   def _RegisterAsyncWaiterForRead(self) :
     assert not self._cancellable
+    if self._dispatcher:
+      self._cancellable = self._dispatcher.AsyncWait(
+          self._handle,
+          system.HANDLE_SIGNAL_READABLE,
+          system.DEADLINE_INDEFINITE,
+          _WeakCallback(self._OnAsyncWaiterResult))
+      return
     self._cancellable = self._handle.AsyncWait(
         system.HANDLE_SIGNAL_READABLE,
         system.DEADLINE_INDEFINITE,
@@ -278,9 +333,17 @@ class Connector(MessageReceiver):
   def _ReadOutstandingMessages(self):
     result = None
     dispatched = True
+    # With a dispatcher, the pipe waits behind the other ready pipes after a
+    # batch of messages.
+    nb_messages = self._dispatcher.messages_per_wake if self._dispatcher else -1
     while dispatched:
+      if nb_messages == 0:
+        self._RegisterAsyncWaiterForRead()
+        return
+      nb_messages -= 1
       result, dispatched = _ReadAndDispatchMessage(
-          self._handle, self._incoming_message_receiver)
+          self._handle, self._incoming_message_receiver, self._capture,
+          self._capture_pipe)
     if result == system.RESULT_SHOULD_WAIT:
       self._RegisterAsyncWaiterForRead()
       return
@@ -320,6 +383,20 @@ class Router(MessageReceiverWithResponder):
     """
     self._connector.SetErrorHandler(error_handler)
 
+  def SetMessageCapture(self, capture):
+    """
+    Set the capture.MessageCapture recording the messages sent and received
+    through the owned message pipe, or None to stop recording them.
+    """
+    self._connector.SetMessageCapture(capture)
+
+  def SetDispatcher(self, dispatcher):
+    """
+    Set the dispatcher.WaitManyDispatcher waiting for the incoming messages,
+    or None to wait with the run loop. Must be called before Start.
+    """
+    self._connector.SetDispatcher(dispatcher)
+
   def Accept(self, message):
     # A message without responder is directly forwarded to the connector.
     return self._connector.Accept(message)
@@ -380,6 +457,25 @@ class ForwardingMessageReceiver(MessageReceiver):
     return self._callback(message)
 
 
+def SetMessageCapture(capture):
+  """
+  Set the capture.MessageCapture recording the messages of all the connectors
+  created from now on, or None to stop recording the messages of new
+  connectors.
+  """
+  # pylint: disable=W0603
+  global _message_capture
+  _message_capture = capture
+
+
+def SetDispatcher(dispatcher):
+  """
+  Set the dispatcher.WaitManyDispatcher used by the connectors created from
+  now on on the current thread, or None to wait with the run loop.
+  """
+  _dispatchers.dispatcher = dispatcher
+
+
 def _WeakCallback(callback):
   func = callback.im_func
   self = callback.im_self
@@ -393,16 +489,25 @@ def _WeakCallback(callback):
   return Callback
 
 
-def _ReadAndDispatchMessage(handle, message_receiver):
+def _ReadAndDispatchMessage(handle, message_receiver, capture=None,
+                            capture_pipe=None):
   dispatched = False
   (result, _, sizes) = handle.ReadMessage()
-  if result == system.RESULT_OK and message_receiver:
-    dispatched = message_receiver.Accept(Message(bytearray(), []))
+  if result == system.RESULT_OK:
+    message = Message(bytearray(), [])
+    if capture:
+      capture.RecordIncoming(capture_pipe, message)
+    if message_receiver:
+      dispatched = message_receiver.Accept(message)
   if result != system.RESULT_RESOURCE_EXHAUSTED:
     return (result, dispatched)
   (result, data, _) = handle.ReadMessage(bytearray(sizes[0]), sizes[1])
-  if result == system.RESULT_OK and message_receiver:
-    dispatched = message_receiver.Accept(Message(data[0], data[1]))
+  if result == system.RESULT_OK:
+    message = Message(data[0], data[1])
+    if capture:
+      capture.RecordIncoming(capture_pipe, message)
+    if message_receiver:
+      dispatched = message_receiver.Accept(message)
   return (result, dispatched)
 
 def _HasRequestId(flags):
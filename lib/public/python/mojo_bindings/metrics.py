@@ -0,0 +1,227 @@
+# Copyright 2015 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""
+Per-method metrics of the interfaces used through the python bindings.
+
+The metrics are only recorded once enabled:
+
+  metrics.Enable()
+  ...
+  print metrics.Current().ToJson()
+
+Proxies record the requests they send and the round-trip latency of their
+responses, stubs record the requests they handle and the responses they send.
+Durations are in microseconds.
+"""
+
+import json
+import threading
+
+# pylint: disable=E0611,F0401
+import mojo_system as system
+
+
+# The side of the pipe the metrics of a method are recorded on.
+PROXY = 'proxy'
+STUB = 'stub'
+
+# The Metrics being recorded, if any.
+_current = None
+
+
+def Enable():
+  """Starts recording metrics, and returns the Metrics recording them."""
+  # pylint: disable=W0603
+  global _current
+  if _current is None:
+    _current = Metrics()
+  return _current
+
+
+def Disable():
+  """Stops recording metrics."""
+  # pylint: disable=W0603
+  global _current
+  _current = None
+
+
+def Current():
+  """Returns the Metrics being recorded, or None if metrics are disabled."""
+  return _current
+
+
+def Now():
+  """Returns the current time, in microseconds."""
+  return system.GetTimeTicksNow()
+
+
+class Histogram(object):
+  """
+  Histogram of non-negative values, with power of two buckets: the bucket of
+  index i counts the values in [2^(i-1), 2^i).
+  """
+
+  def __init__(self):
+    self.count = 0
+    self.total = 0
+    self.max = 0
+    self.buckets = []
+
+  def Add(self, value):
+    self.count += 1
+    self.total += value
+    self.max = max(self.max, value)
+    index = int(value).bit_length()
+    if index >= len(self.buckets):
+      self.buckets.extend([0] * (index + 1 - len(self.buckets)))
+    self.buckets[index] += 1
+
+  @property
+  def mean(self):
+    if not self.count:
+      return 0
+    return float(self.total) / self.count
+
+  def Percentile(self, percent):
+    """
+    Returns an upper bound of the given percentile: the upper bound of the
+    bucket containing it.
+    """
+    if not self.count:
+      return 0
+    rank = percent / 100.0 * self.count
+    seen = 0
+    for (index, count) in enumerate(self.buckets):
+      seen += count
+      if seen >= rank and count:
+        return min(1 << index, self.max)
+    return self.max
+
+  def AsDict(self):
+    return {
+      'count': self.count,
+      'total': self.total,
+      'mean': self.mean,
+      'max': self.max,
+      'p50': self.Percentile(50),
+      'p90': self.Percentile(90),
+      'p99': self.Percentile(99),
+      'buckets': self.buckets,
+    }
+
+
+class MethodMetrics(object):
+  """
+  The metrics of a method, on one side of the pipes. The sizes are in bytes,
+  the durations in microseconds. Can be updated from several threads.
+
+  On the PROXY side:
+    requests_sent, request_size, request_handles and serialization count the
+    requests sent, deserialization and response_size the responses received,
+    and round_trip the time between sending a request and receiving its
+    response.
+
+  On the STUB side:
+    requests_received, request_size, request_handles and deserialization count
+    the requests handled, handler the time spent running the implementation,
+    and serialization, response_size and response_handles the responses sent.
+    When the implementation runs on an executor, handler includes the time
+    waiting for the executor.
+  """
+
+  _HISTOGRAMS = ('request_size', 'response_size', 'serialization',
+                 'deserialization', 'handler', 'round_trip')
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self.requests_sent = 0
+    self.requests_received = 0
+    self.request_handles = 0
+    self.response_handles = 0
+    for name in self._HISTOGRAMS:
+      setattr(self, name, Histogram())
+
+  def RecordRequestSent(self, message, serialization_time):
+    with self._lock:
+      self.requests_sent += 1
+      self.request_size.Add(len(message.data))
+      self.request_handles += len(message.handles)
+      self.serialization.Add(serialization_time)
+
+  def RecordResponseReceived(self, message, deserialization_time,
+                             round_trip_time):
+    with self._lock:
+      self.response_size.Add(len(message.data))
+      self.response_handles += len(message.handles)
+      self.deserialization.Add(deserialization_time)
+      self.round_trip.Add(round_trip_time)
+
+  def RecordRequestReceived(self, message, deserialization_time):
+    with self._lock:
+      self.requests_received += 1
+      self.request_size.Add(len(message.data))
+      self.request_handles += len(message.handles)
+      self.deserialization.Add(deserialization_time)
+
+  def RecordHandler(self, handler_time):
+    with self._lock:
+      self.handler.Add(handler_time)
+
+  def RecordResponseSent(self, message, serialization_time):
+    with self._lock:
+      self.response_size.Add(len(message.data))
+      self.response_handles += len(message.handles)
+      self.serialization.Add(serialization_time)
+
+  def AsDict(self):
+    with self._lock:
+      result = {
+        'requests_sent': self.requests_sent,
+        'requests_received': self.requests_received,
+        'request_handles': self.request_handles,
+        'response_handles': self.response_handles,
+      }
+      for name in self._HISTOGRAMS:
+        result[name] = getattr(self, name).AsDict()
+      return result
+
+
+class Metrics(object):
+  """
+  The metrics of all the methods, indexed by interface name, method name and
+  side.
+  """
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._methods = {}
+
+  def ForMethod(self, interface_name, method_name, side):
+    """Returns the MethodMetrics of a method, creating it if needed."""
+    key = (interface_name, method_name, side)
+    method_metrics = self._methods.get(key)
+    if method_metrics is None:
+      with self._lock:
+        method_metrics = self._methods.setdefault(key, MethodMetrics())
+    return method_metrics
+
+  def Reset(self):
+    with self._lock:
+      self._methods = {}
+
+  def AsDict(self):
+    """
+    Returns the metrics as {interface name: {method name: {side: metrics}}}.
+    """
+    with self._lock:
+      methods = self._methods.items()
+    result = {}
+    for ((interface_name, method_name, side), method_metrics) in methods:
+      methods_result = result.setdefault(interface_name, {})
+      methods_result.setdefault(method_name, {})[side] = method_metrics.AsDict()
+    return result
+
+  def ToJson(self):
+    return json.dumps(self.AsDict(), sort_keys=True, indent=2)
@@ -2,9 +2,17 @@
 # Use of this source code is governed by a BSD-style license that can be
 # found in the LICENSE file.
 
-"""The metaclasses used by the mojo python bindings."""
+"""
+The metaclasses used by the mojo python bindings.
+
+The classes of structs and unions are materialized lazily: their descriptor is
+only processed when the class is first instantiated, (de)serialized, or when one
+of its other attributes is accessed. The descriptor can also be a callable
+returning it, so that the field descriptors are not built at import either.
+"""
 
 import itertools
+import threading
 
 # pylint: disable=F0401
 import mojo_bindings.serialization as serialization
@@ -76,55 +84,19 @@ class MojoStructType(type):
       - 2 enums 'ENUM1' and 'ENUM2', each of those having 2 values, 'V1' and
         'V2';
       - 1 int32 field named 'x'.
+
+      DESCRIPTOR can also be a callable returning the descriptor. Either way,
+      it is only processed when the class is first used.
   """
 
   def __new__(mcs, name, bases, dictionary):
     dictionary['__slots__'] = ('_fields')
-    descriptor = dictionary.pop('DESCRIPTOR', {})
-
-    # Add constants
-    dictionary.update(descriptor.get('constants', {}))
-
-    # Add enums
-    enums = descriptor.get('enums', {})
-    for key in enums:
-      dictionary[key] = MojoEnumType(key, (object,), { 'VALUES': enums[key] })
-
-    # Add fields
-    groups = descriptor.get('fields', [])
-
-    fields = list(
-        itertools.chain.from_iterable([group.descriptors for group in groups]))
-    fields.sort(key=lambda f: f.index)
-    for field in fields:
-      dictionary[field.name] = _BuildProperty(field)
-
-    # Add init
-    dictionary['__init__'] = _StructInit(fields)
+    return _NewLazyClass(mcs, name, bases, dictionary, _BuildStructMembers,
+                         ('__init__', '__setstate__'),
+                         ('Deserialize', 'DeserializeToTuple', 'Validate'))
 
-    # Add serialization method
-    serialization_object = serialization.Serialization(groups)
-    def Serialize(self, handle_offset=0):
-      return serialization_object.Serialize(self, handle_offset)
-    dictionary['Serialize'] = Serialize
-
-    # pylint: disable=W0212
-    def AsDict(self):
-      return self._fields
-    dictionary['AsDict'] = AsDict
-
-    def Deserialize(cls, context):
-      result = cls.__new__(cls)
-      fields = {}
-      serialization_object.Deserialize(fields, context)
-      result._fields = fields
-      return result
-    dictionary['Deserialize'] = classmethod(Deserialize)
-
-    dictionary['__eq__'] = _StructEq(fields)
-    dictionary['__ne__'] = _StructNe
-
-    return type.__new__(mcs, name, bases, dictionary)
+  def __getattr__(cls, key):
+    return _GetLazyAttribute(cls, key)
 
   # Prevent adding new attributes, or mutating constants.
   def __setattr__(cls, key, value):
@@ -139,97 +111,12 @@ class MojoUnionType(type):
 
   def __new__(mcs, name, bases, dictionary):
     dictionary['__slots__'] = ('_cur_field', '_data')
-    descriptor = dictionary.pop('DESCRIPTOR', {})
-
-    fields = descriptor.get('fields', [])
-    def _BuildUnionProperty(field):
+    return _NewLazyClass(mcs, name, bases, dictionary, _BuildUnionMembers,
+                         ('__init__', '__setstate__'),
+                         ('Deserialize', 'Validate'))
 
-      # pylint: disable=W0212
-      def Get(self):
-        if self._cur_field != field:
-          raise AttributeError('%s is not currently set' % field.name,
-              field.name, self._cur_field.name)
-        return self._data
-
-      # pylint: disable=W0212
-      def Set(self, value):
-        self._cur_field = field
-        self._data = field.field_type.Convert(value)
-
-      return property(Get, Set)
-
-    for field in fields:
-      dictionary[field.name] = _BuildUnionProperty(field)
-
-    def UnionInit(self, **kwargs):
-      self.SetInternals(None, None)
-      items = kwargs.items()
-      if len(items) == 0:
-        return
-
-      if len(items) > 1:
-        raise TypeError('only 1 member may be set on a union.')
-
-      setattr(self, items[0][0], items[0][1])
-    dictionary['__init__'] = UnionInit
-
-    serializer = serialization.UnionSerializer(fields)
-    def SerializeUnionInline(self, handle_offset=0):
-      return serializer.SerializeInline(self, handle_offset)
-    dictionary['SerializeInline'] = SerializeUnionInline
-
-    def SerializeUnion(self, handle_offset=0):
-      return serializer.Serialize(self, handle_offset)
-    dictionary['Serialize'] = SerializeUnion
-
-    def DeserializeUnion(cls, context):
-      return serializer.Deserialize(context, cls)
-    dictionary['Deserialize'] = classmethod(DeserializeUnion)
-
-    class Tags(object):
-      __metaclass__ = MojoEnumType
-      VALUES = [(field.name, field.index) for field in fields]
-    dictionary['Tags'] = Tags
-
-    def GetTag(self):
-      return self._cur_field.index
-    dictionary['tag'] = property(GetTag, None)
-
-    def GetData(self):
-      return self._data
-    dictionary['data'] = property(GetData, None)
-
-    def IsUnknown(self):
-      return not self._cur_field
-    dictionary['IsUnknown'] = IsUnknown
-
-    def UnionEq(self, other):
-      return (
-          (type(self) is type(other))
-          and (self.tag == other.tag)
-          and (self.data == other.data))
-    dictionary['__eq__'] = UnionEq
-
-    def UnionNe(self, other):
-      return not self.__eq__(other)
-    dictionary['__ne__'] = UnionNe
-
-    def UnionStr(self):
-      return '<%s.%s(%s): %s>' % (
-          self.__class__.__name__,
-          self._cur_field.name,
-          self.tag,
-          self.data)
-    dictionary['__str__'] = UnionStr
-    dictionary['__repr__'] = UnionStr
-
-    def SetInternals(self, field, data):
-      self._cur_field = field
-      self._data = data
-    dictionary['SetInternals'] = SetInternals
-
-
-    return type.__new__(mcs, name, bases, dictionary)
+  def __getattr__(cls, key):
+    return _GetLazyAttribute(cls, key)
 
 
 class InterfaceRequest(object):
@@ -260,6 +147,259 @@ class InterfaceProxy(object):
   pass
 
 
+# Serializes the materialization of lazy classes.
+_MATERIALIZATION_LOCK = threading.RLock()
+
+
+def _NewLazyClass(mcs, name, bases, dictionary, build_members, methods,
+                  class_methods):
+  """
+  Creates a class whose members are only built by build_members(descriptor)
+  when it is materialized. The given methods and class methods materialize the
+  class before calling their materialized version.
+  """
+  dictionary['_lazy_descriptor'] = dictionary.pop('DESCRIPTOR', {})
+  dictionary['_lazy_build_members'] = staticmethod(build_members)
+  dictionary['_lazy_methods'] = methods + class_methods
+  for method_name in methods:
+    dictionary[method_name] = _LazyMethod(method_name)
+  for method_name in class_methods:
+    dictionary[method_name] = classmethod(_LazyMethod(method_name))
+  return type.__new__(mcs, name, bases, dictionary)
+
+
+def _Materialize(cls):
+  """Materializes the lazy classes of the hierarchy of cls."""
+  with _MATERIALIZATION_LOCK:
+    for klass in cls.__mro__:
+      if '_lazy_descriptor' not in klass.__dict__:
+        continue
+      descriptor = klass.__dict__['_lazy_descriptor']
+      if callable(descriptor):
+        descriptor = descriptor()
+      members = klass.__dict__['_lazy_build_members'].__func__(descriptor)
+      lazy_methods = klass.__dict__['_lazy_methods']
+      # Other threads can use the class without taking the lock, through the
+      # members installed so far. So the lazy methods, which take the lock,
+      # are only replaced once all the other members are installed.
+      for (key, value) in members.iteritems():
+        if key not in lazy_methods:
+          type.__setattr__(klass, key, value)
+      for key in lazy_methods:
+        type.__setattr__(klass, key, members[key])
+      type.__delattr__(klass, '_lazy_descriptor')
+      type.__delattr__(klass, '_lazy_build_members')
+      type.__delattr__(klass, '_lazy_methods')
+
+
+def _LazyMethod(method_name):
+  def Method(self_or_cls, *args, **kwargs):
+    _Materialize(self_or_cls if isinstance(self_or_cls, type)
+                 else type(self_or_cls))
+    return getattr(self_or_cls, method_name)(*args, **kwargs)
+  Method.__name__ = method_name
+  return Method
+
+
+def _GetLazyAttribute(cls, key):
+  """Returns the attribute key of cls, materializing it if needed."""
+  if any('_lazy_descriptor' in klass.__dict__ for klass in cls.__mro__):
+    _Materialize(cls)
+  # Look the attribute up again even if the class is materialized, as another
+  # thread may have materialized it since the first lookup.
+  return type.__getattribute__(cls, key)
+
+
+def _BuildStructMembers(descriptor):
+  """Returns the members of the class of a struct."""
+  members = {}
+
+  # Add constants
+  members.update(descriptor.get('constants', {}))
+
+  # Add enums
+  enums = descriptor.get('enums', {})
+  for key in enums:
+    members[key] = MojoEnumType(key, (object,), { 'VALUES': enums[key] })
+
+  # Add fields
+  groups = descriptor.get('fields', [])
+
+  fields = list(
+      itertools.chain.from_iterable([group.descriptors for group in groups]))
+  fields.sort(key=lambda f: f.index)
+  for field in fields:
+    members[field.name] = _BuildProperty(field)
+
+  # The names of the fields, in the order of the positional arguments of
+  # __init__ and of the values returned by DeserializeToTuple.
+  members['_field_names'] = tuple(field.name for field in fields)
+
+  # Add init
+  members['__init__'] = _StructInit(fields)
+
+  # Add serialization method
+  serialization_object = serialization.Serialization(groups)
+  def Serialize(self, handle_offset=0, data=None):
+    return serialization_object.Serialize(self, handle_offset, data)
+  members['Serialize'] = Serialize
+
+  # pylint: disable=W0212
+  def AsDict(self):
+    return self._fields
+  members['AsDict'] = AsDict
+
+  def Deserialize(cls, context):
+    result = cls.__new__(cls)
+    fields = {}
+    serialization_object.Deserialize(fields, context)
+    result._fields = fields
+    return result
+  members['Deserialize'] = classmethod(Deserialize)
+
+  # Deserializes the values of the fields, ordered by index, without building
+  # a struct instance.
+  def DeserializeToTuple(cls, context):
+    values = {}
+    serialization_object.Deserialize(values, context)
+    return tuple(values[field.name] if field.name in values
+                 else field.GetDefaultValue() for field in fields)
+  members['DeserializeToTuple'] = classmethod(DeserializeToTuple)
+
+  def Validate(cls, context):
+    serialization_object.Validate(context)
+  members['Validate'] = classmethod(Validate)
+
+  # The state is pickled explicitly, so that unpickling materializes the
+  # class through the lazy __setstate__.
+  def GetState(self):
+    return self._fields
+  members['__getstate__'] = GetState
+
+  def SetState(self, state):
+    self._fields = state
+  members['__setstate__'] = SetState
+
+  members['__eq__'] = _StructEq(fields)
+  members['__ne__'] = _StructNe
+
+  return members
+
+
+def _BuildUnionMembers(descriptor):
+  """Returns the members of the class of a union."""
+  members = {}
+
+  fields = descriptor.get('fields', [])
+  def _BuildUnionProperty(field):
+
+    # pylint: disable=W0212
+    def Get(self):
+      if self._cur_field != field:
+        raise AttributeError('%s is not currently set' % field.name,
+            field.name, self._cur_field.name)
+      return self._data
+
+    # pylint: disable=W0212
+    def Set(self, value):
+      self._cur_field = field
+      self._data = field.field_type.Convert(value)
+
+    return property(Get, Set)
+
+  for field in fields:
+    members[field.name] = _BuildUnionProperty(field)
+
+  def UnionInit(self, **kwargs):
+    self.SetInternals(None, None)
+    items = kwargs.items()
+    if len(items) == 0:
+      return
+
+    if len(items) > 1:
+      raise TypeError('only 1 member may be set on a union.')
+
+    setattr(self, items[0][0], items[0][1])
+  members['__init__'] = UnionInit
+
+  serializer = serialization.UnionSerializer(fields)
+  def SerializeUnionInto(self, data_offset, data, handle_offset=0):
+    return serializer.SerializeInto(self, data_offset, data, handle_offset)
+  members['SerializeInto'] = SerializeUnionInto
+
+  def SerializeUnionInline(self, handle_offset=0):
+    return serializer.SerializeInline(self, handle_offset)
+  members['SerializeInline'] = SerializeUnionInline
+
+  def SerializeUnion(self, handle_offset=0):
+    return serializer.Serialize(self, handle_offset)
+  members['Serialize'] = SerializeUnion
+
+  def DeserializeUnion(cls, context):
+    return serializer.Deserialize(context, cls)
+  members['Deserialize'] = classmethod(DeserializeUnion)
+
+  def ValidateUnion(cls, context):
+    return serializer.Validate(context)
+  members['Validate'] = classmethod(ValidateUnion)
+
+  class Tags(object):
+    __metaclass__ = MojoEnumType
+    VALUES = [(field.name, field.index) for field in fields]
+  members['Tags'] = Tags
+
+  def GetTag(self):
+    return self._cur_field.index
+  members['tag'] = property(GetTag, None)
+
+  def GetData(self):
+    return self._data
+  members['data'] = property(GetData, None)
+
+  def IsUnknown(self):
+    return not self._cur_field
+  members['IsUnknown'] = IsUnknown
+
+  def UnionEq(self, other):
+    return (
+        (type(self) is type(other))
+        and (self.tag == other.tag)
+        and _FieldEq(self.data, other.data))
+  members['__eq__'] = UnionEq
+
+  def UnionNe(self, other):
+    return not self.__eq__(other)
+  members['__ne__'] = UnionNe
+
+  def UnionStr(self):
+    return '<%s.%s(%s): %s>' % (
+        self.__class__.__name__,
+        self._cur_field.name,
+        self.tag,
+        self.data)
+  members['__str__'] = UnionStr
+  members['__repr__'] = UnionStr
+
+  def SetInternals(self, field, data):
+    self._cur_field = field
+    self._data = data
+  members['SetInternals'] = SetInternals
+
+  # The current field is pickled by name, as field descriptors are not
+  # picklable.
+  def GetState(self):
+    return (self._cur_field.name if self._cur_field else None, self._data)
+  members['__getstate__'] = GetState
+
+  fields_by_name = dict((field.name, field) for field in fields)
+  def SetState(self, state):
+    (name, data) = state
+    self.SetInternals(fields_by_name.get(name), data)
+  members['__setstate__'] = SetState
+
+  return members
+
+
 def _StructInit(fields):
   def _Init(self, *args, **kwargs):
     if len(args) + len(kwargs) > len(fields):
@@ -301,10 +441,17 @@ def _StructEq(fields):
     if type(self) is not type(other):
       return False
     for field in fields:
-      if getattr(self, field.name) != getattr(other, field.name):
+      if not _FieldEq(getattr(self, field.name), getattr(other, field.name)):
         return False
     return True
   return _Eq
 
+def _FieldEq(a, b):
+  result = (a == b)
+  if isinstance(result, bool) or not hasattr(result, '__len__'):
+    return bool(result)
+  # Arrays comparing element-wise, such as numpy arrays.
+  return len(a) == len(b) and all(result)
+
 def _StructNe(self, other):
   return not self.__eq__(other)
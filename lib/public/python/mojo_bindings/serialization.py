@@ -13,6 +13,13 @@ HEADER_STRUCT = struct.Struct("<II")
 # Format for a pointer.
 POINTER_STRUCT = struct.Struct("<Q")
 
+# Format of an inline union: a header followed by 64 bits of data.
+UNION_STRUCT = struct.Struct("<IIQ")
+
+_EMPTY_UNION = bytearray(UNION_STRUCT.size)
+
+_INTEGER_TYPECODES = frozenset('?bBhHiIqQ')
+
 
 def Flatten(value):
   """Flattens nested lists/tuples into an one-level list. If value is not a
@@ -39,6 +46,12 @@ class DeserializationException(Exception):
 
 
 class DeserializationContext(object):
+  """
+  The context to deserialize a value from. data is the whole message, and
+  offset the position of the value in data.
+  """
+
+  __slots__ = ()
 
   def ClaimHandle(self, handle):
     raise NotImplementedError()
@@ -52,20 +65,34 @@ class DeserializationContext(object):
   def IsInitialContext(self):
     raise NotImplementedError()
 
+  def AcceptsSharedBuffers(self):
+    """Whether arrays may be sent in shared buffers, see shared_buffers."""
+    raise NotImplementedError()
+
 
 class RootDeserializationContext(DeserializationContext):
-  def __init__(self, data, handles):
+  """
+  The context of a message. It holds the handles and the claim cursors for all
+  the contexts derived from it.
+  """
+
+  offset = 0
+
+  def __init__(self, data, handles, shared_buffers=False):
     if isinstance(data, buffer):
       self.data = data
     else:
       self.data = buffer(data)
     self._handles = handles
+    self._shared_buffers = shared_buffers
     self._next_handle = 0;
     self._next_memory = 0;
 
   def ClaimHandle(self, handle):
     if handle < self._next_handle:
       raise DeserializationException('Accessing handles out of order.')
+    if handle >= len(self._handles):
+      raise DeserializationException('Accessing handle out of range.')
     self._next_handle = handle + 1
     return self._handles[handle]
 
@@ -80,21 +107,41 @@ class RootDeserializationContext(DeserializationContext):
   def IsInitialContext(self):
     return True
 
+  def AcceptsSharedBuffers(self):
+    return self._shared_buffers
+
 
 class _ChildDeserializationContext(DeserializationContext):
-  def __init__(self, parent, offset):
-    self._parent = parent
-    self._offset = offset
-    self.data = buffer(parent.data, offset)
+  """
+  A position in the message of a RootDeserializationContext. It refers to the
+  root directly, whatever the depth of the value.
+  """
+
+  __slots__ = ('_root', 'data', 'offset')
+
+  def __init__(self, root, offset):
+    self._root = root
+    self.data = root.data
+    self.offset = offset
 
   def ClaimHandle(self, handle):
-    return self._parent.ClaimHandle(handle)
+    return self._root.ClaimHandle(handle)
 
   def ClaimMemory(self, start, size):
-    return self._parent.ClaimMemory(self._offset + start, size)
+    return self._root.ClaimMemory(self.offset + start, size)
 
   def GetSubContext(self, offset):
-    return self._parent.GetSubContext(self._offset + offset)
+    return _ChildDeserializationContext(self._root, self.offset + offset)
+
+  def AcceptsSharedBuffers(self):
+    return self._root.AcceptsSharedBuffers()
+
+  def Advance(self, offset):
+    """
+    Moves the context by offset bytes. This allows to iterate over consecutive
+    values without creating a context for each of them.
+    """
+    self.offset += offset
 
   def IsInitialContext(self):
     return False
@@ -133,15 +180,22 @@ class Serialization(object):
       self._struct_per_version[version] = _GetStruct(self._GetGroups(version))
     return self._struct_per_version[version]
 
-  def Serialize(self, obj, handle_offset):
+  def Serialize(self, obj, handle_offset, data=None):
     """
     Serialize the given obj. handle_offset is the the first value to use when
-    encoding handles.
+    encoding handles. If data is given, the struct is written at its end, which
+    must be 8 bytes aligned, instead of in a new bytearray.
     """
     handles = []
-    data = bytearray(self.size)
-    HEADER_STRUCT.pack_into(data, 0, self.size, self.version)
-    position = HEADER_STRUCT.size
+    if data is None:
+      data = bytearray(self.size)
+      start = 0
+    else:
+      start = len(data)
+      assert start % 8 == 0
+      data.extend(bytearray(self.size))
+    HEADER_STRUCT.pack_into(data, start, self.size, self.version)
+    position = start + HEADER_STRUCT.size
     to_pack = []
     for group in self._groups:
       position = position + NeededPaddingForAlignment(position,
@@ -154,20 +208,40 @@ class Serialization(object):
       to_pack.extend(Flatten(entry))
       handles.extend(new_handles)
       position = position + group.GetByteSize()
-    self._GetMainStruct().pack_into(data, HEADER_STRUCT.size, *to_pack)
+    self._GetMainStruct().pack_into(data, start + HEADER_STRUCT.size, *to_pack)
     return (data, handles)
 
   def Deserialize(self, fields, context):
-    if len(context.data) < HEADER_STRUCT.size:
+    for (group, value, sub_context) in self._IterGroups(context):
+      fields.update(group.Deserialize(value, sub_context))
+
+  def Validate(self, context):
+    """
+    Checks that the struct encoded in context is well-formed, without
+    deserializing it. Raises a DeserializationException describing the first
+    violation found.
+    """
+    for (group, value, sub_context) in self._IterGroups(context):
+      group.Validate(value, sub_context)
+
+  def _IterGroups(self, context):
+    """
+    Checks the header of the struct encoded in context and yields, for each of
+    its field groups, a (group, value, sub_context) tuple, where value is the
+    inline encoding of the group and sub_context the context at its position.
+    """
+    available = len(context.data) - context.offset
+    if available < HEADER_STRUCT.size:
       raise DeserializationException(
           'Available data too short to contain header.')
-    (size, version) = HEADER_STRUCT.unpack_from(context.data)
-    if len(context.data) < size or size < HEADER_STRUCT.size:
+    (size, version) = HEADER_STRUCT.unpack_from(context.data, context.offset)
+    if available < size or size < HEADER_STRUCT.size:
       raise DeserializationException('Header size is incorrect.')
     if context.IsInitialContext():
       context.ClaimMemory(0, size)
     version_struct = self._GetStruct(version)
-    entities = version_struct.unpack_from(context.data, HEADER_STRUCT.size)
+    entities = version_struct.unpack_from(context.data,
+                                          context.offset + HEADER_STRUCT.size)
     filtered_groups = self._GetGroups(version)
     if ((version <= self.version and
          size != version_struct.size + HEADER_STRUCT.size) or
@@ -175,16 +249,20 @@ class Serialization(object):
       raise DeserializationException('Struct size in incorrect.')
     position = HEADER_STRUCT.size
     enties_index = 0
+    # The same context is moved to the position of each group.
+    sub_context = context.GetSubContext(position)
     for group in filtered_groups:
-      position = position + NeededPaddingForAlignment(position,
-                                                      group.GetAlignment())
+      padding = NeededPaddingForAlignment(position, group.GetAlignment())
+      position += padding
+      sub_context.Advance(padding)
       enties_count = len(group.GetTypeCode())
       if enties_count == 1:
         value = entities[enties_index]
       else:
         value = tuple(entities[enties_index:enties_index+enties_count])
-      fields.update(group.Deserialize(value, context.GetSubContext(position)))
+      yield (group, value, sub_context)
       position += group.GetByteSize()
+      sub_context.Advance(group.GetByteSize())
       enties_index += enties_count
 
 
@@ -228,82 +306,172 @@ class UnionSerializer(object):
   Helper class to serialize/deserialize a union.
   """
   def __init__(self, fields):
-    self._fields = {field.index: field for field in fields}
+    self._fields = {field.index: _UnionFieldSerializer(field)
+                    for field in fields}
+
+  def SerializeInto(self, union, data_offset, data, handle_offset):
+    """
+    Serializes the given union inline.
+
+    Args:
+      union: the union to serialize.
+      data_offset: the offset from the start of the inline union to the end of
+                   data. Used to encode pointers.
+      data: the bytearray to append the out of line data (pointed values and
+            nested unions) to.
+      handle_offset: the first value to use when encoding handles.
+
+    Returns a tuple where the first element is the (size, tag, value) tuple of
+    the inline union, value being the 64 bits of its data as an unsigned
+    integer, and the second is the array of handles to add to the message.
+    """
+    tag = union.tag
+    field_serializer = self._fields[tag]
+    field_type = field_serializer.field.field_type
+
+    if field_serializer.is_union:
+      # Nested unions are stored out of line and encoded in place, at the end
+      # of data.
+      position = len(data)
+      data.extend(_EMPTY_UNION)
+      nested_union = union.data
+      handles = []
+      if nested_union:
+        (nested_entry, handles) = nested_union.SerializeInto(
+            UNION_STRUCT.size, data, handle_offset)
+        UNION_STRUCT.pack_into(data, position, *nested_entry)
+      elif not field_type.nullable:
+        raise SerializationException(
+            'Trying to serialize null for non nullable type.')
+      return ((UNION_STRUCT.size, tag, data_offset - HEADER_STRUCT.size),
+              handles)
+
+    (entry, handles) = field_type.Serialize(
+        union.data, data_offset - HEADER_STRUCT.size, data, handle_offset)
+    return ((UNION_STRUCT.size, tag, field_serializer.ToUInt64(entry)),
+            handles)
 
   def SerializeInline(self, union, handle_offset):
+    """
+    Serializes the given union inline, with its out of line data in a new
+    bytearray. Kept for the callers of the former API: SerializeInto writes
+    the out of line data directly where it belongs.
+
+    Returns a tuple where the first element is the (size, tag, value, data)
+    tuple of the inline union, value being -1 if the value is stored out of
+    line at the start of data, and the second is the array of handles to add
+    to the message. The caller sets the pointer of the union to where it
+    appends data.
+    """
     data = bytearray()
-    field = self._fields[union.tag]
-
-    # If the union value is a simple type or a nested union, it is returned as
-    # entry.
-    # Otherwise, the serialized value is appended to data and the value of entry
-    # is -1. The caller will need to set entry to the location where the
-    # caller will append data.
-    (entry, handles) = field.field_type.Serialize(
-        union.data, -1, data, handle_offset)
-
-    # If the value contained in the union is itself a union, we append its
-    # serialized value to data and set entry to -1. The caller will need to set
-    # entry to the location where the caller will append data.
-    if field.field_type.IsUnion():
-      nested_union = bytearray(16)
-      HEADER_STRUCT.pack_into(nested_union, 0, entry[0], entry[1])
-      POINTER_STRUCT.pack_into(nested_union, 8, entry[2])
-
-      data = nested_union + data
-
-      # Since we do not know where the caller will append the nested union,
-      # we set entry to an invalid value and let the caller figure out the right
-      # value.
-      entry = -1
-
-    return (16, union.tag, entry, data), handles
+    ((size, tag, value), handles) = self.SerializeInto(
+        union, UNION_STRUCT.size, data, handle_offset)
+    if data:
+      value = -1
+    return ((size, tag, value, data), handles)
 
   def Serialize(self, union, handle_offset):
-    (size, tag, entry, extra_data), handles = self.SerializeInline(
-        union, handle_offset)
-    data = bytearray(16)
-    if extra_data:
-      entry = 8
-    data.extend(extra_data)
+    data = bytearray(UNION_STRUCT.size)
+    ((size, tag, value), handles) = self.SerializeInto(
+        union, UNION_STRUCT.size, data, handle_offset)
+    UNION_STRUCT.pack_into(data, 0, size, tag, value)
+    return data, handles
 
-    field = self._fields[union.tag]
+  def Deserialize(self, context, union_class):
+    tag = self._ReadTag(context)
+    if tag is None:
+      return None
 
-    HEADER_STRUCT.pack_into(data, 0, size, tag)
-    typecode = field.GetTypeCode()
+    union = union_class.__new__(union_class)
+    field_serializer = self._fields.get(tag)
+    if field_serializer is None:
+      union.SetInternals(None, None)
+      return union
 
-    # If the value is a nested union, we store a 64 bits pointer to it.
-    if field.field_type.IsUnion():
-      typecode = 'Q'
+    (value, sub_context) = field_serializer.GetValue(context)
+    union.SetInternals(field_serializer.field,
+                       field_serializer.field.field_type.Deserialize(
+                           value, sub_context))
+    return union
 
-    struct.pack_into('<%s' % typecode, data, 8, entry)
-    return data, handles
+  def Validate(self, context):
+    """
+    Checks that the union encoded in context is well-formed, without
+    deserializing it. Raises a DeserializationException describing the first
+    violation found.
 
-  def Deserialize(self, context, union_class):
-    if len(context.data) < HEADER_STRUCT.size:
+    Returns False if the union is null, True otherwise.
+    """
+    tag = self._ReadTag(context)
+    if tag is None:
+      return False
+    field_serializer = self._fields.get(tag)
+    if field_serializer is not None:
+      (value, sub_context) = field_serializer.GetValue(context)
+      field_serializer.field.field_type.Validate(value, sub_context)
+    return True
+
+  def _ReadTag(self, context):
+    """
+    Checks the header of the union encoded in context and returns its tag, or
+    None if the union is null.
+    """
+    if len(context.data) - context.offset < HEADER_STRUCT.size:
       raise DeserializationException(
           'Available data too short to contain header.')
-    (size, tag) = HEADER_STRUCT.unpack_from(context.data)
+    (size, tag) = HEADER_STRUCT.unpack_from(context.data, context.offset)
 
     if size == 0:
       return None
 
-    if size != 16:
+    if size != UNION_STRUCT.size:
       raise DeserializationException('Invalid union size %s' % size)
 
-    union = union_class.__new__(union_class)
-    if tag not in self._fields:
-      union.SetInternals(None, None)
-      return union
+    return tag
 
-    field = self._fields[tag]
-    if field.field_type.IsUnion():
-      ptr = POINTER_STRUCT.unpack_from(context.data, 8)[0]
-      value = field.field_type.Deserialize(ptr, context.GetSubContext(ptr+8))
-    else:
-      raw_value = struct.unpack_from(
-          field.GetTypeCode(), context.data, 8)[0]
-      value = field.field_type.Deserialize(raw_value, context.GetSubContext(8))
 
-    union.SetInternals(field, value)
-    return union
+class _UnionFieldSerializer(object):
+  """
+  The encoding of the value of a union field, precompiled when the union class
+  is created.
+  """
+  def __init__(self, field):
+    self.field = field
+    self.is_union = field.field_type.IsUnion()
+    if self.is_union:
+      return
+    typecode = field.GetTypeCode()
+    self._value_struct = struct.Struct('<%s' % typecode)
+    self._is_single_value = len(typecode) == 1
+    # Integers are stored as their two's complement, which is computed with a
+    # mask instead of packing the value.
+    self._mask = None
+    if typecode in _INTEGER_TYPECODES:
+      self._mask = (1 << (8 * self._value_struct.size)) - 1
+    # Packs the value in the 8 bytes reserved for it in the inline union.
+    self._padded_struct = struct.Struct(
+        '<%s%dx' % (typecode, POINTER_STRUCT.size - self._value_struct.size))
+
+  def ToUInt64(self, entry):
+    """Returns the 64 bits of the encoding of entry as an unsigned integer."""
+    if self._mask is not None:
+      return entry & self._mask
+    if self._is_single_value:
+      return POINTER_STRUCT.unpack(self._padded_struct.pack(entry))[0]
+    return POINTER_STRUCT.unpack(
+        self._padded_struct.pack(*Flatten(entry)))[0]
+
+  def GetValue(self, context):
+    """
+    Returns the (value, context) pair to deserialize the field from, given the
+    context of the inline union.
+    """
+    if self.is_union:
+      ptr = POINTER_STRUCT.unpack_from(
+          context.data, context.offset + HEADER_STRUCT.size)[0]
+      return (ptr, context.GetSubContext(ptr + HEADER_STRUCT.size))
+    values = self._value_struct.unpack_from(
+        context.data, context.offset + HEADER_STRUCT.size)
+    if self._is_single_value:
+      values = values[0]
+    return (values, context.GetSubContext(HEADER_STRUCT.size))
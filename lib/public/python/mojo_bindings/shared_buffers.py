@@ -0,0 +1,150 @@
+# Copyright 2015 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""
+Arrays of native types sent in shared buffers instead of inline in messages.
+
+When enabled for an interface with InterfaceManager.SetSharedBufferThreshold,
+the arrays of native types whose data is larger than the threshold are copied
+to a shared buffer sent with the message, and the receiver maps the buffer
+instead of copying the array out of the message. On the wire, such an array is
+an array header followed by the index of the handle of its buffer.
+"""
+
+import array
+import contextlib
+import struct
+import threading
+
+import mojo_bindings.serialization as serialization
+
+# pylint: disable=E0611,F0401
+import mojo_system as system
+
+
+# The data following the header of an array sent in a shared buffer: the index
+# of the handle of the buffer, and padding.
+SHARED_ARRAY_STRUCT = struct.Struct('<II')
+
+# The settings of the serializations running on the current thread.
+_thread_settings = threading.local()
+
+
+def GetThreshold():
+  """
+  Returns the size in bytes above which the arrays serialized on the current
+  thread are sent in shared buffers, or None if they are always sent inline.
+  """
+  return getattr(_thread_settings, 'threshold', None)
+
+
+@contextlib.contextmanager
+def Threshold(threshold):
+  """Sets the threshold of the serializations running in the block."""
+  previous = GetThreshold()
+  _thread_settings.threshold = threshold
+  try:
+    yield
+  finally:
+    _thread_settings.threshold = previous
+
+
+def CreateSharedBuffer(data, size):
+  """
+  Returns the handle of a new shared buffer containing data, an object of size
+  bytes exposing the buffer interface.
+  """
+  handle = system.CreateSharedBuffer(size)
+  (result, mapped_buffer) = handle.Map(0, size)
+  if result != system.RESULT_OK:
+    handle.Close()
+    raise serialization.SerializationException(
+        'Unable to map shared buffer: %d' % result)
+  try:
+    mapped_buffer.buffer[:] = data
+  finally:
+    mapped_buffer.UnMap()
+  return handle
+
+
+def MapArray(handle, typecode, nb_elements):
+  """Returns a MappedArray of the elements of the shared buffer handle."""
+  itemsize = struct.calcsize('<%s' % typecode)
+  (result, mapped_buffer) = handle.Map(0, nb_elements * itemsize)
+  if result != system.RESULT_OK:
+    raise serialization.DeserializationException(
+        'Unable to map shared buffer: %d' % result)
+  return MappedArray(typecode, nb_elements, mapped_buffer)
+
+
+class MappedArray(object):
+  """
+  An array of native elements in a mapped shared buffer, as received for the
+  arrays sent in shared buffers. It is a mutable sequence of fixed length, and
+  buffer is a memoryview of its data, valid as long as the array is alive.
+  numpy.asarray returns a view of the array, without copying it.
+  """
+
+  def __init__(self, typecode, nb_elements, mapped_buffer):
+    self.typecode = typecode
+    self._struct = struct.Struct('<%s' % typecode)
+    self._length = nb_elements
+    self._mapped_buffer = mapped_buffer
+
+  @property
+  def itemsize(self):
+    return self._struct.size
+
+  @property
+  def buffer(self):
+    return self._mapped_buffer.buffer
+
+  @property
+  def __array_interface__(self):
+    # The array keeps the buffer mapped, so numpy arrays refer to it rather
+    # than to the memoryview.
+    import numpy
+    address = numpy.asarray(self.buffer).__array_interface__['data'][0]
+    return {
+      'version': 3,
+      'shape': (self._length,),
+      'typestr': numpy.dtype('<%s' % self.typecode).str,
+      'data': (address, False),
+    }
+
+  def tolist(self):
+    return array.array(self.typecode, self.buffer.tobytes()).tolist()
+
+  def __len__(self):
+    return self._length
+
+  def __getitem__(self, index):
+    if isinstance(index, slice):
+      return self.tolist()[index]
+    return self._struct.unpack_from(self.buffer, self._Offset(index))[0]
+
+  def __setitem__(self, index, value):
+    self._struct.pack_into(self.buffer, self._Offset(index), value)
+
+  def __iter__(self):
+    return iter(self.tolist())
+
+  def __eq__(self, other):
+    try:
+      return len(self) == len(other) and self.tolist() == list(other)
+    except TypeError:
+      return False
+
+  def __ne__(self, other):
+    return not self.__eq__(other)
+
+  def __repr__(self):
+    return 'MappedArray(%r, %r)' % (self.typecode, self.tolist())
+
+  def _Offset(self, index):
+    if index < 0:
+      index += self._length
+    if not 0 <= index < self._length:
+      raise IndexError('array index out of range')
+    return index * self._struct.size
@@ -765,7 +765,11 @@ class RunLoop(object):
     _RUN_LOOPS.loop = weakref.ref(self)
 
   def __del__(self):
-    del _RUN_LOOPS.loop
+    # The weak reference to this run loop is already dead, unless another run
+    # loop has been created on this thread since.
+    loop = getattr(_RUN_LOOPS, 'loop', None)
+    if loop is not None and loop() is None:
+      del _RUN_LOOPS.loop
 
   def Run(self):
     """Run the runloop until Quit is called."""
@@ -0,0 +1,142 @@
+# Copyright 2015 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import StringIO
+import time
+
+import mojo_unittest
+
+import mojo_bindings.capture as capture
+import mojo_bindings.descriptor as _descriptor
+import mojo_bindings.messaging as messaging
+
+
+def _Calculator():
+  return mojo_unittest.Interface('Calculator', [
+      ('Add', [('a', _descriptor.TYPE_INT32), ('s', _descriptor.TYPE_STRING)],
+       [('r', _descriptor.TYPE_INT32)]),
+      ('Reset', [], None),
+  ])
+
+
+class ReadCaptureTest(mojo_unittest.MojoTestCase):
+
+  def _Capture(self, *records):
+    stream = StringIO.StringIO()
+    message_capture = capture.MessageCapture(stream)
+    for (direction, data) in records:
+      message = messaging.Message(bytearray(data), [])
+      if direction == capture.INCOMING:
+        message_capture.RecordIncoming(0, message)
+      else:
+        message_capture.RecordOutgoing(0, message)
+    return stream.getvalue()
+
+  def testReadBack(self):
+    data = self._Capture((capture.INCOMING, 'abc'), (capture.OUTGOING, ''))
+    messages = list(capture.ReadCapture(StringIO.StringIO(data)))
+    self.assertEquals([(capture.INCOMING, 0, 0, 'abc'),
+                       (capture.OUTGOING, 0, 0, '')],
+                      [m[:4] for m in messages])
+    self.assertLessEqual(messages[0].timestamp, messages[1].timestamp)
+
+  def testNotACapture(self):
+    with self.assertRaises(ValueError):
+      list(capture.ReadCapture(StringIO.StringIO('MOJOCAP\x02')))
+
+  def testTruncated(self):
+    data = self._Capture((capture.INCOMING, 'abc'))
+    # Truncated in the header of the record, and in its data.
+    for size in (len(data) - 4, len(data) - 1):
+      messages = capture.ReadCapture(StringIO.StringIO(data[:size]))
+      with self.assertRaises(ValueError):
+        list(messages)
+
+
+class CaptureTest(mojo_unittest.InterfaceTestCase):
+
+  def setUp(self):
+    mojo_unittest.InterfaceTestCase.setUp(self)
+    self.calculator = _Calculator()
+    self.calls = []
+    calls = self.calls
+    class Impl(self.calculator):
+      def Add(self, a, s):
+        calls.append(('Add', a, s))
+        return a + len(s)
+      def Reset(self):
+        calls.append(('Reset',))
+    self.impl_class = Impl
+
+  def _Capture(self):
+    """
+    Calls the methods of an implementation while capturing the messages, and
+    returns the captured messages.
+    """
+    stream = StringIO.StringIO()
+    messaging.SetMessageCapture(capture.MessageCapture(stream))
+    try:
+      (proxy, request) = self.calculator.manager.NewRequest()
+      self.calculator.manager.Bind(self.impl_class(), request.PassMessagePipe())
+    finally:
+      messaging.SetMessageCapture(None)
+    proxy.Reset()
+    self.assertEquals(3, self.RunLoopUntil(proxy.Add(1, 'xy')))
+    proxy.manager.Close()
+    return list(capture.ReadCapture(StringIO.StringIO(stream.getvalue())))
+
+  def testCapture(self):
+    messages = self._Capture()
+    # The proxy sends the first message.
+    proxy_pipe = messages[0].pipe
+    proxy_messages = [m for m in messages if m.pipe == proxy_pipe]
+    impl_messages = [m for m in messages if m.pipe != proxy_pipe]
+    self.assertEquals(1, len(set(m.pipe for m in impl_messages)))
+    self.assertEquals([capture.OUTGOING, capture.OUTGOING, capture.INCOMING],
+                      [m.direction for m in proxy_messages])
+    self.assertEquals([capture.INCOMING, capture.INCOMING, capture.OUTGOING],
+                      [m.direction for m in impl_messages])
+    # Both ends of the pipe see the same messages.
+    self.assertEquals([m.data for m in proxy_messages],
+                      [m.data for m in impl_messages])
+    self.assertEquals([0] * 6, [m.nb_handles for m in messages])
+
+  def testReplay(self):
+    messages = self._Capture()
+    del self.calls[:]
+    # Replay runs its own run loop.
+    self.loop = None
+    result = capture.Replay(messages, self.calculator.manager,
+                            self.impl_class())
+    self.assertIsNone(result.error)
+    self.assertEquals([('Reset',), ('Add', 1, 'xy')], self.calls)
+    self.assertEquals(2, result.nb_messages)
+    # Only Add expects a response.
+    self.assertEquals(1, len(result.latencies))
+    self.assertEquals(result.latencies[0], result.Percentile(50))
+
+  def testReplayPipe(self):
+    messages = self._Capture()
+    del self.calls[:]
+    self.loop = None
+    result = capture.Replay(messages, self.calculator.manager,
+                            self.impl_class(), pipe=messages[0].pipe)
+    # The requests were outgoing on the pipe of the proxy.
+    self.assertEquals(0, result.nb_messages)
+    self.assertEquals([], self.calls)
+
+  def testReplayRecordedSpeed(self):
+    messages = self._Capture()
+    requests = [m for m in messages if m.direction == capture.INCOMING and
+                m.pipe != messages[0].pipe]
+    # Space the requests by 200ms.
+    requests = [m._replace(timestamp=i * 200000)
+                for (i, m) in enumerate(requests)]
+    self.loop = None
+    start = time.time()
+    result = capture.Replay(requests, self.calculator.manager,
+                            self.impl_class(), recorded_speed=True)
+    self.assertGreaterEqual(time.time() - start, 0.2)
+    self.assertGreaterEqual(result.duration, 0.2)
+    self.assertEquals(2, result.nb_messages)
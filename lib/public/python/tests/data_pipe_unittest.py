@@ -0,0 +1,198 @@
+# Copyright 2015 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import errno
+import tempfile
+import threading
+
+import mojo_unittest
+
+import mojo_bindings.data_pipe as data_pipe
+
+# pylint: disable=F0401
+import mojo_system as system
+
+
+# Larger than the capacity of the pipes, so that the transfers wait for the
+# other end.
+_DATA = ''.join(chr(i % 251) for i in xrange(100000))
+
+
+def _NewDataPipe():
+  options = system.CreateDataPipeOptions()
+  options.capacity_num_bytes = 4096
+  return system.DataPipe(options)
+
+
+def _TempFile(data):
+  """Returns a file containing data, deleted once closed."""
+  f = tempfile.TemporaryFile()
+  f.write(data)
+  f.flush()
+  return f
+
+
+class DataPipeTest(mojo_unittest.MojoTestCase):
+
+  def _InThread(self, function, *args):
+    """Runs function in a new thread, joined at the end of the test."""
+    thread = threading.Thread(target=function, args=args)
+    thread.start()
+    self.addCleanup(thread.join)
+
+  def _Write(self, pipe, data):
+    """Writes data to pipe from another thread, then closes the producer."""
+    def Write():
+      with data_pipe.DataPipeWriter(pipe.producer_handle) as writer:
+        writer.write(data)
+    self._InThread(Write)
+
+  def testRead(self):
+    pipe = _NewDataPipe()
+    self._Write(pipe, _DATA)
+    with data_pipe.DataPipeReader(pipe.consumer_handle) as reader:
+      self.assertEquals('', reader.read(0))
+      chunk = reader.read(10)
+      self.assertEquals(_DATA[:len(chunk)], chunk)
+      self.assertEquals(_DATA[len(chunk):], reader.read())
+      self.assertEquals('', reader.read(10))
+    with self.assertRaises(ValueError):
+      reader.read(10)
+
+  def testReadInto(self):
+    pipe = _NewDataPipe()
+    self._Write(pipe, _DATA)
+    with data_pipe.DataPipeReader(pipe.consumer_handle) as reader:
+      target = bytearray(len(_DATA) + 1)
+      offset = 0
+      while True:
+        size = reader.readinto(memoryview(target)[offset:])
+        if not size:
+          break
+        offset += size
+    self.assertEquals(len(_DATA), offset)
+    self.assertEquals(_DATA, str(target[:offset]))
+
+  def testReadIntoFailure(self):
+    pipe = _NewDataPipe()
+    with data_pipe.DataPipeWriter(pipe.producer_handle) as writer:
+      writer.write('abc')
+    with data_pipe.DataPipeReader(pipe.consumer_handle) as reader:
+      # The target is read-only.
+      with self.assertRaises(TypeError):
+        reader.readinto(memoryview('xyz'))
+      # The failed read ended the two-phase read, without consuming the data.
+      self.assertEquals('abc', reader.read())
+
+  def testIterBuffers(self):
+    pipe = _NewDataPipe()
+    self._Write(pipe, _DATA)
+    reader = data_pipe.DataPipeReader(pipe.consumer_handle)
+    self.assertEquals(_DATA,
+                      ''.join(view.tobytes() for view in reader.IterBuffers()))
+
+  def testWriteToClosedConsumer(self):
+    pipe = _NewDataPipe()
+    pipe.consumer_handle.Close()
+    with data_pipe.DataPipeWriter(pipe.producer_handle) as writer:
+      with self.assertRaises(IOError) as context:
+        writer.write('abc')
+    self.assertEquals(errno.EPIPE, context.exception.errno)
+
+  def testWriteBuffers(self):
+    pipe = _NewDataPipe()
+    with data_pipe.DataPipeWriter(pipe.producer_handle) as writer:
+      self.assertEquals(3, writer.write(bytearray('abc')))
+      self.assertEquals(2, writer.write(memoryview('de')))
+    with data_pipe.DataPipeReader(pipe.consumer_handle) as reader:
+      self.assertEquals('abcde', reader.read())
+
+  def testSendFile(self):
+    pipe = _NewDataPipe()
+    results = []
+    with _TempFile(_DATA) as f:
+      def Send():
+        results.append(data_pipe.SendFile(f, pipe.producer_handle, offset=10,
+                                          count=len(_DATA) - 20))
+        pipe.producer_handle.Close()
+      self._InThread(Send)
+      with data_pipe.DataPipeReader(pipe.consumer_handle) as reader:
+        self.assertEquals(_DATA[10:-10], reader.read())
+    self.assertEquals([len(_DATA) - 20], results)
+
+  def testSendEmptyFile(self):
+    pipe = _NewDataPipe()
+    with _TempFile('') as f:
+      self.assertEquals(0, data_pipe.SendFile(f, pipe.producer_handle))
+
+
+class AsyncDataPipeTest(mojo_unittest.MojoTestCase):
+
+  def testReadAll(self):
+    pipe = _NewDataPipe()
+    writer = data_pipe.AsyncDataPipeWriter(pipe.producer_handle)
+    reader = data_pipe.AsyncDataPipeReader(pipe.consumer_handle)
+    written = writer.Write(_DATA)
+    written.Then(lambda _: writer.Close())
+    self.assertEquals(_DATA, self.RunLoopUntil(reader.ReadAll()))
+    self.assertEquals(len(_DATA), self.RunLoopUntil(written))
+
+  def testRead(self):
+    pipe = _NewDataPipe()
+    writer = data_pipe.AsyncDataPipeWriter(pipe.producer_handle)
+    reader = data_pipe.AsyncDataPipeReader(pipe.consumer_handle)
+    self.assertEquals(3, self.RunLoopUntil(writer.Write('abc')))
+    self.assertEquals('ab', self.RunLoopUntil(reader.Read(2)))
+    self.assertEquals('c', self.RunLoopUntil(reader.Read()))
+    writer.Close()
+    self.assertEquals('', self.RunLoopUntil(reader.Read()))
+
+  def testForEachBuffer(self):
+    pipe = _NewDataPipe()
+    writer = data_pipe.AsyncDataPipeWriter(pipe.producer_handle)
+    reader = data_pipe.AsyncDataPipeReader(pipe.consumer_handle)
+    writer.Write(_DATA).Then(lambda _: writer.Close())
+    chunks = []
+    nb_bytes = self.RunLoopUntil(
+        reader.ForEachBuffer(lambda view: chunks.append(view.tobytes())))
+    self.assertEquals(len(_DATA), nb_bytes)
+    self.assertEquals(_DATA, ''.join(chunks))
+
+  def testForEachBufferFailure(self):
+    pipe = _NewDataPipe()
+    writer = data_pipe.AsyncDataPipeWriter(pipe.producer_handle)
+    reader = data_pipe.AsyncDataPipeReader(pipe.consumer_handle)
+    self.RunLoopUntil(writer.Write('abc'))
+    def Fail(_):
+      raise ValueError()
+    with self.assertRaises(ValueError):
+      self.RunLoopUntil(reader.ForEachBuffer(Fail))
+    # The buffer was consumed, and the pipe can still be read.
+    self.RunLoopUntil(writer.Write('de'))
+    self.assertEquals('de', self.RunLoopUntil(reader.Read()))
+
+  def testWriteToClosedConsumer(self):
+    pipe = _NewDataPipe()
+    pipe.consumer_handle.Close()
+    writer = data_pipe.AsyncDataPipeWriter(pipe.producer_handle)
+    with self.assertRaises(IOError) as context:
+      self.RunLoopUntil(writer.Write('abc'))
+    self.assertEquals(errno.EPIPE, context.exception.errno)
+
+  def testSendFile(self):
+    pipe = _NewDataPipe()
+    writer = data_pipe.AsyncDataPipeWriter(pipe.producer_handle)
+    reader = data_pipe.AsyncDataPipeReader(pipe.consumer_handle)
+    with _TempFile(_DATA) as f:
+      sent = writer.SendFile(f, offset=10)
+      sent.Then(lambda _: writer.Close())
+      self.assertEquals(_DATA[10:], self.RunLoopUntil(reader.ReadAll()))
+      self.assertEquals(len(_DATA) - 10, self.RunLoopUntil(sent))
+
+  def testSendEmptyFile(self):
+    pipe = _NewDataPipe()
+    writer = data_pipe.AsyncDataPipeWriter(pipe.producer_handle)
+    with _TempFile('') as f:
+      self.assertEquals(0, self.RunLoopUntil(writer.SendFile(f)))
+
@@ -0,0 +1,187 @@
+# Copyright 2015 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import mojo_unittest
+
+import mojo_bindings.dispatcher as dispatcher
+import mojo_bindings.messaging as messaging
+
+# pylint: disable=F0401
+import mojo_system as system
+
+
+# The dummy mojo_system has no signals, and the tests are skipped.
+_READABLE = (system.HANDLE_SIGNAL_READABLE if mojo_unittest.HAS_MOJO_SYSTEM
+             else None)
+
+
+class WaitManyDispatcherTest(mojo_unittest.MojoTestCase):
+
+  def setUp(self):
+    mojo_unittest.MojoTestCase.setUp(self)
+    self.dispatcher = None
+
+  def tearDown(self):
+    if self.dispatcher:
+      self.dispatcher.Close()
+    mojo_unittest.MojoTestCase.tearDown(self)
+
+  def _Connector(self, handle, name, received):
+    """
+    Returns a started connector of handle, appending name to received for
+    each message it receives.
+    """
+    connector = messaging.Connector(handle)
+    connector.SetIncomingMessageReceiver(messaging.ForwardingMessageReceiver(
+        lambda _: received.append(name) or True))
+    connector.SetDispatcher(self.dispatcher)
+    connector.Start()
+    return connector
+
+  def testAsyncWait(self):
+    self.dispatcher = dispatcher.WaitManyDispatcher()
+    pipe = system.MessagePipe()
+    results = []
+    self.dispatcher.AsyncWait(pipe.handle0, _READABLE,
+                              system.DEADLINE_INDEFINITE, results.append)
+    pipe.handle1.WriteMessage('a')
+    self.RunLoopUntilTrue(lambda: results)
+    self.assertEquals([system.RESULT_OK], results)
+
+  def testPeerClosed(self):
+    self.dispatcher = dispatcher.WaitManyDispatcher()
+    pipe = system.MessagePipe()
+    results = []
+    self.dispatcher.AsyncWait(pipe.handle0, _READABLE,
+                              system.DEADLINE_INDEFINITE, results.append)
+    pipe.handle1.Close()
+    self.RunLoopUntilTrue(lambda: results)
+    self.assertEquals([system.RESULT_FAILED_PRECONDITION], results)
+
+  def testCancel(self):
+    self.dispatcher = dispatcher.WaitManyDispatcher()
+    (cancelled_pipe, pipe) = (system.MessagePipe(), system.MessagePipe())
+    results = []
+    cancel = self.dispatcher.AsyncWait(
+        cancelled_pipe.handle0, _READABLE, system.DEADLINE_INDEFINITE,
+        lambda result: results.append(('cancelled', result)))
+    self.dispatcher.AsyncWait(
+        pipe.handle0, _READABLE, system.DEADLINE_INDEFINITE,
+        lambda result: results.append(('other', result)))
+    cancel()
+    # Cancelling twice is harmless.
+    cancel()
+    cancelled_pipe.handle1.WriteMessage('a')
+    pipe.handle1.WriteMessage('a')
+    self.RunLoopUntilTrue(lambda: results)
+    self.loop.RunUntilIdle()
+    self.assertEquals([('other', system.RESULT_OK)], results)
+
+  def testBatchSize(self):
+    self.dispatcher = dispatcher.WaitManyDispatcher(batch_size=2)
+    results = []
+    # pylint: disable=W0212
+    ready = [(dispatcher._Wait(None, _READABLE, results.append), i)
+             for i in range(5)]
+    self.dispatcher._Dispatch(ready)
+    # The first batch runs in the current task, the others in later tasks.
+    self.assertEquals([0, 1], results)
+    self.loop.RunUntilIdle()
+    self.assertEquals(range(5), results)
+    # The callbacks are only called once.
+    self.dispatcher._Dispatch(ready)
+    self.loop.RunUntilIdle()
+    self.assertEquals(range(5), results)
+
+  def testMessagesPerWake(self):
+    self.dispatcher = dispatcher.WaitManyDispatcher(messages_per_wake=2)
+    received = []
+    pipes = [system.MessagePipe() for _ in range(2)]
+    for pipe in pipes:
+      for _ in range(5):
+        pipe.handle1.WriteMessage('a')
+    # The connectors only wait while they are referenced.
+    self.connectors = [self._Connector(pipe.handle0, name, received)
+                       for (pipe, name) in zip(pipes, 'ab')]
+    self.RunLoopUntilTrue(lambda: len(received) == 10)
+    # Each pipe reads at most 2 messages before waiting again behind the other
+    # ready pipe.
+    self.assertEquals(list('aabbaabbab'), received)
+    # The connectors wait again once all the messages are read.
+    pipes[1].handle1.WriteMessage('a')
+    self.RunLoopUntilTrue(lambda: len(received) == 11)
+    self.assertEquals('b', received[-1])
+
+  def testConnectorError(self):
+    self.dispatcher = dispatcher.WaitManyDispatcher()
+    pipe = system.MessagePipe()
+    errors = []
+    class ErrorHandler(messaging.ConnectionErrorHandler):
+      def OnError(self, result):
+        errors.append(result)
+    connector = self._Connector(pipe.handle0, 'a', [])
+    connector.SetErrorHandler(ErrorHandler())
+    pipe.handle1.Close()
+    self.RunLoopUntilTrue(lambda: errors)
+    self.assertEquals([system.RESULT_FAILED_PRECONDITION], errors)
+
+  def testClose(self):
+    self.dispatcher = dispatcher.WaitManyDispatcher()
+    pipe = system.MessagePipe()
+    results = []
+    self.dispatcher.AsyncWait(pipe.handle0, _READABLE,
+                              system.DEADLINE_INDEFINITE, results.append)
+    self.dispatcher.Close()
+    # Closing twice is harmless.
+    self.dispatcher.Close()
+    pipe.handle1.WriteMessage('a')
+    self.loop.RunUntilIdle()
+    self.assertEquals([], results)
+
+
+class GetReadyTest(mojo_unittest.MojoTestCase):
+
+  def setUp(self):
+    mojo_unittest.MojoTestCase.setUp(self)
+    # pylint: disable=W0212
+    self.waits = [dispatcher._Wait(None, _READABLE, None) for _ in range(3)]
+
+  def _GetReady(self, result, index, states):
+    # pylint: disable=W0212
+    ready = dispatcher._GetReady(self.waits, result, index, states)
+    return [(self.waits.index(wait), result) for (wait, result) in ready]
+
+  def testStates(self):
+    waiting = (0, _READABLE)
+    readable = (_READABLE, _READABLE)
+    closed = (0, 0)
+    states = [waiting, readable, waiting, closed]
+    self.assertEquals([(0, system.RESULT_OK),
+                       (2, system.RESULT_FAILED_PRECONDITION)],
+                      self._GetReady(system.RESULT_OK, 1, states))
+
+  def testWakeUp(self):
+    states = [(_READABLE, _READABLE)] + [(0, _READABLE)] * 3
+    self.assertEquals([], self._GetReady(system.RESULT_OK, 0, states))
+
+  def testFailedHandle(self):
+    states = [(0, _READABLE), (_READABLE, _READABLE), (0, _READABLE),
+              (_READABLE, _READABLE)]
+    # The handle of the second wait failed, e.g. it was closed.
+    self.assertEquals([(0, system.RESULT_OK), (2, system.RESULT_OK),
+                       (1, system.RESULT_CANCELLED)],
+                      self._GetReady(system.RESULT_CANCELLED, 2, states))
+
+  def testInvalidHandle(self):
+    self.assertEquals(
+        [(1, system.RESULT_INVALID_ARGUMENT)],
+        self._GetReady(system.RESULT_INVALID_ARGUMENT, 2, None))
+    # An invalid wake up handle.
+    self.assertEquals(
+        [], self._GetReady(system.RESULT_INVALID_ARGUMENT, 0, None))
+
+  def testFailedCall(self):
+    self.assertEquals(
+        [(i, system.RESULT_INVALID_ARGUMENT) for i in range(3)],
+        self._GetReady(system.RESULT_INVALID_ARGUMENT, None, None))
@@ -0,0 +1,152 @@
+# Copyright 2015 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import cPickle
+import os
+import threading
+
+import mojo_unittest
+
+import mojo_bindings.executor as executor
+
+# pylint: disable=F0401
+import mojo_system as system
+
+
+def _Describe(value, suffix=''):
+  """Returns where it runs, so that the tests can check it."""
+  if value < 0:
+    raise ValueError(value)
+  return (value, suffix, os.getpid(), threading.current_thread().name)
+
+
+class _Impl(object):
+  """An implementation which can be run by a ProcessPoolExecutor."""
+
+  def __init__(self, offset):
+    self.offset = offset
+    self.manager = threading.Lock()
+
+  def __getstate__(self):
+    return {'offset': self.offset}
+
+  def Describe(self, value):
+    return _Describe(value + self.offset)
+
+
+class _ImplWithManager(_Impl):
+  """An implementation pickled with its manager, which cannot be pickled."""
+
+  def __getstate__(self):
+    return self.__dict__
+
+
+class ExecutorTest(mojo_unittest.MojoTestCase):
+
+  def _Execute(self, pool, function, args, kwargs=None):
+    """
+    Runs function with pool, and returns the arguments of the callback, and
+    the thread it was called on.
+    """
+    results = []
+    def Callback(succeeded, result):
+      results.append((succeeded, result, threading.current_thread()))
+    pool.Execute(function, args, Callback, kwargs)
+    self.assertEquals(1, pool.queue_depth)
+    self.RunLoopUntilTrue(lambda: results)
+    self.assertEquals(0, pool.queue_depth)
+    self.assertEquals(1, pool.max_queue_depth)
+    return results[0]
+
+  def testInline(self):
+    pool = executor.InlineExecutor()
+    results = []
+    pool.Execute(_Describe, (1,), lambda *args: results.append(args),
+                 {'suffix': 'a'})
+    # The call ran synchronously.
+    self.assertEquals([(True, (1, 'a', os.getpid(),
+                               threading.current_thread().name))], results)
+    pool.Execute(_Describe, (-1,), lambda *args: results.append(args))
+    self.assertFalse(results[1][0])
+    self.assertIsInstance(results[1][1], ValueError)
+    self.assertEquals(0, pool.queue_depth)
+    self.assertEquals(1, pool.max_queue_depth)
+
+  def testThreadPool(self):
+    pool = executor.ThreadPoolExecutor(2)
+    try:
+      (succeeded, result, thread) = self._Execute(pool, _Describe, (1,),
+                                                  {'suffix': 'a'})
+      self.assertTrue(succeeded)
+      self.assertEquals((1, 'a', os.getpid()), result[:3])
+      self.assertNotEquals(threading.current_thread().name, result[3])
+      # The result is delivered on the thread of the run loop.
+      self.assertIs(threading.current_thread(), thread)
+
+      (succeeded, result, _) = self._Execute(pool, _Describe, (-1,))
+      self.assertFalse(succeeded)
+      self.assertIsInstance(result, ValueError)
+    finally:
+      pool.Close()
+
+  def testProcessPool(self):
+    pool = executor.ProcessPoolExecutor(2)
+    try:
+      (succeeded, result, thread) = self._Execute(pool, _Describe, (1,),
+                                                  {'suffix': 'a'})
+      self.assertTrue(succeeded)
+      self.assertEquals((1, 'a'), result[:2])
+      self.assertNotEquals(os.getpid(), result[2])
+      self.assertIs(threading.current_thread(), thread)
+
+      # Bound methods are run on a copy of their instance.
+      impl = _Impl(10)
+      pool.CheckImplementation(impl)
+      (succeeded, result, _) = self._Execute(pool, impl.Describe, (1,))
+      self.assertTrue(succeeded)
+      self.assertEquals(11, result[0])
+
+      (succeeded, result, _) = self._Execute(pool, _Describe, (-1,))
+      self.assertFalse(succeeded)
+      self.assertIsInstance(result, ValueError)
+    finally:
+      pool.Close()
+
+  def testProcessPoolRejectsUnpicklableImplementations(self):
+    pool = executor.ProcessPoolExecutor(1)
+    try:
+      impl = _ImplWithManager(0)
+      with self.assertRaises(cPickle.PicklingError):
+        pool.CheckImplementation(impl)
+      # The other executors run any implementation.
+      executor.InlineExecutor().CheckImplementation(impl)
+    finally:
+      pool.Close()
+
+
+class RunLoopPosterTest(mojo_unittest.MojoTestCase):
+
+  def testPostFromAnotherThread(self):
+    poster = executor.RunLoopPoster.Current()
+    self.assertIs(poster, executor.RunLoopPoster.Current())
+    results = []
+    def Callback(value):
+      results.append((value, threading.current_thread()))
+      self.loop.Quit()
+    thread = threading.Thread(target=poster.Post, args=(Callback, (1,)))
+    thread.start()
+    self.loop.Run()
+    thread.join()
+    self.assertEquals([(1, threading.current_thread())], results)
+
+  def testNewRunLoop(self):
+    poster = executor.RunLoopPoster.Current()
+    self.loop = None
+    self.loop = system.RunLoop()
+    new_poster = executor.RunLoopPoster.Current()
+    self.assertIsNot(poster, new_poster)
+    results = []
+    new_poster.Post(results.append, (1,))
+    self.loop.RunUntilIdle()
+    self.assertEquals([1], results)
@@ -0,0 +1,128 @@
+# Copyright 2015 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import cPickle
+
+import mojo_unittest
+
+import mojo_bindings.descriptor as _descriptor
+import mojo_bindings.executor as executor
+import mojo_bindings.messaging as messaging
+
+
+def _Calculator():
+  return mojo_unittest.Interface('Calculator', [
+      ('Add', [('a', _descriptor.TYPE_INT32), ('s', _descriptor.TYPE_STRING)],
+       [('r', _descriptor.TYPE_INT32)]),
+      ('Reset', [], None),
+  ])
+
+
+class StubDispatchTest(mojo_unittest.InterfaceTestCase):
+
+  def setUp(self):
+    mojo_unittest.InterfaceTestCase.setUp(self)
+    self.calculator = _Calculator()
+
+  def _Add(self, impl, a, s):
+    (proxy, request) = self.calculator.manager.NewRequest()
+    self.calculator.manager.Bind(impl, request.PassMessagePipe())
+    try:
+      return self.RunLoopUntil(proxy.Add(a, s))
+    finally:
+      proxy.manager.Close()
+
+  def testDeclarationOrder(self):
+    class Impl(self.calculator):
+      def Add(self, a, s):
+        return a + len(s)
+    self.assertEquals(3, self._Add(Impl(), 1, 'xy'))
+
+  def testReorderedParameters(self):
+    class Impl(self.calculator):
+      def Add(self, s, a):
+        return a + len(s)
+    self.assertEquals(3, self._Add(Impl(), 1, 'xy'))
+
+  def testKeywordArguments(self):
+    class Impl(self.calculator):
+      def Add(self, **kwargs):
+        return kwargs['a'] + len(kwargs['s'])
+    self.assertEquals(3, self._Add(Impl(), 1, 'xy'))
+
+  def testCallableObject(self):
+    class Adder(object):
+      def __call__(self, s, a):
+        return a * len(s)
+    class Impl(self.calculator):
+      Add = Adder()
+    self.assertEquals(6, self._Add(Impl(), 2, 'xyz'))
+
+  def testExecutor(self):
+    class Impl(self.calculator):
+      def Add(self, s, a, **_):
+        return a + len(s)
+    for pool in (executor.InlineExecutor(), executor.ThreadPoolExecutor(2)):
+      self.calculator.manager.SetExecutor(pool)
+      try:
+        self.assertEquals(3, self._Add(Impl(), 1, 'xy'))
+      finally:
+        pool.Close()
+
+  def testUnpicklableImplementation(self):
+    class Impl(self.calculator):
+      def Add(self, a, s):
+        return a + len(s)
+    pool = executor.ProcessPoolExecutor(1)
+    self.calculator.manager.SetExecutor(pool)
+    try:
+      (proxy, request) = self.calculator.manager.NewRequest()
+      # The class of the implementation is local, so it cannot be pickled.
+      with self.assertRaises(cPickle.PicklingError):
+        self.calculator.manager.Bind(Impl(), request.PassMessagePipe())
+      # The pipe is closed.
+      with self.assertRaises(messaging.MessagingException):
+        self.RunLoopUntil(proxy.Add(1, 'xy'))
+    finally:
+      pool.Close()
+
+  def testUnimplementedMethod(self):
+    class Impl(self.calculator):
+      def Reset(self):
+        pass
+    impl = Impl()
+    (proxy, request) = self.calculator.manager.NewRequest()
+    # Binding succeeds, and calling the missing method closes the pipe.
+    self.calculator.manager.Bind(impl, request.PassMessagePipe())
+    self.assertIsNone(self.RunLoopUntil(proxy.Reset()))
+    with self.assertRaises(messaging.MessagingException):
+      self.RunLoopUntil(proxy.Add(1, 'xy'))
+
+
+class AcceptsPositionallyTest(mojo_unittest.InterfaceTestCase):
+
+  def testAcceptsPositionally(self):
+    # pylint: disable=W0212
+    accepts_positionally = (
+        mojo_unittest.interface_reflection._AcceptsPositionally)
+    class Impl(object):
+      def Exact(self, a, s):
+        pass
+      def WithDefault(self, a, s=''):
+        pass
+      def Reordered(self, s, a):
+        pass
+      def Keywords(self, a, s, **_):
+        pass
+      def Varargs(self, *args):
+        pass
+    impl = Impl()
+    names = ('a', 's')
+    self.assertTrue(accepts_positionally(impl.Exact, names))
+    self.assertTrue(accepts_positionally(impl.WithDefault, names))
+    self.assertTrue(accepts_positionally(lambda a, s: None, names))
+    self.assertFalse(accepts_positionally(impl.Reordered, names))
+    self.assertFalse(accepts_positionally(impl.Keywords, names))
+    self.assertFalse(accepts_positionally(impl.Varargs, names))
+    self.assertFalse(accepts_positionally(len, names))
@@ -0,0 +1,175 @@
+# Copyright 2015 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import json
+import unittest
+
+import mojo_unittest
+
+import mojo_bindings.descriptor as _descriptor
+import mojo_bindings.executor as executor
+import mojo_bindings.messaging as messaging
+import mojo_bindings.metrics as metrics
+
+
+def _Calculator():
+  return mojo_unittest.Interface('Calculator', [
+      ('Add', [('a', _descriptor.TYPE_INT32), ('s', _descriptor.TYPE_STRING)],
+       [('r', _descriptor.TYPE_INT32)]),
+      ('Reset', [], None),
+  ])
+
+
+class HistogramTest(unittest.TestCase):
+
+  def testEmpty(self):
+    histogram = metrics.Histogram()
+    self.assertEquals(0, histogram.mean)
+    self.assertEquals(0, histogram.Percentile(50))
+    self.assertEquals([], histogram.buckets)
+
+  def testBuckets(self):
+    histogram = metrics.Histogram()
+    for value in (0, 1, 1, 3, 100):
+      histogram.Add(value)
+    # The bucket i counts the values in [2^(i-1), 2^i).
+    self.assertEquals([1, 2, 1, 0, 0, 0, 0, 1], histogram.buckets)
+    self.assertEquals(5, histogram.count)
+    self.assertEquals(105, histogram.total)
+    self.assertEquals(21.0, histogram.mean)
+    self.assertEquals(100, histogram.max)
+
+  def testPercentile(self):
+    histogram = metrics.Histogram()
+    for value in (0, 1, 1, 3, 100):
+      histogram.Add(value)
+    # The upper bound of the bucket containing the percentile.
+    self.assertEquals(1, histogram.Percentile(0))
+    self.assertEquals(1, histogram.Percentile(20))
+    self.assertEquals(2, histogram.Percentile(50))
+    self.assertEquals(4, histogram.Percentile(80))
+    # The bound is never above the largest value.
+    self.assertEquals(100, histogram.Percentile(90))
+    self.assertEquals(100, histogram.Percentile(100))
+
+  def testPercentileOfZeros(self):
+    histogram = metrics.Histogram()
+    histogram.Add(0)
+    self.assertEquals(0, histogram.Percentile(50))
+
+  def testAsDict(self):
+    histogram = metrics.Histogram()
+    histogram.Add(5)
+    self.assertEquals({'count': 1, 'total': 5, 'mean': 5.0, 'max': 5,
+                       'p50': 5, 'p90': 5, 'p99': 5,
+                       'buckets': [0, 0, 0, 1]}, histogram.AsDict())
+
+
+class MethodMetricsTest(unittest.TestCase):
+
+  def testRecord(self):
+    method_metrics = metrics.MethodMetrics()
+    method_metrics.RecordRequestSent(messaging.Message('abcd', [None]), 3)
+    method_metrics.RecordResponseReceived(messaging.Message('ab', []), 1, 10)
+    self.assertEquals(1, method_metrics.requests_sent)
+    self.assertEquals(0, method_metrics.requests_received)
+    self.assertEquals(1, method_metrics.request_handles)
+    self.assertEquals(4, method_metrics.request_size.total)
+    self.assertEquals(2, method_metrics.response_size.total)
+    self.assertEquals(3, method_metrics.serialization.total)
+    self.assertEquals(1, method_metrics.deserialization.total)
+    self.assertEquals(10, method_metrics.round_trip.total)
+    self.assertEquals(0, method_metrics.handler.count)
+
+    result = method_metrics.AsDict()
+    self.assertEquals(1, result['requests_sent'])
+    self.assertEquals(10, result['round_trip']['max'])
+
+
+class MetricsTest(mojo_unittest.InterfaceTestCase):
+
+  def setUp(self):
+    mojo_unittest.InterfaceTestCase.setUp(self)
+    self.calculator = _Calculator()
+    class Impl(self.calculator):
+      def Add(self, a, s):
+        return a + len(s)
+      def Reset(self):
+        pass
+    self.impl_class = Impl
+    self.metrics = metrics.Enable()
+
+  def tearDown(self):
+    metrics.Disable()
+    mojo_unittest.InterfaceTestCase.tearDown(self)
+
+  def _Call(self):
+    (proxy, request) = self.calculator.manager.NewRequest()
+    self.calculator.manager.Bind(self.impl_class(), request.PassMessagePipe())
+    try:
+      proxy.Reset()
+      self.assertEquals(3, self.RunLoopUntil(proxy.Add(1, 'xy')))
+    finally:
+      proxy.manager.Close()
+
+  def _Check(self):
+    add_proxy = self.metrics.ForMethod('Calculator', 'Add', metrics.PROXY)
+    self.assertEquals(1, add_proxy.requests_sent)
+    self.assertEquals(0, add_proxy.requests_received)
+    self.assertEquals(1, add_proxy.request_size.count)
+    self.assertEquals(1, add_proxy.serialization.count)
+    self.assertEquals(1, add_proxy.response_size.count)
+    self.assertEquals(1, add_proxy.deserialization.count)
+    self.assertEquals(1, add_proxy.round_trip.count)
+    self.assertEquals(0, add_proxy.handler.count)
+
+    add_stub = self.metrics.ForMethod('Calculator', 'Add', metrics.STUB)
+    self.assertEquals(0, add_stub.requests_sent)
+    self.assertEquals(1, add_stub.requests_received)
+    self.assertEquals(add_proxy.request_size.total,
+                      add_stub.request_size.total)
+    self.assertEquals(1, add_stub.deserialization.count)
+    self.assertEquals(1, add_stub.handler.count)
+    self.assertEquals(add_proxy.response_size.total,
+                      add_stub.response_size.total)
+    self.assertEquals(1, add_stub.serialization.count)
+    self.assertEquals(0, add_stub.round_trip.count)
+
+    # Reset has no response.
+    reset_proxy = self.metrics.ForMethod('Calculator', 'Reset', metrics.PROXY)
+    self.assertEquals(1, reset_proxy.requests_sent)
+    self.assertEquals(0, reset_proxy.round_trip.count)
+    reset_stub = self.metrics.ForMethod('Calculator', 'Reset', metrics.STUB)
+    self.assertEquals(1, reset_stub.requests_received)
+    self.assertEquals(1, reset_stub.handler.count)
+    self.assertEquals(0, reset_stub.response_size.count)
+
+  def testProxyAndStub(self):
+    self._Call()
+    self._Check()
+
+    result = json.loads(self.metrics.ToJson())
+    self.assertEquals(['Add', 'Reset'], sorted(result['Calculator']))
+    self.assertEquals([metrics.PROXY, metrics.STUB],
+                      sorted(result['Calculator']['Add']))
+
+  def testExecutor(self):
+    pool = executor.ThreadPoolExecutor(1)
+    self.calculator.manager.SetExecutor(pool)
+    try:
+      self._Call()
+    finally:
+      pool.Close()
+    self._Check()
+
+  def testReset(self):
+    self._Call()
+    self.metrics.Reset()
+    self.assertEquals({}, self.metrics.AsDict())
+
+  def testDisabled(self):
+    metrics.Disable()
+    self.assertIsNone(metrics.Current())
+    self._Call()
+    self.assertEquals({}, self.metrics.AsDict())
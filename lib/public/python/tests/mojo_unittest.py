@@ -0,0 +1,120 @@
+# Copyright 2015 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+"""Test cases and helpers shared by the tests of the python bindings."""
+
+import time
+import unittest
+
+import mojo_bindings.descriptor as _descriptor
+
+# pylint: disable=F0401
+import mojo_system as system
+
+try:
+  import mojo_bindings.interface_reflection as interface_reflection
+except ImportError:
+  # The generated interface_control_messages_mojom cannot be found.
+  interface_reflection = None
+
+
+# Whether mojo_system is the native module rather than the dummy one, which
+# only supports serialization.
+HAS_MOJO_SYSTEM = hasattr(system, 'RunLoop')
+
+
+class MojoTestCase(unittest.TestCase):
+  """
+  A test case running with a run loop. It is skipped when mojo_system is not
+  available.
+  """
+
+  def setUp(self):
+    if not HAS_MOJO_SYSTEM:
+      self.skipTest('mojo_system is not available.')
+    self.loop = system.RunLoop()
+
+  def tearDown(self):
+    self.loop = None
+
+  def RunLoopUntil(self, p):
+    """
+    Runs the run loop until the promise p is settled. Returns the value of p,
+    or raises the reason of its rejection.
+    """
+    results = []
+    state = {'running': False}
+    def Settle(fulfilled, value):
+      results.append((fulfilled, value))
+      if state['running']:
+        self.loop.Quit()
+    p.Then(lambda value: Settle(True, value),
+           lambda reason: Settle(False, reason))
+    if not results:
+      state['running'] = True
+      self.loop.Run()
+    (fulfilled, value) = results[0]
+    if not fulfilled:
+      raise value
+    return value
+
+  def RunLoopUntilTrue(self, condition, timeout=10):
+    """
+    Runs the run loop until condition() is True, waiting for the events coming
+    from other threads or processes. Fails after timeout seconds.
+    """
+    deadline = time.time() + timeout
+    while True:
+      self.loop.RunUntilIdle()
+      if condition():
+        return
+      if time.time() > deadline:
+        self.fail('Timed out.')
+      time.sleep(0.01)
+
+
+class InterfaceTestCase(MojoTestCase):
+  """
+  A MojoTestCase for interfaces. It is skipped when the interface bindings
+  cannot be imported.
+  """
+
+  def setUp(self):
+    if interface_reflection is None:
+      self.skipTest('Could not import the interface bindings.')
+    MojoTestCase.setUp(self)
+
+
+def Fields(*fields):
+  """
+  Returns the field descriptors of a struct whose fields are the given
+  (name, type) tuples, in order.
+  """
+  return [_descriptor.SingleFieldGroup(name, field_type, index, 0)
+          for (index, (name, field_type)) in enumerate(fields)]
+
+
+def Interface(name, methods, version=0):
+  """
+  Returns a new interface class. methods are (name, parameters, responses)
+  tuples, where parameters and responses are lists of (name, type) tuples, and
+  responses is None for methods without response.
+  """
+  method_descriptors = []
+  for (ordinal, (method_name, parameters, responses)) in enumerate(methods):
+    method_descriptor = {
+      'name': method_name,
+      'ordinal': ordinal,
+      'parameters': {'fields': Fields(*parameters)},
+    }
+    if responses is not None:
+      method_descriptor['responses'] = {'fields': Fields(*responses)}
+    method_descriptors.append(method_descriptor)
+  return interface_reflection.MojoInterfaceType(name, (object,), {
+    'DESCRIPTOR': {
+      'fully_qualified_name': 'test::%s' % name,
+      'version': version,
+      'methods': method_descriptors,
+    },
+  })
@@ -0,0 +1,109 @@
+# Copyright 2015 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import array
+import unittest
+
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
+import mojo_unittest
+
+import mojo_bindings.descriptor as _descriptor
+import mojo_bindings.reflection as _reflection
+import mojo_bindings.serialization as serialization
+
+
+class Samples(object):
+  __metaclass__ = _reflection.MojoStructType
+  DESCRIPTOR = {
+    'fields': mojo_unittest.Fields(
+        ('doubles', _descriptor.NativeArrayType('d', nullable=True)),
+        ('octets', _descriptor.NativeArrayType('B', nullable=True)),
+        ('numpy_ints', _descriptor.NativeArrayType('i', nullable=True,
+                                                   use_numpy=True))),
+  }
+
+
+def _RoundTrip(value):
+  (data, handles) = value.Serialize()
+  return Samples.Deserialize(
+      serialization.RootDeserializationContext(data, handles))
+
+
+class NativeArrayTest(unittest.TestCase):
+
+  def testArray(self):
+    result = _RoundTrip(Samples(doubles=array.array('d', [1.5, -2]),
+                                octets=[1, 2, 255]))
+    self.assertEquals(array.array('d', [1.5, -2]), result.doubles)
+    self.assertEquals(array.array('B', [1, 2, 255]), result.octets)
+    self.assertIsNone(result.numpy_ints)
+
+  def testArrayOfAnotherType(self):
+    value = Samples(doubles=array.array('f', [1.5]))
+    # The array is converted.
+    self.assertEquals(array.array('d', [1.5]), value.doubles)
+    with self.assertRaises(TypeError):
+      Samples(doubles=['a'])
+
+  def testMemoryview(self):
+    view = memoryview(bytearray('\x01\x02\x03'))
+    value = Samples(octets=view)
+    # The view is serialized without being copied to an array.
+    self.assertIs(view, value.octets)
+    self.assertEquals(array.array('B', [1, 2, 3]), _RoundTrip(value).octets)
+    # Only views of the element type are accepted.
+    with self.assertRaises(TypeError):
+      Samples(doubles=view)
+
+  @unittest.skipIf(numpy is None, 'numpy is not available.')
+  def testNumpyInput(self):
+    doubles = numpy.arange(6, dtype='<d')
+    value = Samples(doubles=doubles)
+    self.assertIs(doubles, value.doubles)
+    self.assertEquals(array.array('d', range(6)), _RoundTrip(value).doubles)
+    # Non contiguous arrays are made contiguous.
+    value = Samples(doubles=doubles[::2])
+    self.assertEquals(array.array('d', [0, 2, 4]), _RoundTrip(value).doubles)
+    value = Samples(doubles=memoryview(doubles[2:4]))
+    self.assertEquals(array.array('d', [2, 3]), _RoundTrip(value).doubles)
+
+  @unittest.skipIf(numpy is None, 'numpy is not available.')
+  def testNumpyInputOfAnotherType(self):
+    for doubles in (numpy.arange(3, dtype='<f'), numpy.zeros((2, 2), '<d'),
+                    memoryview(numpy.arange(3, dtype='<f'))):
+      with self.assertRaises(TypeError):
+        Samples(doubles=doubles)
+
+  @unittest.skipIf(numpy is None, 'numpy is not available.')
+  def testNumpyOutput(self):
+    result = _RoundTrip(Samples(doubles=[1, 2], numpy_ints=[3, -4]))
+    # Only the type using numpy is deserialized as numpy arrays by default.
+    self.assertIsInstance(result.doubles, array.array)
+    self.assertIsInstance(result.numpy_ints, numpy.ndarray)
+    self.assertEquals([3, -4], result.numpy_ints.tolist())
+    # The array is a read-only view of the message.
+    self.assertFalse(result.numpy_ints.flags.writeable)
+
+    _descriptor.UseNumpyArrays(True, 'd')
+    try:
+      result = _RoundTrip(Samples(doubles=[1, 2], octets=[3]))
+      self.assertIsInstance(result.doubles, numpy.ndarray)
+      self.assertEquals(numpy.dtype('<d'), result.doubles.dtype)
+      self.assertEquals([1, 2], result.doubles.tolist())
+      self.assertIsInstance(result.octets, array.array)
+    finally:
+      _descriptor.UseNumpyArrays(False)
+    self.assertIsInstance(_RoundTrip(Samples(doubles=[1])).doubles,
+                          array.array)
+
+  @unittest.skipIf(numpy is None, 'numpy is not available.')
+  def testEquality(self):
+    self.assertEquals(Samples(doubles=numpy.array([1., 2.])),
+                      Samples(doubles=[1, 2]))
+    self.assertNotEquals(Samples(doubles=numpy.array([1., 2.])),
+                         Samples(doubles=[1, 3]))
@@ -0,0 +1,158 @@
+# Copyright 2015 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import copy
+import cPickle
+import pickle
+import StringIO
+import sys
+import threading
+import unittest
+
+import mojo_bindings.descriptor as _descriptor
+import mojo_bindings.reflection as _reflection
+import mojo_bindings.serialization as serialization
+
+
+def _PointClass():
+  """Returns a new struct class, which is not materialized yet."""
+  class Point(object):
+    __metaclass__ = _reflection.MojoStructType
+    DESCRIPTOR = lambda: {
+      'constants': {'ORIGIN': 0},
+      'fields': [
+        _descriptor.SingleFieldGroup('x', _descriptor.TYPE_INT32, 0, 0),
+        _descriptor.SingleFieldGroup('name', _descriptor.TYPE_STRING, 1, 0),
+      ],
+    }
+  return Point
+
+
+def _ValueClass(point_class):
+  """Returns a new union class, which is not materialized yet."""
+  class Value(object):
+    __metaclass__ = _reflection.MojoUnionType
+    DESCRIPTOR = lambda: {
+      'fields': [
+        _descriptor.SingleFieldGroup('i', _descriptor.TYPE_INT32, 0, 0),
+        _descriptor.SingleFieldGroup(
+            'point', _descriptor.StructType(lambda: point_class), 1, 0),
+      ],
+    }
+  return Value
+
+
+# The pickles refer to these classes by name.
+Point = _PointClass()
+Value = _ValueClass(Point)
+
+
+def _Unpickle(data, classes):
+  """Unpickles data, looking up the classes named in classes there."""
+  unpickler = pickle.Unpickler(StringIO.StringIO(data))
+  def FindClass(module, name):
+    if name in classes:
+      return classes[name]
+    return pickle.Unpickler.find_class(unpickler, module, name)
+  unpickler.find_class = FindClass
+  return unpickler.load()
+
+
+class PickleTest(unittest.TestCase):
+
+  def _RoundTrip(self, value, protocol):
+    """
+    Pickles value, and unpickles it with new classes, which are materialized
+    by the unpickling.
+    """
+    point_class = _PointClass()
+    classes = {'Point': point_class, 'Value': _ValueClass(point_class)}
+    return (_Unpickle(pickle.dumps(value, protocol), classes), classes)
+
+  def testStruct(self):
+    for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+      (result, classes) = self._RoundTrip(Point(x=1, name='a'), protocol)
+      self.assertIs(type(result), classes['Point'])
+      self.assertEquals(1, result.x)
+      self.assertEquals('a', result.name)
+      self.assertEquals(classes['Point'](x=1, name='a'), result)
+
+  def testUnion(self):
+    (result, classes) = self._RoundTrip(Value(point=Point(x=2)),
+                                        pickle.HIGHEST_PROTOCOL)
+    self.assertIs(type(result), classes['Value'])
+    self.assertEquals(Value.Tags.point, result.tag)
+    self.assertEquals(classes['Point'](x=2), result.point)
+
+    (result, _) = self._RoundTrip(Value(), pickle.HIGHEST_PROTOCOL)
+    self.assertTrue(result.IsUnknown())
+
+  def testCPickle(self):
+    point = Point(x=1, name='a')
+    self.assertEquals(point, cPickle.loads(cPickle.dumps(point)))
+
+  def testCopy(self):
+    point = Point(x=3)
+    result = copy.deepcopy(point)
+    self.assertEquals(point, result)
+    result.x = 4
+    self.assertEquals(3, point.x)
+
+
+class MaterializationTest(unittest.TestCase):
+
+  def setUp(self):
+    # Switch threads as often as possible, to interleave the first uses.
+    self._check_interval = sys.getcheckinterval()
+    sys.setcheckinterval(1)
+
+  def tearDown(self):
+    sys.setcheckinterval(self._check_interval)
+
+  def _RunConcurrently(self, functions):
+    """Runs the functions on as many threads, and returns their errors."""
+    start = threading.Event()
+    errors = []
+    def Run(function):
+      start.wait()
+      try:
+        function()
+      # pylint: disable=W0702
+      except:
+        errors.append(sys.exc_info()[1])
+    threads = [threading.Thread(target=Run, args=(f,)) for f in functions]
+    for thread in threads:
+      thread.start()
+    start.set()
+    for thread in threads:
+      thread.join()
+    return errors
+
+  def testConcurrentFirstUses(self):
+    (data, _) = Point(x=1, name='a').Serialize()
+    pickled = pickle.dumps(Point(x=1, name='a'), pickle.HIGHEST_PROTOCOL)
+    for _ in range(1000):
+      point_class = _PointClass()
+      value_class = _ValueClass(point_class)
+      def New():
+        point = point_class(x=1, name='a')
+        self.assertEquals((1, 'a'), (point.x, point.name))
+      def Deserialize():
+        point = point_class.Deserialize(
+            serialization.RootDeserializationContext(data, []))
+        self.assertEquals((1, 'a'), (point.x, point.name))
+      def Unpickle():
+        point = _Unpickle(pickled, {'Point': point_class})
+        self.assertEquals((1, 'a'), (point.x, point.name))
+      def Constant():
+        self.assertEquals(0, point_class.ORIGIN)
+      def Union():
+        self.assertEquals(1, value_class(point=point_class(x=1)).point.x)
+      errors = self._RunConcurrently(
+          [New, Deserialize, Unpickle, Constant, Union] * 4)
+      self.assertEquals([], errors)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,189 @@
+# Copyright 2015 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import os
+
+import mojo_unittest
+
+import mojo_bindings.descriptor as _descriptor
+import mojo_bindings.messaging as messaging
+from mojo_application import service_host
+
+# pylint: disable=F0401
+import mojo_system as system
+
+
+if mojo_unittest.interface_reflection:
+  # The services are defined at the top level so that the worker processes
+  # can unpickle them.
+  Counter = mojo_unittest.Interface('Counter', [
+      ('Add', [('value', _descriptor.TYPE_INT32)],
+       [('total', _descriptor.TYPE_INT32)]),
+      ('GetPid', [], [('pid', _descriptor.TYPE_INT32)]),
+      ('Close', [], None),
+      ('Keep', [('handle', _descriptor.TYPE_HANDLE)], None),
+  ])
+
+  class CounterImpl(Counter):
+    def __init__(self):
+      self.total = 0
+
+    def Add(self, value):
+      self.total += value
+      return self.total
+
+    def GetPid(self):
+      return os.getpid()
+
+    def Close(self):
+      self.manager.Close()
+
+    def Keep(self, handle):
+      pass
+
+
+class _ServiceHostTest(object):
+  """The tests shared by the thread and the process workers."""
+
+  processes = None
+
+  def setUp(self):
+    mojo_unittest.InterfaceTestCase.setUp(self)
+    self.host = None
+    # The proxies are kept, as the connections are closed when they are
+    # garbage collected.
+    self.proxies = []
+
+  def tearDown(self):
+    if self.host:
+      self.host.Stop()
+    mojo_unittest.InterfaceTestCase.tearDown(self)
+
+  def _NewHost(self, nb_workers, policy=service_host.LEAST_LOADED):
+    self.host = service_host.ServiceHost(nb_workers, policy, self.processes)
+    return self.host
+
+  def _Connect(self, service_name='Counter'):
+    (proxy, request) = Counter.manager.NewRequest()
+    self.host.Bind(service_name, CounterImpl, request.PassMessagePipe())
+    self.proxies.append(proxy)
+    return proxy
+
+  def _RunLoopUntilLoads(self, loads):
+    self.RunLoopUntilTrue(lambda: self.host.GetLoads() == loads)
+
+  def testCalls(self):
+    self._NewHost(1)
+    proxy = self._Connect()
+    self.assertEquals(2, self.RunLoopUntil(proxy.Add(2)))
+    # The connection keeps its service instance.
+    self.assertEquals(5, self.RunLoopUntil(proxy.Add(3)))
+    self.assertEquals(2, self.RunLoopUntil(self._Connect().Add(2)))
+
+  def testLeastLoaded(self):
+    self._NewHost(2)
+    proxies = [self._Connect() for _ in range(3)]
+    self.assertEquals([2, 1], self.host.GetLoads())
+    # The connections are closed by the client, and by the service.
+    proxies[0].manager.Close()
+    self._RunLoopUntilLoads([1, 1])
+    self.assertIsNone(self.RunLoopUntil(proxies[1].Close()))
+    self._RunLoopUntilLoads([1, 0])
+    self._Connect()
+    self.assertEquals([1, 1], self.host.GetLoads())
+
+  def testHash(self):
+    self._NewHost(3, service_host.HASH)
+    for _ in range(3):
+      self._Connect('Counter')
+    index = hash('Counter') % 3
+    self.assertEquals(3, self.host.GetLoads()[index])
+    self.assertEquals(3, sum(self.host.GetLoads()))
+
+  def testStop(self):
+    self._NewHost(2)
+    proxy = self._Connect()
+    self.assertEquals(1, self.RunLoopUntil(proxy.Add(1)))
+    self.host.Stop()
+    self.assertEquals([0, 0], self.host.GetLoads())
+    with self.assertRaises(messaging.MessagingException):
+      self.RunLoopUntil(proxy.Add(1))
+
+
+class ThreadServiceHostTest(_ServiceHostTest,
+                            mojo_unittest.InterfaceTestCase):
+
+  processes = False
+
+  def testRestart(self):
+    self._NewHost(1)
+    self.assertEquals(1, self.RunLoopUntil(self._Connect().Add(1)))
+    # pylint: disable=W0212
+    worker = self.host._workers[0]
+    worker.Stop()
+    self.assertEquals(1, self.RunLoopUntil(self._Connect().Add(1)))
+    self.assertIsNot(worker, self.host._workers[0])
+
+  def testStartupError(self):
+    class Error(Exception):
+      pass
+    class FailingPoster(object):
+      @staticmethod
+      def Current():
+        raise Error()
+    self._NewHost(1)
+    poster = service_host.RunLoopPoster
+    service_host.RunLoopPoster = FailingPoster
+    try:
+      with self.assertRaises(Error):
+        self._Connect()
+      # The worker is started again by the next connection.
+      with self.assertRaises(Error):
+        self._Connect()
+    finally:
+      service_host.RunLoopPoster = poster
+    self.assertEquals(1, self.RunLoopUntil(self._Connect().Add(1)))
+
+
+class ProcessServiceHostTest(_ServiceHostTest,
+                             mojo_unittest.InterfaceTestCase):
+
+  processes = True
+
+  def testRunsInWorkerProcesses(self):
+    self._NewHost(2)
+    pids = set(self.RunLoopUntil(self._Connect().GetPid()) for _ in range(2))
+    self.assertEquals(2, len(pids))
+    self.assertNotIn(os.getpid(), pids)
+
+  def testRestart(self):
+    self._NewHost(1)
+    proxy = self._Connect()
+    self.assertEquals(1, self.RunLoopUntil(proxy.Add(1)))
+    # pylint: disable=W0212
+    worker = self.host._workers[0]
+    worker._process.terminate()
+    # The connections of the dead worker are closed.
+    self._RunLoopUntilLoads([0])
+    with self.assertRaises(messaging.MessagingException):
+      self.RunLoopUntil(proxy.Add(1))
+    self.assertEquals(1, self.RunLoopUntil(self._Connect().Add(1)))
+    self.assertIsNot(worker, self.host._workers[0])
+
+  def testHandlesAreRejected(self):
+    self._NewHost(1)
+    proxy = self._Connect()
+    proxy.Keep(system.MessagePipe().handle0)
+    self._RunLoopUntilLoads([0])
+    with self.assertRaises(messaging.MessagingException):
+      self.RunLoopUntil(proxy.Add(1))
+
+  def testServiceMustBePicklable(self):
+    class LocalImpl(Counter):
+      pass
+    self._NewHost(1)
+    (_, request) = Counter.manager.NewRequest()
+    with self.assertRaises(Exception):
+      self.host.Bind('Counter', LocalImpl, request.PassMessagePipe())
+    self.assertEquals([0], self.host.GetLoads())
@@ -0,0 +1,200 @@
+# Copyright 2015 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import array
+import unittest
+
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
+import mojo_unittest
+
+import mojo_bindings.descriptor as _descriptor
+import mojo_bindings.messaging as messaging
+import mojo_bindings.reflection as _reflection
+import mojo_bindings.serialization as serialization
+import mojo_bindings.shared_buffers as shared_buffers
+
+
+class Frame(object):
+  __metaclass__ = _reflection.MojoStructType
+  DESCRIPTOR = {
+    'fields': mojo_unittest.Fields(
+        ('samples', _descriptor.NativeArrayType('f')),
+        ('inline', _descriptor.NativeArrayType('f', shareable=False)),
+        ('name', _descriptor.TYPE_STRING)),
+  }
+
+
+def _Deserialize(data, handles, accepts_shared_buffers=True):
+  return Frame.Deserialize(serialization.RootDeserializationContext(
+      data, handles, accepts_shared_buffers))
+
+
+class SharedArrayTest(mojo_unittest.MojoTestCase):
+
+  def _Serialize(self, threshold, **kwargs):
+    with shared_buffers.Threshold(threshold):
+      return Frame(inline=[], name='', **kwargs).Serialize()
+
+  def testRoundTrip(self):
+    samples = array.array('f', range(100))
+    (data, handles) = self._Serialize(16, samples=samples)
+    self.assertEquals(1, len(handles))
+    result = _Deserialize(data, handles)
+    self.assertIsInstance(result.samples, shared_buffers.MappedArray)
+    self.assertEquals(samples, result.samples)
+    # The result can be sent again.
+    (data, handles) = self._Serialize(16, samples=result.samples)
+    self.assertEquals(samples.tolist(), _Deserialize(data, handles).samples)
+
+  @unittest.skipIf(numpy is None, 'numpy is not available.')
+  def testNumpy(self):
+    samples = numpy.arange(100, dtype='<f')
+    (data, handles) = self._Serialize(16, samples=samples)
+    self.assertEquals(1, len(handles))
+    _descriptor.UseNumpyArrays(True, 'f')
+    try:
+      result = _Deserialize(data, handles).samples
+    finally:
+      _descriptor.UseNumpyArrays(False)
+    # A view of the mapped buffer.
+    self.assertIsInstance(result, numpy.ndarray)
+    self.assertEquals(samples.tolist(), result.tolist())
+
+  def testWireEncoding(self):
+    (data, handles) = self._Serialize(0, samples=[1, 2, 3])
+    # The pointer of the first field is relative to its own position.
+    (pointer,) = serialization.POINTER_STRUCT.unpack_from(
+        data, serialization.HEADER_STRUCT.size)
+    offset = serialization.HEADER_STRUCT.size + pointer
+    # The header of the array, followed by the index of the handle of its
+    # buffer.
+    self.assertEquals(
+        serialization.HEADER_STRUCT.pack(16, 3) +
+        shared_buffers.SHARED_ARRAY_STRUCT.pack(0, 0),
+        str(data[offset:offset + 16]))
+    self.assertEquals(1, len(handles))
+
+  def testThreshold(self):
+    samples = range(10)
+    for (threshold, nb_handles) in ((None, 0), (40, 0), (39, 1), (0, 1)):
+      (data, handles) = self._Serialize(threshold, samples=samples)
+      self.assertEquals(nb_handles, len(handles))
+      self.assertEquals(samples, list(_Deserialize(data, handles).samples))
+    # The threshold is only set in the block.
+    self.assertIsNone(shared_buffers.GetThreshold())
+
+  def testSmallArraysAreInline(self):
+    # Data fitting in the encoding of a shared array is always inline.
+    (data, handles) = self._Serialize(0, samples=[1, 2])
+    self.assertEquals([], handles)
+    self.assertEquals([1, 2], list(_Deserialize(data, handles).samples))
+    (_, handles) = self._Serialize(0, samples=[1, 2, 3])
+    self.assertEquals(1, len(handles))
+
+  def testNotShareable(self):
+    with shared_buffers.Threshold(0):
+      (_, handles) = Frame(samples=[], inline=range(100), name='').Serialize()
+    self.assertEquals([], handles)
+
+  def testReceiverNotOptedIn(self):
+    (data, handles) = self._Serialize(0, samples=range(10))
+    with self.assertRaises(serialization.DeserializationException):
+      _Deserialize(data, handles, accepts_shared_buffers=False)
+
+
+class MappedArrayTest(mojo_unittest.MojoTestCase):
+
+  def _MappedArray(self, values):
+    values = array.array('i', values)
+    handle = shared_buffers.CreateSharedBuffer(buffer(values),
+                                               len(values) * values.itemsize)
+    return shared_buffers.MapArray(handle, 'i', len(values))
+
+  def testSequence(self):
+    mapped_array = self._MappedArray([1, 2, 3])
+    self.assertEquals(3, len(mapped_array))
+    self.assertEquals(4, mapped_array.itemsize)
+    self.assertEquals(1, mapped_array[0])
+    self.assertEquals(3, mapped_array[-1])
+    self.assertEquals([2, 3], mapped_array[1:])
+    self.assertEquals([1, 2, 3], list(mapped_array))
+    self.assertEquals([1, 2, 3], mapped_array.tolist())
+    with self.assertRaises(IndexError):
+      mapped_array[3]
+    with self.assertRaises(IndexError):
+      mapped_array[-4]
+    self.assertEquals("MappedArray('i', [1, 2, 3])", repr(mapped_array))
+
+  def testSetItem(self):
+    mapped_array = self._MappedArray([1, 2, 3])
+    mapped_array[1] = -5
+    mapped_array[-1] = 7
+    self.assertEquals([1, -5, 7], mapped_array.tolist())
+    self.assertEquals(array.array('i', [1, -5, 7]).tostring(),
+                      mapped_array.buffer.tobytes())
+    with self.assertRaises(IndexError):
+      mapped_array[3] = 0
+
+  def testEquality(self):
+    mapped_array = self._MappedArray([1, 2])
+    self.assertEquals(mapped_array, [1, 2])
+    self.assertEquals(mapped_array, array.array('i', [1, 2]))
+    self.assertNotEquals(mapped_array, [1, 2, 3])
+    self.assertNotEquals(mapped_array, 1)
+
+  @unittest.skipIf(numpy is None, 'numpy is not available.')
+  def testNumpyView(self):
+    mapped_array = self._MappedArray([1, 2, 3])
+    view = numpy.asarray(mapped_array)
+    self.assertEquals(numpy.dtype('<i'), view.dtype)
+    self.assertEquals([1, 2, 3], view.tolist())
+    # The view shares the mapped buffer.
+    mapped_array[0] = 9
+    self.assertEquals(9, view[0])
+
+
+class SharedBufferInterfaceTest(mojo_unittest.InterfaceTestCase):
+
+  def setUp(self):
+    mojo_unittest.InterfaceTestCase.setUp(self)
+    self.sink = mojo_unittest.Interface('Sink', [
+        ('Push', [('frame', _descriptor.StructType(lambda: Frame))],
+         [('total', _descriptor.TYPE_DOUBLE)]),
+    ])
+    self.received = []
+    received = self.received
+    class Impl(self.sink):
+      def Push(self, frame):
+        received.append(frame.samples)
+        return sum(frame.samples)
+    self.impl_class = Impl
+
+  def _Push(self, samples):
+    (proxy, request) = self.sink.manager.NewRequest()
+    self.sink.manager.Bind(self.impl_class(), request.PassMessagePipe())
+    try:
+      return self.RunLoopUntil(
+          proxy.Push(Frame(samples=samples, inline=[], name='')))
+    finally:
+      proxy.manager.Close()
+
+  def testSharedBuffer(self):
+    self.sink.manager.SetSharedBufferThreshold(16)
+    self.assertEquals(4950, self._Push(range(100)))
+    self.assertIsInstance(self.received[0], shared_buffers.MappedArray)
+
+  def testReceiverNotOptedIn(self):
+    self.sink.manager.SetSharedBufferThreshold(16)
+    (proxy, request) = self.sink.manager.NewRequest()
+    self.sink.manager.SetSharedBufferThreshold(None)
+    self.sink.manager.Bind(self.impl_class(), request.PassMessagePipe())
+    # The implementation rejects the message, closing the pipe.
+    with self.assertRaises(messaging.MessagingException):
+      self.RunLoopUntil(proxy.Push(Frame(samples=range(100), inline=[],
+                                         name='')))
+    self.assertEquals([], self.received)
@@ -0,0 +1,92 @@
+# Copyright 2015 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import unittest
+
+import mojo_bindings.descriptor as _descriptor
+import mojo_bindings.reflection as _reflection
+import mojo_bindings.serialization as serialization
+
+
+_F = _descriptor.SingleFieldGroup
+
+
+class Small(object):
+  __metaclass__ = _reflection.MojoUnionType
+  DESCRIPTOR = {
+    'fields': [
+      _F('i', _descriptor.TYPE_INT64, 0, 0),
+      _F('b', _descriptor.TYPE_BOOL, 1, 0),
+    ],
+  }
+
+
+class Value(object):
+  __metaclass__ = _reflection.MojoUnionType
+  DESCRIPTOR = {
+    'fields': [
+      _F('i', _descriptor.TYPE_INT32, 0, 0),
+      _F('d', _descriptor.TYPE_DOUBLE, 1, 0),
+      _F('s', _descriptor.TYPE_STRING, 2, 0),
+      _F('small', _descriptor.UnionType(lambda: Small), 3, 0),
+    ],
+  }
+
+
+class Holder(object):
+  __metaclass__ = _reflection.MojoStructType
+  DESCRIPTOR = {
+    'fields': [
+      _F('value', _descriptor.UnionType(lambda: Value), 0, 0),
+      _F('values',
+         _descriptor.GenericArrayType(_descriptor.UnionType(lambda: Value)),
+         1, 0),
+    ],
+  }
+
+
+def _Deserialize(cls, data, handles):
+  return cls.Deserialize(
+      serialization.RootDeserializationContext(data, handles))
+
+
+class UnionSerializationTest(unittest.TestCase):
+
+  def _Values(self):
+    return [Value(i=-3), Value(d=2.5), Value(s='abc'),
+            Value(small=Small(i=-1)), Value(small=Small(b=True))]
+
+  def testRoundTrip(self):
+    for value in self._Values():
+      (data, handles) = value.Serialize()
+      self.assertEquals(value.data, _Deserialize(Value, data, handles).data)
+
+  def testRoundTripInStruct(self):
+    holder = Holder(value=Value(d=-0.5), values=self._Values())
+    (data, handles) = holder.Serialize()
+    result = _Deserialize(Holder, data, handles)
+    self.assertEquals(-0.5, result.value.d)
+    self.assertEquals([v.tag for v in self._Values()],
+                      [v.tag for v in result.values])
+    self.assertEquals(-3, result.values[0].i)
+    self.assertEquals('abc', result.values[2].s)
+    self.assertEquals(-1, result.values[3].small.i)
+
+  def testSerializeInline(self):
+    for value in self._Values():
+      ((size, tag, entry, data), handles) = value.SerializeInline()
+      self.assertEquals(serialization.UNION_STRUCT.size, size)
+      self.assertEquals(value.tag, tag)
+      self.assertEquals([], handles)
+      # The out of line data is appended right after the union, so that the
+      # pointer is to the next field.
+      if entry == -1:
+        entry = serialization.POINTER_STRUCT.size
+      self.assertEquals(value.Serialize()[0],
+                        serialization.UNION_STRUCT.pack(size, tag, entry) +
+                        data)
+
+
+if __name__ == '__main__':
+  unittest.main()
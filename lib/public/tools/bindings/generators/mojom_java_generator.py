@@ -6,11 +6,8 @@
 
 import argparse
 import ast
-import contextlib
 import os
 import re
-import shutil
-import tempfile
 import zipfile
 
 from jinja2 import contextfilter
@@ -377,21 +374,14 @@ def HasMethodWithoutResponse(interface):
       return True
   return False
 
-@contextlib.contextmanager
-def TempDir():
-  dirname = tempfile.mkdtemp()
-  try:
-    yield dirname
-  finally:
-    shutil.rmtree(dirname)
-
-def ZipContentInto(root, zip_filename):
-  with zipfile.ZipFile(zip_filename, 'w') as zip_file:
-    for dirname, _, files in os.walk(root):
-      for filename in files:
-        path = os.path.join(dirname, filename)
-        path_in_archive = os.path.relpath(path, root)
-        zip_file.write(path, path_in_archive)
+# Timestamp of the entries of the generated srcjar. A fixed value is used so
+# that the output only depends on the input.
+_ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+def WriteZipEntry(zip_file, path_in_archive, contents):
+  zip_info = zipfile.ZipInfo(path_in_archive, _ZIP_DATE_TIME)
+  zip_info.external_attr = 0644 << 16L
+  zip_file.writestr(zip_info, contents)
 
 class Generator(generator.Generator):
 
@@ -468,31 +458,34 @@ class Generator(generator.Generator):
     return exports
 
   def DoGenerateFiles(self):
-    fileutil.EnsureDirectoryExists(self.output_dir)
+    """Renders the java files of the module.
 
+    Yields:
+      (filename, contents) for each java file, contents being utf-8 encoded.
+    """
     # Keep this above the others as .GetStructs() changes the state of the
     # module, annotating structs with required information.
     for struct in self.GetStructs():
-      self.Write(self.GenerateStructSource(struct),
-                 '%s.java' % GetNameForElement(struct))
+      yield ('%s.java' % GetNameForElement(struct),
+             self.GenerateStructSource(struct))
 
     for union in self.module.unions:
-      self.Write(self.GenerateUnionSource(union),
-                 '%s.java' % GetNameForElement(union))
+      yield ('%s.java' % GetNameForElement(union),
+             self.GenerateUnionSource(union))
 
     for enum in self.module.enums:
-      self.Write(self.GenerateEnumSource(enum),
-                 '%s.java' % GetNameForElement(enum))
+      yield ('%s.java' % GetNameForElement(enum),
+             self.GenerateEnumSource(enum))
 
     for interface in self.GetInterfaces():
-      self.Write(self.GenerateInterfaceSource(interface),
-                 '%s.java' % GetNameForElement(interface))
-      self.Write(self.GenerateInterfaceInternalSource(interface),
-                 '%s_Internal.java' % GetNameForElement(interface))
+      yield ('%s.java' % GetNameForElement(interface),
+             self.GenerateInterfaceSource(interface))
+      yield ('%s_Internal.java' % GetNameForElement(interface),
+             self.GenerateInterfaceInternalSource(interface))
 
     if self.module.constants:
-      self.Write(self.GenerateConstantsSource(self.module),
-                 '%s.java' % GetConstantsMainEntityName(self.module))
+      yield ('%s.java' % GetConstantsMainEntityName(self.module),
+             self.GenerateConstantsSource(self.module))
 
   def GenerateFiles(self, unparsed_args):
     parser = argparse.ArgumentParser()
@@ -502,19 +495,23 @@ class Generator(generator.Generator):
     args = parser.parse_args(unparsed_args)
     package_path = GetPackage(self.module).replace('.', '/')
 
-    # Generate the java files in a temporary directory and place a single
-    # srcjar in the output directory.
+    # Render each java file once and stream it into a single srcjar in the
+    # output directory.
     basename = self.MatchMojomFilePath("%s.srcjar" % self.module.name)
     zip_filename = os.path.join(self.output_dir, basename)
-    with TempDir() as temp_java_root:
-      self.output_dir = os.path.join(temp_java_root, package_path)
-      self.DoGenerateFiles();
-      ZipContentInto(temp_java_root, zip_filename)
-
+    fileutil.EnsureDirectoryExists(os.path.dirname(zip_filename))
+    java_output_dir = None
     if args.java_output_directory:
-      # If requested, generate the java files directly into indicated directory.
-      self.output_dir = os.path.join(args.java_output_directory, package_path)
-      self.DoGenerateFiles();
+      # If requested, also write the java files directly into the indicated
+      # directory.
+      java_output_dir = os.path.join(args.java_output_directory, package_path)
+      fileutil.EnsureDirectoryExists(java_output_dir)
+    with zipfile.ZipFile(zip_filename, 'w') as zip_file:
+      for filename, contents in self.DoGenerateFiles():
+        contents = contents.encode('utf-8')
+        WriteZipEntry(zip_file, os.path.join(package_path, filename), contents)
+        if java_output_dir:
+          generator.WriteFile(contents, os.path.join(java_output_dir, filename))
 
   def GetJinjaParameters(self):
     return {
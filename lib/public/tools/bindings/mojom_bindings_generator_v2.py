@@ -61,6 +61,9 @@ def RunGenerators(serialized_file_graph, args, remaining_args):
   As a side-effect, this function will create the generated bindings
   corresponding to the serialized_file_graph passed in.
 
+  The code generators are run in the current process: the serialized graph is
+  deserialized in place instead of being piped to a second Python interpreter.
+
   Args:
     serialized_file_graph: {str} A serialized mojom_files.MojomFileGraph.
     args: {Namespace} The parsed arguments passed to the script.
@@ -69,28 +72,28 @@ def RunGenerators(serialized_file_graph, args, remaining_args):
   Returns:
     The exit code of the generators.
   """
-  cmd = [os.path.join(os.path.dirname(__file__), "run_code_generators.py")]
+  # Only imported when the generators are run, as the import changes sys.path.
+  sys.path.insert(0, BINDINGS_DIR)
+  import run_code_generators
 
   cmd_args = {
-      "--file-graph": "-",
       "--output-dir": args.output_dir,
       "--generators": args.generators_string,
       "--src-root-path": args.src_root_path,
       }
 
+  generator_args = []
   for name, value in cmd_args.iteritems():
-    cmd.extend([name, value])
+    generator_args.extend([name, value])
   if args.no_gen_imports:
-    cmd.append("--no-gen-imports")
+    generator_args.append("--no-gen-imports")
 
   # Some language-specific args may be found in remaining_args. See
   # run_code_generators.py and look for GENERATOR_PREFIX for more information.
-  cmd.extend(remaining_args)
-  cmd.extend(args.filename)
+  generator_args.extend(remaining_args)
+  generator_args.extend(args.filename)
 
-  process = subprocess.Popen(cmd, stdin=subprocess.PIPE)
-  process.communicate(serialized_file_graph)
-  return process.wait()
+  return run_code_generators.main(generator_args, serialized_file_graph)
 
 
 def main(argv):
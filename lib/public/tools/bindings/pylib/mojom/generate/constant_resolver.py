@@ -4,29 +4,81 @@
 
 """Resolves the values used for constants and enums."""
 
-from itertools import ifilter
 import mojom.generate.module as mojom
 
 def ResolveConstants(module, expression_to_text):
+  """Sets the resolved_value of the constants, enum fields and named values
+  (struct field defaults and constant values) of a module.
+
+  The references between values are resolved once per module (see
+  _ResolveModule), and the resolution is stored on the module. Each call only renders the resolved expressions with
+  |expression_to_text|, so that generators for several languages can share the
+  resolution.
+
+  Args:
+    module: {module.Module} whose values are to be resolved.
+    expression_to_text: {callable} Renders an expression which does not refer
+        to another value (e.g. a literal or a mojom.BuiltinValue) in the target
+        language.
+
+  Returns:
+    {module.Module} The module passed as argument.
+  """
+  resolved_values = getattr(module, '_resolved_constants', None)
+  if resolved_values is None:
+    resolved_values = module._resolved_constants = _ResolveModule(module)
+
+  for element, value, is_expression in resolved_values:
+    if is_expression:
+      value = expression_to_text(value)
+    element.resolved_value = value
+
+  return module
+
+def _ResolveModule(module):
+  """Resolves the values of a module in a single topological pass.
+
+  Returns:
+    {list<tuple>} (element, value, is_expression) tuples, in resolution order.
+    If |is_expression| is True, |value| is the expression to render as the
+    resolved_value of |element|. Otherwise, it is the resolved value itself
+    (the integer value of an enum field).
+  """
+  resolved_values = []
   in_progress = set()
-  computed = set()
+  # Maps the constants and enum fields which have been resolved to their
+  # (value, is_expression) pair.
+  computed = {}
+  # Maps enums to a dict of their fields indexed by name.
+  enum_fields = {}
+
+  def SetResolvedValue(element, resolved_value):
+    resolved_values.append((element,) + resolved_value)
+
+  def GetEnumField(enum, name):
+    fields = enum_fields.get(enum)
+    if fields is None:
+      fields = enum_fields[enum] = {}
+      for field in enum.fields:
+        fields.setdefault(field.name, field)
+    return fields.get(name)
 
   def GetResolvedValue(named_value):
     assert isinstance(named_value, (mojom.EnumValue, mojom.ConstantValue))
     if isinstance(named_value, mojom.EnumValue):
-      field = next(ifilter(lambda field: field.name == named_value.name,
-                           named_value.enum.fields), None)
+      field = GetEnumField(named_value.enum, named_value.name)
       if not field:
         raise RuntimeError(
             'Unable to get computed value for field %s of enum %s' %
             (named_value.name, named_value.enum.name))
       if field not in computed:
         ResolveEnum(named_value.enum)
-      return field.resolved_value
+      return computed[field]
     else:
       ResolveConstant(named_value.constant)
-      named_value.resolved_value = named_value.constant.resolved_value
-      return named_value.resolved_value
+      resolved_value = computed[named_value.constant]
+      SetResolvedValue(named_value, resolved_value)
+      return resolved_value
 
   def ResolveConstant(constant):
     if constant in computed:
@@ -36,16 +88,15 @@ def ResolveConstants(module, expression_to_text):
     in_progress.add(constant)
     if isinstance(constant.value, (mojom.EnumValue, mojom.ConstantValue)):
       resolved_value = GetResolvedValue(constant.value)
-    elif isinstance(constant.value, mojom.BuiltinValue):
-      resolved_value = expression_to_text(constant.value)
-    elif constant.kind in [mojom.FLOAT, mojom.DOUBLE]:
+    elif constant.kind in [mojom.FLOAT, mojom.DOUBLE] and not isinstance(
+        constant.value, mojom.BuiltinValue):
       # Force float constants to have a decimal point.
-      resolved_value = expression_to_text(repr(float(constant.value)))
+      resolved_value = (repr(float(constant.value)), True)
     else:
-      resolved_value = expression_to_text(constant.value)
-    constant.resolved_value = resolved_value
+      resolved_value = (constant.value, True)
+    SetResolvedValue(constant, resolved_value)
     in_progress.remove(constant)
-    computed.add(constant)
+    computed[constant] = resolved_value
 
   def ResolveEnum(enum):
     def ResolveEnumField(enum, field, default_value):
@@ -58,19 +109,19 @@ def ResolveConstants(module, expression_to_text):
         if isinstance(field.value, mojom.EnumValue):
           resolved_value = GetResolvedValue(field.value)
         elif isinstance(field.value, str):
-          resolved_value = int(field.value, 0)
+          resolved_value = (int(field.value, 0), False)
         else:
           raise RuntimeError('Unexpected value: %s' % field.value)
       else:
-        resolved_value = default_value
-      field.resolved_value = resolved_value
+        resolved_value = (default_value, False)
+      SetResolvedValue(field, resolved_value)
       in_progress.remove(field)
-      computed.add(field)
+      computed[field] = resolved_value
 
     current_value = 0
     for field in enum.fields:
       ResolveEnumField(enum, field, current_value)
-      current_value = field.resolved_value + 1
+      current_value = computed[field][0] + 1
 
   for constant in module.constants:
     ResolveConstant(constant)
@@ -85,7 +136,7 @@ def ResolveConstants(module, expression_to_text):
       ResolveEnum(enum)
     for field in struct.fields:
       if isinstance(field.default, (mojom.ConstantValue, mojom.EnumValue)):
-        field.default.resolved_value = GetResolvedValue(field.default)
+        SetResolvedValue(field.default, GetResolvedValue(field.default))
 
   for interface in module.interfaces:
     for constant in interface.constants:
@@ -93,4 +144,4 @@ def ResolveConstants(module, expression_to_text):
     for enum in interface.enums:
       ResolveEnum(enum)
 
-  return module
+  return resolved_values
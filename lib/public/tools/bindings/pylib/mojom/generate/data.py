@@ -57,6 +57,158 @@ builtin_values = frozenset([
 def IsBuiltinValue(value):
   return value in builtin_values
 
+class _ScopeNode(object):
+  """A node of the namespace tree of a SymbolTable. |key| is None unless a
+  symbol is defined with the node's path as name."""
+
+  def __init__(self):
+    self.children = {}
+    self.key = None
+    self.symbol = None
+
+
+class SymbolTable(dict):
+  """A dict of kinds or values keyed by spec, which also indexes its entries in
+  a namespace tree keyed by the dot-separated components of their names.
+
+  This allows resolving a name relative to a scope by walking from the scope
+  towards the root of the tree, instead of probing the dict with a candidate
+  spec built for each enclosing scope. Only keys starting with |prefix| are
+  indexed ('x:' for user defined kinds). Entries must be added by item
+  assignment so that they are indexed.
+
+  The symbols of imported modules are added lazily (see AddImport()): they are
+  only copied into the table when they are first looked up, so iterating over
+  the table only covers the imported symbols which have been used so far."""
+
+  def __init__(self, prefix=''):
+    dict.__init__(self)
+    self._prefix = prefix
+    self._root = _ScopeNode()
+    self._imports = []
+
+  def __setitem__(self, key, symbol):
+    dict.__setitem__(self, key, symbol)
+    if not key.startswith(self._prefix):
+      return
+    node = self._root
+    for component in key[len(self._prefix):].split('.'):
+      child = node.children.get(component)
+      if child is None:
+        child = node.children[component] = _ScopeNode()
+      node = child
+    node.key = key
+    node.symbol = symbol
+
+  def __missing__(self, key):
+    symbol = self._Import(key)
+    if symbol is None:
+      raise KeyError(key)
+    return symbol
+
+  def __contains__(self, key):
+    return dict.__contains__(self, key) or self._Import(key) is not None
+
+  def get(self, key, default=None):
+    symbol = dict.get(self, key)
+    if symbol is None and self._imports:
+      symbol = self._Import(key)
+    return default if symbol is None else symbol
+
+  def AddImport(self, symbols, import_symbol):
+    """Makes the symbols of an imported module available from this table.
+
+    Args:
+      symbols: {dict} The kinds or values of the imported module, keyed by
+          spec.
+      import_symbol: {callable} Called with a symbol of |symbols| the first
+          time it is looked up. Returns the copy of the symbol to add to this
+          table, or None if the symbol cannot be imported.
+
+    The symbols of this table take precedence over imported ones, and the
+    symbols of the last import take precedence over those of previous ones.
+    """
+    self._imports.append((AsSymbolTable(symbols, self._prefix), import_symbol))
+
+  def _Import(self, key):
+    """Imports the symbol with the given key, if an import provides it."""
+    for symbols, import_symbol in reversed(self._imports):
+      # Only the symbols defined by the imported module may be imported, so its
+      # own imports must not be resolved.
+      symbol = dict.get(symbols, key)
+      if symbol is not None:
+        symbol = import_symbol(symbol)
+        if symbol is not None:
+          self[key] = symbol
+          return symbol
+    return None
+
+  def _ScopeNodes(self, scope, root_for_empty_scope):
+    """Returns the nodes of the tree corresponding to each prefix of |scope|,
+    or None for those which do not exist."""
+    node = self._root
+    scope_nodes = [node]
+    for element in scope:
+      for component in element.split('.'):
+        if node is not None:
+          node = node.children.get(component)
+      scope_nodes.append(node)
+    if root_for_empty_scope and scope and not scope[0]:
+      scope_nodes[1] = self._root
+    return scope_nodes
+
+  def Lookup(self, name, scope, root_for_empty_scope=False):
+    """Finds the symbol |name| refers to when referenced from |scope|, starting
+    from the narrowest scope. |scope| is a tuple like (namespace, struct).
+
+    If |root_for_empty_scope| is set, a scope whose first element is empty is
+    treated as the root scope rather than as an empty namespace, which is how
+    values are looked up.
+
+    Returns None if no symbol is found."""
+    components = name.split('.')
+    scope_nodes = self._ScopeNodes(scope, root_for_empty_scope)
+    import_scope_nodes = [symbols._ScopeNodes(scope, root_for_empty_scope)
+                          for symbols, _ in self._imports]
+    for i in xrange(len(scope_nodes) - 1, -1, -1):
+      node = _FindNode(scope_nodes[i], components)
+      if node is not None:
+        if node.symbol:
+          return node.symbol
+        continue
+      for nodes in import_scope_nodes:
+        node = _FindNode(nodes[i], components)
+        if node is not None:
+          symbol = self._Import(node.key)
+          if symbol:
+            return symbol
+          break
+    return None
+
+
+def _FindNode(node, components):
+  """Returns the descendant of |node| defining a symbol at the relative path
+  |components|, or None."""
+  for component in components:
+    if node is None:
+      return None
+    node = node.children.get(component)
+  if node is None or node.key is None:
+    return None
+  return node
+
+
+def AsSymbolTable(symbols, prefix=''):
+  """Returns |symbols| if it is a SymbolTable, or a SymbolTable with the same
+  entries otherwise."""
+  if isinstance(symbols, SymbolTable):
+    return symbols
+  table = SymbolTable(prefix)
+  for key, symbol in symbols.iteritems():
+    table[key] = symbol
+  return table
+
+
 def LookupKind(kinds, spec, scope):
   """Tries to find which Kind a spec refers to, given the scope in which its
   referenced. Starts checking from the narrowest scope to most general. For
@@ -69,14 +221,19 @@ def LookupKind(kinds, spec, scope):
   to the location where the type is referenced."""
   if spec.startswith('x:'):
     name = spec[2:]
-    for i in xrange(len(scope), -1, -1):
-      test_spec = 'x:'
-      if i > 0:
-        test_spec += '.'.join(scope[:i]) + '.'
-      test_spec += name
-      kind = kinds.get(test_spec)
+    if isinstance(kinds, SymbolTable):
+      kind = kinds.Lookup(name, scope)
       if kind:
         return kind
+    else:
+      for i in xrange(len(scope), -1, -1):
+        test_spec = 'x:'
+        if i > 0:
+          test_spec += '.'.join(scope[:i]) + '.'
+        test_spec += name
+        kind = kinds.get(test_spec)
+        if kind:
+          return kind
 
   return kinds.get(spec)
 
@@ -88,14 +245,19 @@ def LookupValue(values, name, scope, kind):
   # enum name.
   if isinstance(kind, mojom.Enum) and '.' not in name:
     name = '%s.%s' % (kind.spec.split(':', 1)[1], name)
-  for i in reversed(xrange(len(scope) + 1)):
-    test_spec = '.'.join(scope[:i])
-    if test_spec:
-      test_spec += '.'
-    test_spec += name
-    value = values.get(test_spec)
+  if isinstance(values, SymbolTable):
+    value = values.Lookup(name, scope, root_for_empty_scope=True)
     if value:
       return value
+  else:
+    for i in reversed(xrange(len(scope) + 1)):
+      test_spec = '.'.join(scope[:i])
+      if test_spec:
+        test_spec += '.'
+      test_spec += name
+      value = values.get(test_spec)
+      if value:
+        return value
 
   return values.get(name)
 
@@ -168,6 +330,94 @@ def KindFromImport(original_kind, imported_from):
   kind.imported_from = imported_from
   return kind
 
+class ImportGraph(object):
+  """The import graph of a set of mojom files, which memoizes the transitive
+  imports of each file.
+
+  Files are numbered as they are encountered and transitive imports are stored
+  as bitsets of those numbers. The transitive imports of a file are computed
+  once, as the union of those of its direct imports, and are then shared by all
+  the files importing it."""
+
+  def __init__(self, get_imports):
+    """Initializes an ImportGraph.
+
+    Args:
+      get_imports: {callable} Returns the names of the files directly imported
+          by the file with the given name.
+    """
+    self._get_imports = get_imports
+    self._indices = {}
+    self._names = []
+    self._closures = {}
+
+  def _Index(self, name):
+    index = self._indices.get(name)
+    if index is None:
+      index = self._indices[name] = len(self._names)
+      self._names.append(name)
+    return index
+
+  def _Closure(self, name):
+    closure = self._closures.get(name)
+    if closure is None:
+      self._Visit(name, {}, [])
+      closure = self._closures[name]
+    return closure
+
+  def _Visit(self, name, order, stack):
+    """Walks the imports of the file with the given name, as in Tarjan's
+    algorithm, and stores the transitive imports of each strongly connected
+    component of files once it is complete. The files of an import cycle share
+    the same transitive imports, which are only known once the whole cycle has
+    been walked.
+
+    Args:
+      order: {dict} The visit order of the files being walked.
+      stack: {list} The files whose component is not complete, as (name,
+          imports) tuples.
+
+    Returns:
+      {int} The lowest visit order of the files reachable from this one which
+      are still on the stack.
+    """
+    lowlink = order[name] = len(order)
+    imports = self._get_imports(name)
+    stack.append((name, imports))
+    for import_name in imports:
+      self._Index(import_name)
+      if import_name in self._closures:
+        continue
+      if import_name in order:
+        # The import is on the stack: it is part of an import cycle.
+        lowlink = min(lowlink, order[import_name])
+      else:
+        lowlink = min(lowlink, self._Visit(import_name, order, stack))
+    if lowlink == order[name]:
+      component = []
+      while not component or component[-1][0] != name:
+        component.append(stack.pop())
+      closure = 0
+      for (_, component_imports) in component:
+        for import_name in component_imports:
+          closure |= ((1 << self._Index(import_name)) |
+                      self._closures.get(import_name, 0))
+      for (component_name, _) in component:
+        self._closures[component_name] = closure
+    return lowlink
+
+  def GetTransitiveImports(self, name):
+    """Gets the names of all the files imported, directly or not, by the file
+    with the given name, in the order in which they were first encountered."""
+    closure = self._Closure(name)
+    names = []
+    while closure:
+      lowest_bit = closure & -closure
+      names.append(self._names[lowest_bit.bit_length() - 1])
+      closure ^= lowest_bit
+    return names
+
+
 def ComputeTransitiveImports(module):
   """Compute a module's transitive imports."""
   to_process = {imp['module'].path: imp for imp in module.imports}
@@ -202,21 +452,27 @@ def ImportFromData(module, data):
   new_imported_module.path = import_module.path
   import_item['module'] = new_imported_module
 
-  # Copy the struct kinds from our imports into the current module.
+  # Make the struct kinds from our imports available in the current module.
+  # They are copied when first looked up.
   importable_kinds = (mojom.Struct, mojom.Union, mojom.Enum, mojom.Interface)
-  for kind in import_module.kinds.itervalues():
+  def ImportKind(kind):
     if (isinstance(kind, importable_kinds) and
         kind.imported_from is None):
-      kind = KindFromImport(kind, import_item)
-      module.kinds[kind.spec] = kind
+      return KindFromImport(kind, import_item)
+    return None
+  module.kinds = AsSymbolTable(module.kinds, 'x:')
+  module.kinds.AddImport(import_module.kinds, ImportKind)
   # Ditto for values.
-  for value in import_module.values.itervalues():
+  def ImportValue(value):
     if value.imported_from is None:
-      # Values don't have shared definitions (since they're not nullable), so no
-      # need to do anything special.
+      # Values don't have shared definitions (since they're not nullable), so
+      # no need to do anything special.
       value = copy.copy(value)
       value.imported_from = import_item
-      module.values[value.GetSpec()] = value
+      return value
+    return None
+  module.values = AsSymbolTable(getattr(module, 'values', {}))
+  module.values.AddImport(import_module.values, ImportValue)
 
   return import_item
 
@@ -459,11 +715,11 @@ def ModuleToData(module):
 
 def ModuleFromData(data):
   module = mojom.Module()
-  module.kinds = {}
+  module.kinds = SymbolTable('x:')
   for kind in mojom.PRIMITIVES:
     module.kinds[kind.spec] = kind
 
-  module.values = {}
+  module.values = SymbolTable()
 
   module.name = data['name']
   module.namespace = data['namespace']
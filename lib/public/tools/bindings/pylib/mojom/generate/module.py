@@ -605,35 +605,111 @@ def IsAnyHandleKind(kind):
           IsInterfaceRequestKind(kind))
 
 
+def _GetKindProperties(kind):
+  """Returns the dict caching the properties computed for |kind|. It is shared
+  between a reference kind and its nullable variation."""
+  if isinstance(kind, ReferenceKind):
+    properties = kind.shared_definition.get('kind_properties')
+    if properties is None:
+      properties = kind.shared_definition['kind_properties'] = {}
+    return properties
+  properties = getattr(kind, 'kind_properties', None)
+  if properties is None:
+    properties = kind.kind_properties = {}
+  return properties
+
+
+def _GetKindProperty(kind, name, compute):
+  """Returns the property |name| of |kind|, calling |compute| with |kind| the
+  first time it is requested."""
+  properties = _GetKindProperties(kind)
+  value = properties.get(name)
+  if value is None:
+    value = properties[name] = compute(kind)
+  return value
+
+
 def IsMoveOnlyKind(kind):
+  return _GetKindProperty(kind, 'is_move_only', _ComputeIsMoveOnlyKind)
+
+
+def _ComputeIsMoveOnlyKind(kind):
   return (not IsStringKind(kind) and IsObjectKind(kind)) or \
       IsAnyHandleKind(kind) or IsInterfaceKind(kind)
 
 
-def IsCloneableKind(kind):
-  def ContainsHandles(kind, visited_kinds):
-    if kind in visited_kinds:
-      # No need to examine the kind again.
-      return False
-    visited_kinds.add(kind)
-    if IsAnyHandleKind(kind) or IsInterfaceKind(kind):
-      return True
-    if IsArrayKind(kind):
-      return ContainsHandles(kind.kind, visited_kinds)
-    if IsStructKind(kind) or IsUnionKind(kind):
-      for field in kind.fields:
-        if ContainsHandles(field.kind, visited_kinds):
-          return True
-    if IsMapKind(kind):
-      # No need to examine the key kind, only primitive kinds and non-nullable
-      # string are allowed to be key kinds.
-      return ContainsHandles(kind.value_kind, visited_kinds)
-    return False
+def _GetReferencedKinds(kind):
+  """Returns the kinds whose values are contained in values of |kind|."""
+  if IsArrayKind(kind):
+    return (kind.kind,)
+  if IsStructKind(kind) or IsUnionKind(kind):
+    return [field.kind for field in kind.fields]
+  if IsMapKind(kind):
+    # No need to examine the key kind, only primitive kinds and non-nullable
+    # string are allowed to be key kinds.
+    return (kind.value_kind,)
+  return ()
+
+
+def _ComputeContainsHandles(root_kind):
+  """Computes whether values of |root_kind|, and of the kinds it references,
+  contain handles or interfaces, and caches the results.
+
+  Kinds may reference each other (e.g. a struct containing an array of itself),
+  so the kinds are grouped in strongly connected components (using Tarjan's
+  algorithm): all the kinds of a component contain handles if any of them
+  does, or if any of them references a kind outside of the component which
+  does.
+  """
+  indices = {}
+  lowlinks = {}
+  contains_handles = {}
+  stack = []
+  on_stack = set()
+
+  def Visit(kind):
+    indices[kind] = lowlinks[kind] = len(indices)
+    stack.append(kind)
+    on_stack.add(kind)
+    contains = IsAnyHandleKind(kind) or IsInterfaceKind(kind)
+    for referenced_kind in _GetReferencedKinds(kind):
+      cached = _GetKindProperties(referenced_kind).get('contains_handles')
+      if cached is not None:
+        contains = contains or cached
+      elif referenced_kind not in indices:
+        contains = Visit(referenced_kind) or contains
+        lowlinks[kind] = min(lowlinks[kind], lowlinks[referenced_kind])
+      elif referenced_kind in on_stack:
+        # |referenced_kind| is in the same component as |kind|.
+        lowlinks[kind] = min(lowlinks[kind], indices[referenced_kind])
+    contains_handles[kind] = contains
+
+    if lowlinks[kind] == indices[kind]:
+      start = stack.index(kind)
+      component = stack[start:]
+      del stack[start:]
+      on_stack.difference_update(component)
+      contains = any([contains_handles[member] for member in component])
+      for member in component:
+        _GetKindProperties(member)['contains_handles'] = contains
+    return contains
+
+  Visit(root_kind)
+  return _GetKindProperties(root_kind)['contains_handles']
+
 
-  return not ContainsHandles(kind, set())
+def IsCloneableKind(kind):
+  contains_handles = _GetKindProperties(kind).get('contains_handles')
+  if contains_handles is None:
+    contains_handles = _ComputeContainsHandles(kind)
+  return not contains_handles
 
 
 def HasCallbacks(interface):
+  return _GetKindProperty(interface, 'has_callbacks', _ComputeHasCallbacks)
+
+
+def _ComputeHasCallbacks(interface):
   for method in interface.methods:
     if method.response_parameters != None:
       return True
@@ -27,21 +27,28 @@ import os
 
 from generated import mojom_files_mojom
 from generated import mojom_types_mojom
+import data
 import module
 import operator
 
 
 class FileTranslator(object):
   """FileTranslator translates a MojomFile to a module.Module."""
-  def __init__(self, graph, file_name):
+  def __init__(self, graph, file_name, import_graph=None):
     """Initializes a FileTranslator.
 
     Args:
       graph: {mojom_files_mojom.MojomFileGraph} containing the file to be
           translated.
       file_name: {str} key to the file to be translated in graph.files.
+      import_graph: {data.ImportGraph|None} memoizing the transitive imports of
+          the files in graph. It should be shared by the translators of all the
+          files of a graph. If None, a new one is created.
     """
     assert isinstance(graph, mojom_files_mojom.MojomFileGraph)
+    if import_graph is None:
+      import_graph = ImportGraphFromFileGraph(graph)
+    self._import_graph = import_graph
     self._type_cache = {}
     self._value_cache = {}
     self._constant_cache = {}
@@ -124,24 +131,12 @@ class FileTranslator(object):
       and is referenced in the SourceFileInfo.file_name of imported types.
       The value is a dictionary as returned by ImportFromMojom.
     """
-    if not mojom_file.imports:
-      return {}
-    to_be_processed = set(mojom_file.imports)
-    processed = set()
     transitive_imports = {}
-
-    while to_be_processed:
-      import_name = to_be_processed.pop()
-      processed.add(import_name)
-
+    for import_name in self._import_graph.GetTransitiveImports(
+        mojom_file.file_name):
       import_dict = self.ImportFromMojom(import_name)
-
       transitive_imports[import_dict['module'].path] = import_dict
 
-      import_file = self._graph.files[import_name]
-      if import_file.imports:
-        to_be_processed.update(set(import_file.imports) - processed)
-
     return transitive_imports
 
   def ImportFromMojom(self, import_name):
@@ -796,7 +791,7 @@ class FileTranslator(object):
     return module_type
 
 
-def TranslateFileGraph(graph):
+def TranslateFileGraph(graph, file_names=None):
   """Translates a mojom_types_mojom.MojomFileGraph to module.Module(s).
 
   The input is the output of the parser. The output is the input to the
@@ -804,10 +799,62 @@ def TranslateFileGraph(graph):
 
   Args:
     graph: {mojom_types_mojom.MojomFileGraph} to be translated.
+    file_names: {iterable<str>|None} keys into graph.files of the files to be
+      translated. If None, every file in graph.files is translated.
 
   Return:
     {dict<str, module.Module>} mapping the file's name to its module.Module
-    translation for all files in graph.files.
+    translation for all requested files.
+  """
+  return dict(IterTranslateFileGraph(graph, file_names))
+
+
+def IterTranslateFileGraph(graph, file_names=None):
+  """Lazily translates a mojom_types_mojom.MojomFileGraph to module.Module(s).
+
+  Files are only translated as they are requested from the returned iterator.
+  Imported files are never fully translated on behalf of an importing file:
+  only the user-defined types actually referenced by the importing file are
+  translated.
+
+  Args:
+    graph: {mojom_types_mojom.MojomFileGraph} to be translated.
+    file_names: {iterable<str>|None} keys into graph.files of the files to be
+      translated. If None, every file in graph.files is translated.
+
+  Yields:
+    {tuple<str, module.Module>} the file's name and its module.Module
+    translation.
+  """
+  if file_names is None:
+    file_names = graph.files.keys()
+  import_graph = ImportGraphFromFileGraph(graph)
+  for file_name in file_names:
+    yield file_name, FileTranslator(graph, file_name, import_graph).Translate()
+
+
+def ImportGraphFromFileGraph(graph):
+  """Builds the import graph of the files of a MojomFileGraph.
+
+  Args:
+    graph: {mojom_files_mojom.MojomFileGraph} whose imports are described.
+
+  Returns:
+    {data.ImportGraph} whose nodes are keys into graph.files.
+  """
+  return data.ImportGraph(
+      lambda file_name: graph.files[file_name].imports or [])
+
+
+def SpecifiedFileNames(graph):
+  """Finds the files of a graph which were explicitly requested during parsing.
+
+  Args:
+    graph: {mojom_types_mojom.MojomFileGraph} to be inspected.
+
+  Returns:
+    {list<str>} keys into graph.files of the files whose specified_file_name
+    is set. Other files were only parsed because they were imported.
   """
-  return {file_name: FileTranslator(graph, file_name).Translate()
-      for file_name in graph.files}
+  return [file_name for file_name, mojom_file in graph.files.iteritems()
+      if mojom_file.specified_file_name]
@@ -39,6 +39,68 @@ class TranslateFileGraph(unittest.TestCase):
     modules = mojom_translator.TranslateFileGraph(g)
     self.assertEquals(len(modules), len(g.files))
 
+  def test_file_names(self):
+    g = mojom_files_mojom.MojomFileGraph()
+
+    g.files = {
+        'a.mojom': mojom_files_mojom.MojomFile(
+            file_name='a.mojom',
+            specified_file_name='a.mojom',
+            imports=['b.mojom']),
+        'b.mojom': mojom_files_mojom.MojomFile(
+            file_name='b.mojom',
+            specified_file_name='',
+            imports=[]),
+    }
+
+    file_names = mojom_translator.SpecifiedFileNames(g)
+    self.assertEquals(['a.mojom'], file_names)
+
+    modules = mojom_translator.TranslateFileGraph(g, file_names)
+    self.assertEquals(['a.mojom'], modules.keys())
+    self.assertEquals('a.mojom', modules['a.mojom'].specified_name)
+    self.assertEquals('b.mojom', modules['a.mojom'].imports[0]['module'].path)
+
+  def test_lazy(self):
+    g = mojom_files_mojom.MojomFileGraph()
+
+    g.files = {
+        'a.mojom': mojom_files_mojom.MojomFile(
+            file_name='a.mojom',
+            specified_file_name='',
+            imports=[]),
+    }
+
+    modules = mojom_translator.IterTranslateFileGraph(g)
+    # Files are only translated once they are requested.
+    g.files['a.mojom'].module_namespace = 'lazy'
+    (file_name, mod), = list(modules)
+    self.assertEquals('a.mojom', file_name)
+    self.assertEquals('lazy', mod.namespace)
+
+  def test_transitive_imports(self):
+    g = mojom_files_mojom.MojomFileGraph()
+
+    def File(file_name, imports):
+      return mojom_files_mojom.MojomFile(
+          file_name=file_name, specified_file_name='', imports=imports)
+    g.files = {
+        'a.mojom': File('a.mojom', ['b.mojom', 'c.mojom']),
+        'b.mojom': File('b.mojom', ['d.mojom']),
+        'c.mojom': File('c.mojom', ['d.mojom']),
+        'd.mojom': File('d.mojom', []),
+    }
+
+    modules = mojom_translator.TranslateFileGraph(g)
+    self.assertEquals(['b.mojom', 'c.mojom', 'd.mojom'], sorted(
+        imp['module'].path for imp in modules['a.mojom'].transitive_imports))
+    self.assertEquals(['d.mojom'], [
+        imp['module'].path for imp in modules['c.mojom'].transitive_imports])
+    self.assertEquals([], modules['d.mojom'].transitive_imports)
+    # Import dicts are not shared between the translated modules.
+    self.assertIsNot(modules['b.mojom'].imports[0],
+                     modules['c.mojom'].imports[0])
+
 
 @unittest.skipUnless(bindings_imported, 'Could not import python bindings.')
 class TestTranslateFile(unittest.TestCase):
@@ -4,6 +4,7 @@
 
 import imp
 import os.path
+import re
 import sys
 
 def _GetDirAbove(dirname):
@@ -20,6 +21,7 @@ try:
   imp.find_module("ply")
 except ImportError:
   sys.path.append(os.path.join(_GetDirAbove("public"), "public/third_party"))
+from ply.lex import LexToken
 from ply.lex import TOKEN
 
 from ..error import Error
@@ -251,3 +253,121 @@ class Lexer(object):
   def t_error(self, t):
     msg = "Illegal character %s" % repr(t.value[0])
     self._error(msg, t)
+
+
+class FastLexer(Lexer):
+  """A lexer producing the same tokens as |Lexer| without using PLY's lex.
+
+  The token rules of |Lexer| are combined, in the order in which PLY tries
+  them, into a single regular expression which is compiled once per process.
+  The input is then tokenized with |finditer| and keywords are looked up in
+  |keyword_map|. The token stream, line numbers and |LexError|s are identical
+  to those of a PLY lexer built from |Lexer|.
+
+  Instances implement the interface |yacc.parse| expects from a lexer, so they
+  can be passed to it directly instead of being built with |lex.lex|.
+  """
+
+  _master_regex = None
+  _function_rules = None
+  _skipped = ' \t\r\n'
+
+  def __init__(self, filename):
+    Lexer.__init__(self, filename)
+    if FastLexer._master_regex is None:
+      FastLexer._BuildMasterRegex()
+    self.lineno = 1
+    self.lexpos = 0
+    self._tokens = iter(())
+
+  @staticmethod
+  def _BuildMasterRegex():
+    """Builds the regular expression matching any token.
+
+    PLY tries the rules defined by functions in the order in which they are
+    defined, then the rules defined by strings by decreasing regex length.
+    Characters in |t_ignore| are skipped before trying any rule. Newlines,
+    which |t_NEWLINE| only counts, are skipped the same way.
+    """
+    function_rules = []
+    string_rules = []
+    for name in dir(Lexer):
+      if name in ('t_ignore', 't_error', 't_NEWLINE'):
+        continue
+      if not name.startswith('t_'):
+        continue
+      rule = getattr(Lexer, name)
+      if callable(rule):
+        function_rules.append(
+            (rule.im_func.func_code.co_firstlineno, name, rule.__doc__))
+      else:
+        string_rules.append((name, rule))
+    function_rules.sort()
+    string_rules.sort(key=lambda rule: len(rule[1]), reverse=True)
+
+    regexes = ['(?P<%s>%s)' % (name, regex)
+               for _, name, regex in function_rules]
+    regexes.extend('(?P<%s>%s)' % rule for rule in string_rules)
+    # PLY compiles its master regex in verbose mode too.
+    FastLexer._master_regex = re.compile(
+        '[%s]*(?:%s)' % (re.escape(FastLexer._skipped), '|'.join(regexes)),
+        re.VERBOSE)
+    FastLexer._function_rules = frozenset(
+        name for _, name, _ in function_rules)
+
+  def input(self, data):
+    self.lineno = 1
+    self.lexpos = 0
+    self._tokens = self._Tokenize(data)
+
+  def token(self):
+    return next(self._tokens, None)
+
+  def _MakeToken(self, token_type, value, lexpos):
+    token = LexToken()
+    token.type = token_type
+    token.value = value
+    token.lineno = self.lineno
+    token.lexpos = lexpos
+    return token
+
+  def _Tokenize(self, data):
+    function_rules = self._function_rules
+    keyword_map = self.keyword_map
+    lexpos = 0
+    for match in self._master_regex.finditer(data):
+      if match.start() != lexpos:
+        break
+      name = match.lastgroup
+      start = match.start(name)
+      self.lineno += data.count('\n', lexpos, start)
+      lexpos = match.end()
+      self.lexpos = lexpos
+      value = match.group(name)
+      if name == 't_COMMENT':
+        self.lineno += value.count('\n')
+        continue
+      # Tokens are built inline rather than through |_MakeToken| since this is
+      # the hot path.
+      token = LexToken()
+      token.value = value
+      token.lineno = self.lineno
+      token.lexpos = start
+      if name == 't_NAME':
+        token.type = keyword_map.get(value, 'NAME')
+      elif name not in function_rules:
+        token.type = name[2:]
+      else:
+        # The remaining rules either return the token unchanged or raise.
+        token.type = name[2:]
+        token = getattr(self, name)(token)
+        if not token:
+          continue
+      yield token
+
+    rest = data[lexpos:].lstrip(self._skipped)
+    if rest:
+      start = len(data) - len(rest)
+      self.lineno += data.count('\n', lexpos, start)
+      self.lexpos = start
+      self.t_error(self._MakeToken('error', rest, start))
@@ -27,6 +27,7 @@ from ply import yacc
 
 from ..error import Error
 from . import ast
+from .lexer import FastLexer
 from .lexer import Lexer
 
 
@@ -405,12 +406,21 @@ class Parser(object):
     return self.source.split('\n')[lineno - 1]
 
 
-def Parse(source, filename):
-  lexer = Lexer(filename)
+def Parse(source, filename, use_ply_lexer=False):
+  """Parses the given source.
+
+  By default the source is tokenized by a |FastLexer|. If |use_ply_lexer| is
+  True, a lexer built by PLY's lex from |Lexer| is used instead. Both produce
+  the same tokens.
+  """
+  if use_ply_lexer:
+    lexer = Lexer(filename)
+    ply_lexer = lex.lex(object=lexer)
+  else:
+    lexer = ply_lexer = FastLexer(filename)
   parser = Parser(lexer, source, filename)
 
-  lex.lex(object=lexer)
   yacc.yacc(module=parser, debug=0, write_tables=0)
 
-  tree = yacc.parse(source)
+  tree = yacc.parse(source, lexer=ply_lexer)
   return tree
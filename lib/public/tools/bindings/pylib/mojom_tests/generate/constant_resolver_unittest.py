@@ -0,0 +1,93 @@
+# Copyright 2015 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import gc
+import imp
+import os.path
+import sys
+import unittest
+import weakref
+
+def _GetDirAbove(dirname):
+  """Returns the directory "above" this file containing |dirname| (which must
+  also be "above" this file)."""
+  path = os.path.abspath(__file__)
+  while True:
+    path, tail = os.path.split(path)
+    assert tail
+    if tail == dirname:
+      return path
+
+try:
+  imp.find_module("mojom")
+except ImportError:
+  sys.path.append(os.path.join(_GetDirAbove("pylib"), "pylib"))
+from mojom.generate import constant_resolver
+from mojom.generate import module as mojom
+
+
+class ConstantResolverTest(unittest.TestCase):
+
+  def _BuildModule(self):
+    module = mojom.Module('test_module', 'test_namespace')
+    enum = mojom.Enum('Color', module=module)
+    enum.fields = [mojom.EnumField('RED'),
+                   mojom.EnumField('GREEN', '0x10'),
+                   mojom.EnumField('BLUE')]
+    enum.fields[2].value = mojom.EnumValue(module, enum, enum.fields[0])
+    module.enums = [enum]
+    float_constant = mojom.Constant('kFloat', mojom.FLOAT, '1')
+    alias = mojom.Constant('kAlias', mojom.FLOAT,
+                           mojom.ConstantValue(module, None, float_constant))
+    color = mojom.Constant('kColor', mojom.INT32,
+                           mojom.EnumValue(module, enum, enum.fields[1]))
+    module.constants = [alias, float_constant, color]
+    return module
+
+  def testResolveConstants(self):
+    module = self._BuildModule()
+    constant_resolver.ResolveConstants(module, lambda token: '<%s>' % token)
+
+    red, green, blue = module.enums[0].fields
+    self.assertEquals(0, red.resolved_value)
+    self.assertEquals(16, green.resolved_value)
+    self.assertEquals(0, blue.resolved_value)
+    alias, float_constant, color = module.constants
+    self.assertEquals('<1.0>', float_constant.resolved_value)
+    self.assertEquals('<1.0>', alias.resolved_value)
+    self.assertEquals('<1.0>', alias.value.resolved_value)
+    self.assertEquals(16, color.resolved_value)
+
+  def testResolveConstantsRendersOnEachCall(self):
+    module = self._BuildModule()
+    constant_resolver.ResolveConstants(module, lambda token: '<%s>' % token)
+    # Changes to the module after the first resolution are not taken into
+    # account: values are only resolved once per module.
+    module.enums[0].fields[1].value = '0x20'
+    constant_resolver.ResolveConstants(module, lambda token: '[%s]' % token)
+
+    self.assertEquals('[1.0]', module.constants[0].resolved_value)
+    self.assertEquals(16, module.enums[0].fields[1].resolved_value)
+
+  def testResolutionDoesNotOutliveTheModule(self):
+    module = self._BuildModule()
+    constant_resolver.ResolveConstants(module, str)
+    module_ref = weakref.ref(module)
+    del module
+    gc.collect()
+    self.assertIsNone(module_ref())
+
+  def testCircularDependency(self):
+    module = mojom.Module('test_module', 'test_namespace')
+    first = mojom.Constant('kFirst', mojom.INT32)
+    second = mojom.Constant('kSecond', mojom.INT32,
+                            mojom.ConstantValue(module, None, first))
+    first.value = mojom.ConstantValue(module, None, second)
+    module.constants = [first, second]
+    with self.assertRaises(RuntimeError):
+      constant_resolver.ResolveConstants(module, str)
+
+
+if __name__ == '__main__':
+  unittest.main()
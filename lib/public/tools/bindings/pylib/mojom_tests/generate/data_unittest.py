@@ -139,3 +139,144 @@ class DataTest(unittest.TestCase):
       data.MethodFromData(module, method_dict, interface)
     self.assertEquals(e.exception.__str__(),
                       'Interface request requires \'i32\' to be an interface.')
+
+  def testSymbolTableLookupKind(self):
+    """Tests that kinds are resolved through the namespace tree of a
+    SymbolTable the same way they are resolved in a plain dict."""
+    specs = ['x:a.b.Foo', 'x:a.b.Foo.Bar', 'x:a.Bar', 'x:Baz', 'x:a.b.c.Baz']
+    table = data.SymbolTable('x:')
+    plain = {}
+    for spec in specs:
+      table[spec] = plain[spec] = mojom.Kind(spec)
+    table['i32'] = plain['i32'] = mojom.INT32
+
+    scopes = [(), ('',), ('a',), ('a.b',), ('a.b', 'Foo'), ('a.b.c', 'Foo')]
+    names = ['x:Foo', 'x:Bar', 'x:Foo.Bar', 'x:b.Foo', 'x:Baz', 'x:Qux', 'i32']
+    for scope in scopes:
+      for name in names:
+        self.assertIs(data.LookupKind(plain, name, scope),
+                      data.LookupKind(table, name, scope))
+    self.assertEquals('x:a.b.Foo.Bar',
+                      data.LookupKind(table, 'x:Bar', ('a.b', 'Foo')).spec)
+    self.assertEquals('x:a.b.c.Baz',
+                      data.LookupKind(table, 'x:Baz', ('a.b.c', 'Foo')).spec)
+    self.assertEquals('x:Baz', data.LookupKind(table, 'x:Baz', ('a.b',)).spec)
+
+  def testSymbolTableLookupValue(self):
+    """Tests that values are resolved through the namespace tree of a
+    SymbolTable the same way they are resolved in a plain dict."""
+    specs = ['ns.kFoo', 'ns.S.kFoo', 'kBar', '.kBaz', 'ns.E.A']
+    table = data.SymbolTable()
+    plain = {}
+    for spec in specs:
+      table[spec] = plain[spec] = object()
+
+    enum = mojom.Enum('E', mojom.Module('test', 'ns'))
+    scopes = [(), ('',), ('', 'S'), ('ns',), ('ns', 'S'), ('ns', 'E')]
+    names = ['kFoo', 'S.kFoo', 'kBar', 'kBaz', 'A', 'E.A', 'kQux']
+    for scope in scopes:
+      for name in names:
+        for kind in (None, enum):
+          self.assertIs(data.LookupValue(plain, name, scope, kind),
+                        data.LookupValue(table, name, scope, kind))
+    self.assertIs(table['ns.S.kFoo'],
+                  data.LookupValue(table, 'kFoo', ('ns', 'S'), None))
+    self.assertIs(table['ns.E.A'],
+                  data.LookupValue(table, 'A', ('ns',), enum))
+
+  def testImportFromDataIsLazy(self):
+    """Tests that imported kinds and values are only copied when looked up."""
+    module = mojom.Module('test_module', 'test_namespace')
+    imported_module = mojom.Module('import_module', 'import_namespace')
+    imported_module.values = {}
+    imported_data = {'module' : imported_module}
+
+    struct = mojom.Struct('TestStruct', module=imported_module)
+    imported_module.kinds[struct.spec] = struct
+    constant = mojom.Constant('kTest', mojom.INT32, '1')
+    value = mojom.ConstantValue(imported_module, None, constant)
+    imported_module.values[value.GetSpec()] = value
+
+    import_item = data.ImportFromData(module, imported_data)
+    self.assertEquals(0, len(module.kinds))
+    self.assertEquals(0, len(module.values))
+
+    kind = data.LookupKind(module.kinds, 'x:TestStruct', ('import_namespace',))
+    self.assertIsNot(struct, kind)
+    self.assertIs(import_item, kind.imported_from)
+    self.assertIsNone(struct.imported_from)
+    self.assertIs(kind, module.kinds[struct.spec])
+    self.assertEquals(1, len(module.kinds))
+
+    result = data.LookupValue(module.values, 'import_namespace.kTest', ('',),
+                              None)
+    self.assertIsNot(value, result)
+    self.assertIs(import_item, result.imported_from)
+    self.assertEquals([result], module.values.values())
+
+  def testImportFromDataPrecedence(self):
+    """Tests that kinds of the module take precedence over imported kinds, and
+    that kinds imported last take precedence over previously imported ones."""
+    module = mojom.Module('test_module', 'ns')
+    imported_modules = []
+    for name in ('first', 'second'):
+      imported_module = mojom.Module(name, 'ns')
+      imported_module.values = {}
+      for kind_name in ('Shared', 'Own'):
+        kind = mojom.Struct(kind_name, module=imported_module)
+        imported_module.kinds[kind.spec] = kind
+      imported_modules.append(imported_module)
+      data.ImportFromData(module, {'module': imported_module})
+    own = mojom.Struct('Own', module=module)
+    module.kinds[own.spec] = own
+
+    self.assertIs(own, data.LookupKind(module.kinds, 'x:Own', ('ns',)))
+    self.assertEquals('second', data.LookupKind(
+        module.kinds, 'x:Shared', ('ns',)).imported_from['module_name'])
+
+  def testImportGraph(self):
+    """Tests that transitive imports are computed once per file."""
+    imports = {'a': ['b', 'c'], 'b': ['d'], 'c': ['d', 'e'], 'd': [], 'e': []}
+    requested = []
+    def GetImports(name):
+      requested.append(name)
+      return imports[name]
+    import_graph = data.ImportGraph(GetImports)
+
+    self.assertEquals(['d'], import_graph.GetTransitiveImports('b'))
+    self.assertEquals(['b', 'c', 'd', 'e'],
+                      sorted(import_graph.GetTransitiveImports('a')))
+    self.assertEquals(['d', 'e'],
+                      sorted(import_graph.GetTransitiveImports('c')))
+    self.assertEquals([], import_graph.GetTransitiveImports('e'))
+    self.assertEquals(sorted(imports), sorted(requested))
+
+  def testImportGraphCycles(self):
+    """Tests that the files of an import cycle import each other."""
+    imports = {'a': ['b'], 'b': ['a', 'c'], 'c': ['d'], 'd': ['c'], 'e': ['e']}
+    import_graph = data.ImportGraph(lambda name: imports[name])
+
+    self.assertEquals(['a', 'b', 'c', 'd'],
+                      sorted(import_graph.GetTransitiveImports('a')))
+    self.assertEquals(['a', 'b', 'c', 'd'],
+                      sorted(import_graph.GetTransitiveImports('b')))
+    self.assertEquals(['c', 'd'],
+                      sorted(import_graph.GetTransitiveImports('d')))
+    self.assertEquals(['e'], import_graph.GetTransitiveImports('e'))
+
+  def testComputeTransitiveImports(self):
+    """Tests that imports of imports are included once."""
+    modules = dict((name, mojom.Module(name, 'ns')) for name in 'abcd')
+    def Import(importer, name):
+      modules[importer].imports.append({'module_name': name,
+                                        'module': modules[name]})
+    Import('a', 'b')
+    Import('a', 'c')
+    Import('b', 'd')
+    Import('c', 'd')
+    direct_import = modules['a'].imports[0]
+
+    paths = lambda imports: sorted(imp['module'].path for imp in imports)
+    self.assertEquals(['b', 'c', 'd'],
+                      paths(data.ComputeTransitiveImports(modules['a'])))
+    self.assertIn(direct_import, data.ComputeTransitiveImports(modules['a']))
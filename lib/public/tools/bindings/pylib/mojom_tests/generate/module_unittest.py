@@ -35,3 +35,55 @@ class ModuleTest(unittest.TestCase):
     self.assertEquals(
         e.exception.__str__(),
         'Interface request requires \'x:TestStruct\' to be an interface.')
+
+  def testIsCloneableKind(self):
+    """Tests that kinds are cloneable unless they transitively contain
+    handles or interfaces, including through recursive references."""
+    module = mojom.Module('test_module', 'test_namespace')
+    interface = mojom.Interface('TestInterface', module=module)
+
+    plain = mojom.Struct('Plain', module=module)
+    plain.AddField('a', mojom.INT32)
+    plain.AddField('s', mojom.NULLABLE_STRING)
+    self.assertTrue(mojom.IsCloneableKind(plain))
+    self.assertTrue(mojom.IsCloneableKind(mojom.Array(plain)))
+
+    # |outer| and |inner| reference each other; only |inner| holds a handle,
+    # through a map referenced after the cycle.
+    outer = mojom.Struct('Outer', module=module)
+    inner = mojom.Struct('Inner', module=module)
+    outer.AddField('inner', inner.MakeNullableKind())
+    outer.AddField('plain', plain)
+    inner.AddField('outer', mojom.Array(outer))
+    inner.AddField('map', mojom.Map(mojom.STRING, mojom.Array(interface)))
+    self.assertFalse(mojom.IsCloneableKind(outer))
+    self.assertFalse(mojom.IsCloneableKind(inner))
+    self.assertFalse(mojom.IsCloneableKind(outer.MakeNullableKind()))
+
+    union = mojom.Union('TestUnion', module=module)
+    union.AddField('outer', outer.MakeNullableKind())
+    self.assertFalse(mojom.IsCloneableKind(union))
+
+    recursive = mojom.Struct('Recursive', module=module)
+    recursive.AddField('self', recursive.MakeNullableKind())
+    recursive.AddField('plain', plain)
+    self.assertTrue(mojom.IsCloneableKind(recursive))
+    self.assertFalse(mojom.IsCloneableKind(mojom.MSGPIPE))
+
+  def testIsMoveOnlyKind(self):
+    module = mojom.Module('test_module', 'test_namespace')
+    struct = mojom.Struct('TestStruct', module=module)
+    self.assertTrue(mojom.IsMoveOnlyKind(struct))
+    self.assertTrue(mojom.IsMoveOnlyKind(mojom.HANDLE))
+    self.assertFalse(mojom.IsMoveOnlyKind(mojom.STRING))
+    self.assertFalse(mojom.IsMoveOnlyKind(mojom.INT32))
+
+  def testHasCallbacks(self):
+    module = mojom.Module('test_module', 'test_namespace')
+    interface = mojom.Interface('TestInterface', module=module)
+    interface.AddMethod('NoResponse')
+    self.assertFalse(mojom.HasCallbacks(
+        mojom.Interface('Empty', module=module)))
+    method = interface.AddMethod('WithResponse')
+    method.AddResponseParameter('a', mojom.INT32)
+    self.assertTrue(mojom.HasCallbacks(interface))
@@ -2,6 +2,8 @@
 # Use of this source code is governed by a BSD-style license that can be
 # found in the LICENSE file.
 
+import ast
+import glob
 import imp
 import os.path
 import sys
@@ -186,5 +188,71 @@ class LexerTest(unittest.TestCase):
     return toks[0]
 
 
+class FastLexerTest(LexerTest):
+  """Runs the tests of |LexerTest| against |mojom.parse.lexer.FastLexer|."""
+
+  def _TokensForInput(self, input_string):
+    lexer = mojom.parse.lexer.FastLexer("my_file.mojom")
+    lexer.input(input_string)
+    rv = []
+    while True:
+      tok = lexer.token()
+      if not tok:
+        return rv
+      rv.append(tok)
+
+
+class FastLexerDifferentialTest(unittest.TestCase):
+  """Checks that |mojom.parse.lexer.FastLexer| and the PLY lexer built from
+  |mojom.parse.lexer.Lexer| agree on the test corpus."""
+
+  def __init__(self, *args, **kwargs):
+    unittest.TestCase.__init__(self, *args, **kwargs)
+    self._zygote_lexer = lex.lex(mojom.parse.lexer.Lexer("my_file.mojom"))
+
+  def _Lex(self, lexer, source):
+    """Returns the list of (type, value, lineno, lexpos) for the tokens of
+    |source|, or the message of the error raised while lexing it."""
+    lexer.input(source)
+    rv = []
+    try:
+      while True:
+        tok = lexer.token()
+        if not tok:
+          return rv
+        rv.append((tok.type, tok.value, tok.lineno, tok.lexpos))
+    except mojom.parse.lexer.LexError as e:
+      return str(e)
+
+  def _Corpus(self):
+    """Returns all the string literals in the tests of this directory, which
+    include the sources used to test the parser and the translator."""
+    corpus = []
+    for path in glob.glob(os.path.join(os.path.dirname(__file__), "*.py")):
+      with open(path) as f:
+        tree = ast.parse(f.read(), path)
+      corpus.extend(node.s for node in ast.walk(tree)
+                    if isinstance(node, ast.Str))
+    return corpus
+
+  def testCorpus(self):
+    corpus = self._Corpus()
+    self.assertTrue(corpus)
+    for source in corpus:
+      self.assertEquals(
+          self._Lex(self._zygote_lexer.clone(), source),
+          self._Lex(mojom.parse.lexer.FastLexer("my_file.mojom"), source),
+          source)
+
+  def testErrors(self):
+    for source in ["$abc", "a\n$", "0123", "@0x1", "@", "\"\\%\"",
+                   "/* multi\nline */ \n\n  // a\n  // b\n #",
+                   "struct S {\n int32 a@01;\n};", "1.5e3 0x 07"]:
+      self.assertEquals(
+          self._Lex(self._zygote_lexer.clone(), source),
+          self._Lex(mojom.parse.lexer.FastLexer("my_file.mojom"), source),
+          source)
+
+
 if __name__ == "__main__":
   unittest.main()
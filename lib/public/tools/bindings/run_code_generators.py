@@ -8,13 +8,17 @@
 
 import argparse
 import imp
+import mmap
 import os
 import sys
 
 
-def _ParseCLIArgs():
+def _ParseCLIArgs(argv=None):
   """Parses the command line arguments.
 
+  Args:
+    argv: {list<str>|None} The arguments to parse. If None, sys.argv is used.
+
   Returns:
     tuple<Namespace, list<str>> The first value of the tuple is a Namespace
     holding the value of the optional args. The second value of the tuple is
@@ -50,7 +54,7 @@ def _ParseCLIArgs():
                       help="do not generate mojom type descriptors")
   parser.set_defaults(generate_type_info=False)
 
-  return parser.parse_known_args()
+  return parser.parse_known_args(argv)
 
 # We assume this script is located in the Mojo SDK in tools/bindings.
 THIS_DIR = os.path.abspath(os.path.dirname(__file__))
@@ -109,19 +113,56 @@ def LoadGenerators(generators_string):
   return generators
 
 
+def DeserializeMojomFileGraph(data):
+  """Deserializes a mojom_files_mojom.MojomFileGraph.
+
+  Args:
+    data: An object supporting the buffer interface (str, bytearray, mmap...)
+        holding a serialized mojom_files_mojom.MojomFileGraph. It is not
+        copied.
+
+  Returns:
+    The mojom_files_mojom.MojomFileGraph that was deserialized from data.
+  """
+  context = serialization.RootDeserializationContext(data, [])
+  return mojom_files_mojom.MojomFileGraph.Deserialize(context)
+
+
 def ReadMojomFileGraphFromFile(fp):
   """Reads a mojom_files_mojom.MojomFileGraph from a file.
 
   Args:
-    fp: A file pointer from which a serialized mojom_fileS_mojom.MojomFileGraph
+    fp: A file pointer from which a serialized mojom_files_mojom.MojomFileGraph
         can be read.
 
   Returns:
     The mojom_files_mojom.MojomFileGraph that was deserialized from the file.
   """
-  data = bytearray(fp.read())
-  context = serialization.RootDeserializationContext(data, [])
-  return mojom_files_mojom.MojomFileGraph.Deserialize(context)
+  return DeserializeMojomFileGraph(fp.read())
+
+
+def ReadMojomFileGraphFromPath(path):
+  """Reads a mojom_files_mojom.MojomFileGraph from the file at path.
+
+  The file is memory-mapped and the graph is deserialized directly from the
+  mapping, without copying the content of the file.
+
+  Args:
+    path: {str} Path to a file containing a serialized
+        mojom_files_mojom.MojomFileGraph.
+
+  Returns:
+    The mojom_files_mojom.MojomFileGraph that was deserialized from the file.
+  """
+  with open(path, 'rb') as fp:
+    # Empty files cannot be mapped.
+    if os.fstat(fp.fileno()).st_size == 0:
+      return DeserializeMojomFileGraph('')
+    mapped_file = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+  try:
+    return DeserializeMojomFileGraph(mapped_file)
+  finally:
+    mapped_file.close()
 
 
 def FixModulePath(module, abs_src_root_path):
@@ -142,16 +183,38 @@ def FixModulePath(module, abs_src_root_path):
     FixModulePath(import_dict['module'], abs_src_root_path)
 
 
-def main():
-  args, remaining_args = _ParseCLIArgs()
+def main(argv=None, serialized_file_graph=None):
+  """Runs the code generators.
 
-  if args.file_graph == '-':
-    fp = sys.stdin
-  else:
-    fp = open(args.file_graph)
+  Args:
+    argv: {list<str>|None} The command line arguments. If None, sys.argv is
+        used.
+    serialized_file_graph: {str|None} A serialized
+        mojom_files_mojom.MojomFileGraph. If specified, the --file-graph
+        argument is ignored and the graph is deserialized directly from this
+        value. This allows running the code generators in-process.
+  """
+  args, remaining_args = _ParseCLIArgs(argv)
 
-  mojom_file_graph = ReadMojomFileGraphFromFile(fp)
-  mojom_modules = mojom_translator.TranslateFileGraph(mojom_file_graph)
+  if serialized_file_graph is not None:
+    mojom_file_graph = DeserializeMojomFileGraph(serialized_file_graph)
+  elif args.file_graph == '-':
+    mojom_file_graph = ReadMojomFileGraphFromFile(sys.stdin)
+  else:
+    mojom_file_graph = ReadMojomFileGraphFromPath(args.file_graph)
+
+  # If --no-gen-imports is specified then only the modules translated from
+  # .mojom files whose names were explicitly requested during parsing (i.e.
+  # which have the |specified_name| field set) are translated. Modules which
+  # are included only because of a mojom import statement are never
+  # translated since no code would be generated for them.
+  file_names = None
+  if args.no_gen_imports:
+    file_names = mojom_translator.SpecifiedFileNames(mojom_file_graph)
+  # Modules are translated lazily, one at a time, as code is generated for
+  # them.
+  mojom_modules = mojom_translator.IterTranslateFileGraph(
+      mojom_file_graph, file_names)
 
   # Note that we are using the word "module" in two unrelated ways here.
   # A mojom module is the Python data structure defined in module.py that
@@ -161,14 +224,7 @@ def main():
   generator_modules = LoadGenerators(args.generators_string)
 
   abs_src_root_path = os.path.abspath(args.src_root_path)
-  for _, mojom_module in mojom_modules.iteritems():
-    # If --no-gen-imports is specified then skip the code generation step for
-    # any modules that do not have the |specified_name| field set. This field
-    # being set indicates that the module was translated from a .mojom file
-    # whose name was explicitly requested during parsing. Otherwise the module
-    # is included only becuase of a mojom import statement.
-    if args.no_gen_imports and not mojom_module.specified_name:
-      continue
+  for _, mojom_module in mojom_modules:
     FixModulePath(mojom_module, abs_src_root_path)
     for generator_module in generator_modules:
       generator = generator_module.Generator(mojom_module, args.output_dir)
@@ -184,6 +240,8 @@ def main():
 
       generator.GenerateFiles(filtered_args)
 
+  return 0
+
 
 if __name__ == "__main__":
   sys.exit(main())
@@ -0,0 +1,54 @@
+# Copyright 2015 The Chromium Authors. All rights reserved.
+# Use of this source code is governed by a BSD-style license that can be
+# found in the LICENSE file.
+
+import os
+import tempfile
+import unittest
+
+from run_code_generators import DeserializeMojomFileGraph
+from run_code_generators import ReadMojomFileGraphFromPath
+
+# Importable once run_code_generators has set up sys.path.
+from mojom.generate.generated import mojom_files_mojom
+
+
+def _SerializeFileGraph():
+  graph = mojom_files_mojom.MojomFileGraph(resolved_types={},
+                                           resolved_values={})
+  graph.files = {
+      'a.mojom': mojom_files_mojom.MojomFile(
+          file_name='a.mojom', specified_file_name='a.mojom', imports=[],
+          declared_mojom_objects=mojom_files_mojom.KeysByType()),
+  }
+  (data, handles) = graph.Serialize()
+  assert not handles
+  return str(data)
+
+
+class RunCodeGeneratorsTest(unittest.TestCase):
+  """Tests run_code_generators."""
+
+  def _CheckFileGraph(self, graph):
+    self.assertEquals(['a.mojom'], graph.files.keys())
+    self.assertEquals('a.mojom', graph.files['a.mojom'].specified_file_name)
+
+  def testDeserializeMojomFileGraph(self):
+    """Tests DeserializeMojomFileGraph()."""
+    data = _SerializeFileGraph()
+    self._CheckFileGraph(DeserializeMojomFileGraph(data))
+    self._CheckFileGraph(DeserializeMojomFileGraph(bytearray(data)))
+
+  def testReadMojomFileGraphFromPath(self):
+    """Tests ReadMojomFileGraphFromPath()."""
+    (fd, path) = tempfile.mkstemp()
+    try:
+      with os.fdopen(fd, 'wb') as fp:
+        fp.write(_SerializeFileGraph())
+      self._CheckFileGraph(ReadMojomFileGraphFromPath(path))
+    finally:
+      os.remove(path)
+
+
+if __name__ == "__main__":
+  unittest.main()